@@ -1,12 +1,145 @@
 # api_module.py
 
 import requests
+import contextlib
+import hashlib
 import json
-import win32cred
+import os
+import threading
+import time
+
+from urllib3.exceptions import ReadTimeoutError
+
+from app_logging import get_logger, new_correlation_id
+from attachments import JSONBody, contains_data_urls, message_content
+from cassette import is_replaying, transport_from_env
+from tool_calls import MAX_TOOL_ROUNDS, ToolCallAssembler, execute_tool_calls
+
+logger = get_logger("api")
+
+def _env_seconds(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+OPENROUTER_API_URL = os.environ.get("OPENROUTER_API_URL", "https://openrouter.ai/api/v1")
+CONNECTION_POOL_SIZE = 16  # Connections kept open per host
+WARM_TIMEOUT = 10          # Seconds allowed for a pre-warming request
+# Deadlines for every API call, overridable through the environment; 0 disables stall/total
+CONNECT_TIMEOUT = _env_seconds("OPENROUTER_CONNECT_TIMEOUT", 10)  # TCP/TLS connection setup
+READ_TIMEOUT = _env_seconds("OPENROUTER_READ_TIMEOUT", 60)        # Silence on the socket, keep-alives included
+STALL_TIMEOUT = _env_seconds("OPENROUTER_STALL_TIMEOUT", 45)      # No stream events, keep-alive comments ignored
+TOTAL_TIMEOUT = _env_seconds("OPENROUTER_TOTAL_TIMEOUT", 600)     # Whole request, fallbacks included
+CANCEL_POLL = 0.25  # Seconds between checks of a waiting stream's cancel flag
+
+_session = None
+_session_lock = threading.Lock()
+_transport = None  # Adapter set by set_transport(); None means OPENROUTER_CASSETTE or the network
+
+_flights = {}              # Fingerprint -> _Flight for streams currently in progress
+_flights_lock = threading.Lock()
+_flight_stats = {"upstream": 0, "coalesced": 0}
+
+class APITimeoutError(Exception):
+    """
+    Raised when an API call misses one of its deadlines.
+
+    Attributes:
+        kind (str): "connect", "read", "stall" or "total".
+        seconds (float): The deadline that was exceeded.
+        model (str | None): The model that was being called, if known.
+    """
+    MESSAGES = {
+        "connect": "Could not connect to the API within {seconds:g}s.",
+        "read": "The API sent no data for {seconds:g}s.",
+        "stall": "The response stream stalled: no tokens for {seconds:g}s.",
+        "total": "The request did not finish within {seconds:g}s.",
+    }
+
+    def __init__(self, kind: str, seconds: float, model: str | None = None):
+        self.kind = kind
+        self.seconds = seconds
+        self.model = model
+        message = self.MESSAGES[kind].format(seconds=seconds)
+        super().__init__(f"Model '{model}': {message}" if model else message)
+
+def get_session() -> requests.Session:
+    """
+    Return the shared HTTP session used for all API calls.
+
+    Reusing one session keeps connections to the API host pooled, so later
+    requests skip the DNS, TCP and TLS setup.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = _transport or transport_from_env() or requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=CONNECTION_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def reset_session():
+    """
+    Close the shared session and its pooled connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def set_transport(adapter):
+    """
+    Send all API traffic through a requests adapter, e.g. a cassette.RecordingAdapter or ReplayAdapter.
+
+    Args:
+        adapter (requests.adapters.BaseAdapter | None): The adapter, or None to go back to the default.
+    """
+    global _transport
+    reset_session()
+    _transport = adapter
+
+def warm_connection() -> float:
+    """
+    Open (or refresh) a pooled connection to the API host without a billable request.
+
+    Sends a HEAD request to the models endpoint, which only establishes the
+    connection and lets it return to the pool.
+
+    Returns:
+        float: The time taken in seconds.
+
+    Raises:
+        Exception: If the host cannot be reached.
+    """
+    start = time.perf_counter()
+    try:
+        get_session().head(f"{OPENROUTER_API_URL}/models", timeout=(CONNECT_TIMEOUT, WARM_TIMEOUT)).close()
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"Connection warm-up failed: {e}")
+    return time.perf_counter() - start
+
+def warm_connection_async():
+    """
+    Run warm_connection in a daemon thread, ignoring failures.
+    """
+    def warm():
+        try:
+            warm_connection()
+        except Exception:
+            pass
+    threading.Thread(target=warm, daemon=True).start()
 
 def get_api_key(credential_name: str) -> str:
     """
-    Retrieve the API key from Windows Credential Manager.
+    Retrieve the API key from OPENROUTER_API_KEY or the Windows Credential Manager.
+
+    When replaying a cassette no key is needed and a placeholder is returned.
 
     Args:
         credential_name (str): The name of the credential to retrieve.
@@ -17,7 +150,13 @@ def get_api_key(credential_name: str) -> str:
     Raises:
         Exception: If the credential cannot be read or decoded.
     """
+    api_key = os.environ.get("OPENROUTER_API_KEY")
+    if api_key:
+        return api_key
+    if is_replaying():
+        return "cassette-replay"
     try:
+        import win32cred  # Windows only; imported here so the module loads elsewhere
         credential = win32cred.CredRead(
             TargetName=credential_name,
             Type=win32cred.CRED_TYPE_GENERIC
@@ -27,7 +166,290 @@ def get_api_key(credential_name: str) -> str:
     except Exception as e:
         raise Exception(f"Error retrieving API key: {e}")
 
-def make_api_request(api_key: str, message_history: list, model: str, temperature: float = 1.0, stream: bool = False, context_length: int | None = None, max_completion_tokens: int | None = None, reasoning_effort: str | None = None, reasoning_max_tokens: int | None = None, exclude_reasoning: bool = False):
+def post_chat_completion(api_key: str, payload: dict, timeout: tuple | None = None) -> requests.Response:
+    """
+    Send a chat completion payload through the shared session.
+
+    This is the single place where completions go over the network; streams
+    normally go through stream_chat_completion instead, which calls it.
+
+    Args:
+        api_key (str): The API key for authorization.
+        payload (dict): The request body; streamed if payload["stream"] is true.
+        timeout (tuple, optional): (connect, read) timeouts in seconds. Defaults to
+            (CONNECT_TIMEOUT, READ_TIMEOUT).
+
+    Returns:
+        requests.Response: The open response. The caller must close it (it is a context manager).
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails or returns an error status.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    # Attachments are streamed from the attachment store rather than serialized in memory
+    body = {"data": JSONBody(payload)} if contains_data_urls(payload) else {"json": payload}
+    response = get_session().post(
+        f"{OPENROUTER_API_URL}/chat/completions", headers=headers, stream=bool(payload.get("stream")),
+        timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **body
+    )
+    try:
+        response.raise_for_status()  # Raises HTTPError for bad responses
+    except requests.exceptions.HTTPError:
+        response.content  # Read the error body so it survives closing
+        response.close()
+        raise
+    return response
+
+def request_fingerprint(api_key: str, payload: dict) -> str:
+    """
+    Return a canonical fingerprint of a request, identical for identical requests.
+
+    Args:
+        api_key (str): The API key; requests from different keys never match.
+        payload (dict): The request body.
+
+    Returns:
+        str: A hex digest of the key and the payload with sorted keys.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=lambda value: value.fingerprint())
+    return hashlib.sha256(f"{api_key}\n{canonical}".encode("utf-8")).hexdigest()
+
+class _Flight:
+    """
+    One upstream stream shared by every identical request made while it runs.
+
+    A pump thread appends the raw chunks to `chunks`; each subscriber reads
+    them from its own offset, so late joiners replay from the start. When
+    the last subscriber leaves before the end, the pump closes the upstream
+    response at its next chunk or read timeout.
+    """
+    def __init__(self, fingerprint, api_key, payload, timeout=None):
+        self.fingerprint = fingerprint
+        self.chunks = []
+        self.last_event = time.monotonic()  # When the last non-keep-alive data arrived
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.condition = threading.Condition()
+        threading.Thread(target=self._pump, args=(api_key, payload, timeout), daemon=True).start()
+
+    def _pump(self, api_key, payload, timeout):
+        try:
+            response = post_chat_completion(api_key, payload, timeout)
+            with response:
+                for data in response.iter_content(chunk_size=None):
+                    with self.condition:
+                        if self.done:
+                            return
+                        if not _is_keepalive(data):
+                            self.last_event = time.monotonic()
+                        self.chunks.append(data)
+                        self.condition.notify_all()
+        except Exception as e:
+            with self.condition:
+                if not self.done:
+                    self.error = e
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+            _end_flight(self)
+
+    def leave(self):
+        """
+        Unsubscribe; aborts the upstream stream if nobody is left.
+        """
+        # Unregister under the registry lock so nobody can join a cancelled flight
+        with _flights_lock:
+            with self.condition:
+                self.subscribers -= 1
+                if self.subscribers > 0 or self.done:
+                    return
+                self.done = True
+                self.condition.notify_all()
+            if _flights.get(self.fingerprint) is self:
+                del _flights[self.fingerprint]
+        # The pump closes the response when it sees `done`; closing it from here would
+        # block until the pump's pending read returns
+        logger.debug("Last subscriber left; upstream stream aborted")
+
+def _is_keepalive(data: bytes) -> bool:
+    """
+    Check whether a chunk holds only SSE comments (such as ": OPENROUTER PROCESSING") and blank lines.
+    """
+    return all(not line.strip() or line.lstrip().startswith(b":") for line in data.split(b"\n"))
+
+def _end_flight(flight):
+    with _flights_lock:
+        if _flights.get(flight.fingerprint) is flight:
+            del _flights[flight.fingerprint]
+
+def stream_chat_completion(api_key: str, payload: dict, coalesce: bool = True, timeout: tuple | None = None, stall_timeout: float | None = None, total_timeout: float | None = None, cancelled: threading.Event | None = None):
+    """
+    Stream the raw bytes of a chat completion, sharing identical in-flight requests.
+
+    If an identical request (same key and canonical payload) is already
+    streaming, this subscribes to it instead of starting another upstream
+    generation. Closing the generator unsubscribes; the upstream stream is
+    only aborted when every subscriber has left.
+
+    Args:
+        api_key (str): The API key for authorization.
+        payload (dict): The request body; "stream" is forced on.
+        coalesce (bool, optional): Whether to share identical in-flight requests. Defaults to True.
+        timeout (tuple, optional): (connect, read) socket timeouts for a new upstream request.
+        stall_timeout (float, optional): Seconds without a stream event (keep-alive comments do not
+            count) before giving up. Defaults to STALL_TIMEOUT; 0 disables the watchdog.
+        total_timeout (float, optional): Seconds allowed for the whole stream. Defaults to
+            TOTAL_TIMEOUT; 0 disables the deadline.
+        cancelled (threading.Event, optional): Ends the stream early, without an error, once set;
+            checked at least every CANCEL_POLL seconds while waiting for data.
+
+    Yields:
+        bytes: The response body as it arrives.
+
+    Raises:
+        requests.exceptions.RequestException: If the upstream request fails.
+        APITimeoutError: If the stream stalls or misses its total deadline.
+    """
+    stall_timeout = STALL_TIMEOUT if stall_timeout is None else stall_timeout
+    total_timeout = TOTAL_TIMEOUT if total_timeout is None else total_timeout
+    deadline = time.monotonic() + total_timeout if total_timeout else None
+    payload = dict(payload, stream=True)
+    fingerprint = request_fingerprint(api_key, payload)
+    with _flights_lock:
+        flight = _flights.get(fingerprint) if coalesce else None
+        if flight is None:
+            flight = _Flight(fingerprint, api_key, payload, timeout)
+            if coalesce:
+                _flights[fingerprint] = flight
+            _flight_stats["upstream"] += 1
+        else:
+            _flight_stats["coalesced"] += 1
+            logger.info("Joined an identical in-flight request (%d upstream calls saved so far)", _flight_stats["coalesced"])
+        with flight.condition:
+            flight.subscribers += 1
+
+    offset = 0
+    try:
+        while True:
+            with flight.condition:
+                while True:
+                    if cancelled is not None and cancelled.is_set():
+                        return  # Leaving aborts the upstream stream if nobody else shares it
+                    # The watchdog: checked on every wake-up, so a stream of keep-alives still stalls
+                    now = time.monotonic()
+                    if stall_timeout and now - flight.last_event >= stall_timeout:
+                        raise APITimeoutError("stall", stall_timeout)
+                    if deadline is not None and now >= deadline:
+                        raise APITimeoutError("total", total_timeout)
+                    if offset < len(flight.chunks) or flight.done:
+                        break
+                    waits = [flight.last_event + stall_timeout - now] if stall_timeout else []
+                    if deadline is not None:
+                        waits.append(deadline - now)
+                    if cancelled is not None:
+                        waits.append(CANCEL_POLL)
+                    flight.condition.wait(min(waits) if waits else None)
+                new_chunks = flight.chunks[offset:]
+                done, error = flight.done, flight.error
+            offset += len(new_chunks)
+            yield from new_chunks
+            if done and offset == len(flight.chunks):
+                if error is not None:
+                    raise error
+                return
+    finally:
+        flight.leave()
+
+def get_coalescing_stats() -> dict:
+    """
+    Return how many streams went upstream and how many joined an identical in-flight one.
+
+    Returns:
+        dict: {"upstream": int, "coalesced": int}; "coalesced" is the number of upstream calls saved.
+    """
+    with _flights_lock:
+        return dict(_flight_stats)
+
+def _iter_lines(chunks):
+    """
+    Split a stream of byte chunks into lines.
+    """
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+def fetch_models() -> dict:
+    """
+    Fetch the model catalog from the API through the shared session.
+
+    Returns:
+        dict: The JSON response ({"data": [...]}).
+
+    Raises:
+        Exception: If the request fails or the response is invalid.
+    """
+    try:
+        response = get_session().get(f"{OPENROUTER_API_URL}/models", timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"Failed to fetch models: {e}")
+    except json.JSONDecodeError:
+        raise Exception("Failed to decode JSON response.")
+
+def _as_timeout(error: Exception, connect_timeout: float, read_timeout: float) -> APITimeoutError | None:
+    """
+    Translate a requests timeout into an APITimeoutError, or return None for other errors.
+    """
+    if isinstance(error, APITimeoutError):
+        return error
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return APITimeoutError("connect", connect_timeout)
+    if isinstance(error, requests.exceptions.ReadTimeout):
+        return APITimeoutError("read", read_timeout)
+    # Read timeouts while iterating a streamed body surface as a ConnectionError
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args and isinstance(error.args[0], ReadTimeoutError):
+        return APITimeoutError("read", read_timeout)
+    return None
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Check whether a failed request should move on to the next fallback model.
+
+    Args:
+        error (Exception): The exception raised by the request.
+
+    Returns:
+        bool: True for rate limits (429), server errors (5xx), timeouts and connection failures.
+    """
+    if isinstance(error, APITimeoutError):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status == 429 or (status is not None and status >= 500)
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+def _api_message(message: dict) -> dict:
+    """
+    Return a conversation message as sent to the API, keeping tool call fields.
+    """
+    api_message = {"role": message["role"], "content": message_content(message)}
+    for key in ("tool_calls", "tool_call_id", "name"):
+        if key in message:
+            api_message[key] = message[key]
+    return api_message
+
+def make_api_request(api_key: str, message_history: list, model: str, temperature: float | None = 1.0, stream: bool = False, context_length: int | None = None, max_completion_tokens: int | None = None, max_tokens: int | None = None, reasoning_effort: str | None = None, reasoning_max_tokens: int | None = None, exclude_reasoning: bool = False, with_reasoning: bool = False, request_id: str | None = None, coalesce: bool = True, fallback_models: list | None = None, server_fallback: bool = True, on_model=None, connect_timeout: float | None = None, read_timeout: float | None = None, stall_timeout: float | None = None, total_timeout: float | None = None, tools: list | None = None, tool_choice=None, on_tool_calls=None, on_usage=None, cancelled: threading.Event | None = None):
     """
     Make a POST request to the OpenRouter API for a specific model.
 
@@ -35,37 +457,73 @@ def make_api_request(api_key: str, message_history: list, model: str, temperatur
         api_key (str): The API key for authorization.
         message_history (list): The conversation history.
         model (str): The AI model to use for generating a response.
-        temperature (float, optional): Sampling temperature. Defaults to 1.0.
+        temperature (float, optional): Sampling temperature, or None to use the model's default. Defaults to 1.0.
         stream (bool, optional): Whether to stream the response in chunks.
         context_length (int, optional): The maximum number of tokens for context. Defaults to None.
         max_completion_tokens (int, optional): The maximum number of tokens for the completion. Defaults to None.
+        max_tokens (int, optional): The completion budget sent as max_tokens; takes precedence over
+            context_length. Usually computed by request_validator.validate_request. Defaults to None.
         reasoning_effort (str, optional): The reasoning effort level ("high", "medium", "low"). Defaults to None.
         reasoning_max_tokens (int, optional): The maximum tokens for reasoning. Defaults to None.
         exclude_reasoning (bool, optional): Whether to exclude reasoning tokens from response. Defaults to False.
+        with_reasoning (bool, optional): Whether to also stream reasoning tokens. If True, chunks are
+            yielded as (channel, text) tuples where channel is "content" or "reasoning". Defaults to False.
+        request_id (str, optional): Correlation id attached to this request's log events. Generated if omitted.
+        coalesce (bool, optional): Whether a streaming request may share an identical in-flight
+            request's upstream stream (see stream_chat_completion). Defaults to True.
+        fallback_models (list, optional): Models to try in order when the request fails with a
+            retryable error (see is_retryable_error) before any content arrived. Defaults to None.
+        server_fallback (bool, optional): Whether to also send the chain as OpenRouter's `models`
+            array, so the API can route around failing models itself. Defaults to True.
+        on_model (callable, optional): Called with the ID of the model that actually served the
+            request, as reported by the API.
+        connect_timeout (float, optional): Seconds to establish a connection. Defaults to CONNECT_TIMEOUT.
+        read_timeout (float, optional): Seconds of socket silence allowed. Defaults to READ_TIMEOUT.
+        stall_timeout (float, optional): Seconds without a stream event, ignoring keep-alive comments.
+            Defaults to STALL_TIMEOUT; 0 disables it.
+        total_timeout (float, optional): Seconds for the whole call including fallbacks. Defaults to
+            TOTAL_TIMEOUT; 0 disables it.
+        tools (list, optional): Tool definitions the model may call (see ToolRegistry.definitions).
+        tool_choice (str | dict, optional): "auto", "none", "required" or a specific function.
+        on_tool_calls (callable, optional): Called with the list of ToolCalls once the response
+            has finished, if the model requested any. Streamed arguments are parsed as they arrive.
+        on_usage (callable, optional): Called with the response's token counts and cost (the API's
+            `usage` object); setting it asks the API to include usage accounting.
+        cancelled (threading.Event, optional): Stops a streaming request once set: the stream ends
+            early without an error, and no tool calls or fallbacks follow.
 
     Yields:
-        str: The content chunk from the AI response.
+        str | tuple: The content chunk from the AI response, or a (channel, text) tuple if with_reasoning is set.
 
     Returns:
         dict: The JSON response from the API if stream is False.
 
     Raises:
+        APITimeoutError: If the last model tried missed a deadline.
         Exception: If the request fails or the response is invalid.
     """
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    connect_timeout = CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+    read_timeout = READ_TIMEOUT if read_timeout is None else read_timeout
+    total_timeout = TOTAL_TIMEOUT if total_timeout is None else total_timeout
+    deadline = time.monotonic() + total_timeout if total_timeout else None
     payload = {
         "model": model,
-        "messages": message_history,
-        "temperature": temperature,
+        "messages": [_api_message(m) for m in message_history],
         "stream": stream
     }
+    if tools:
+        payload["tools"] = tools
+    if tool_choice is not None:
+        payload["tool_choice"] = tool_choice
+    if temperature is not None:
+        payload["temperature"] = temperature
+    if on_usage is not None:
+        payload["usage"] = {"include": True}
 
     # Add context_length and max_completion_tokens to payload if provided
-    if context_length is not None:
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    elif context_length is not None:
         payload["max_tokens"] = context_length
     if max_completion_tokens is not None:
         payload["max_completion_tokens"] = max_completion_tokens
@@ -80,36 +538,156 @@ def make_api_request(api_key: str, message_history: list, model: str, temperatur
         if exclude_reasoning:
             payload["reasoning"]["exclude"] = True
 
-    try:
-        with requests.post(url, headers=headers, json=payload, stream=stream) as response:
-            response.raise_for_status()  # Raises HTTPError for bad responses
+    if request_id is None:
+        request_id = new_correlation_id()
+    log_extra = {"request_id": request_id}
+    chain = [model] + [m for m in (fallback_models or []) if m != model]
+
+    for attempt, attempt_model in enumerate(chain):
+        if cancelled is not None and cancelled.is_set():
+            logger.info("Request cancelled before model %s", attempt_model, extra=log_extra)
+            return
+        payload["model"] = attempt_model
+        if server_fallback and attempt < len(chain) - 1:
+            payload["models"] = chain[attempt:]  # Let OpenRouter route around failing models first
+        else:
+            payload.pop("models", None)
+        logger.info("Request start: model=%s stream=%s messages=%d", attempt_model, stream, len(message_history), extra=log_extra)
+        start_time = time.perf_counter()
+        chunk_count = 0
+        served_model = None
+        tool_calls = ToolCallAssembler()
 
+        remaining = deadline - time.monotonic() if deadline is not None else 0
+        try:
+            if deadline is not None and remaining <= 0:
+                raise APITimeoutError("total", total_timeout)
             if stream:
-                # Stream the response chunk by chunk
-                for chunk in response.iter_lines():
-                    if chunk:
-                        decoded_chunk = chunk.decode("utf-8")
-                        if decoded_chunk.strip() == "[DONE]":
-                            break
-                        else:
-                            # Remove 'data: ' prefix if present
-                            if decoded_chunk.startswith('data: '):
-                                decoded_chunk = decoded_chunk[len('data: '):]
-
-                            try:
-                                chunk_data = json.loads(decoded_chunk)
-                                # Extract the content from the chunk
-                                if "choices" in chunk_data:
-                                    delta = chunk_data["choices"][0].get("delta", {})
-                                    if "content" in delta:
-                                        text = delta["content"]
-                                        yield text
-                            except json.JSONDecodeError:
-                                continue
+                # Stream the response chunk by chunk; identical in-flight requests share one upstream stream
+                with contextlib.closing(stream_chat_completion(
+                    api_key, payload, coalesce=coalesce, timeout=(connect_timeout, read_timeout),
+                    stall_timeout=stall_timeout, total_timeout=remaining, cancelled=cancelled
+                )) as chunks:
+                    for chunk in _iter_lines(chunks):
+                        if chunk:
+                            decoded_chunk = chunk.decode("utf-8")
+                            if decoded_chunk.strip() == "[DONE]":
+                                break
+                            else:
+                                # Remove 'data: ' prefix if present
+                                if decoded_chunk.startswith('data: '):
+                                    decoded_chunk = decoded_chunk[len('data: '):]
+
+                                try:
+                                    chunk_data = json.loads(decoded_chunk)
+                                    if served_model is None and chunk_data.get("model"):
+                                        served_model = chunk_data["model"]
+                                        if on_model is not None:
+                                            on_model(served_model)
+                                    if chunk_data.get("usage") and on_usage is not None:
+                                        on_usage(chunk_data["usage"])  # Sent in the last event
+                                    # Extract the content from the chunk
+                                    if chunk_data.get("choices"):
+                                        delta = chunk_data["choices"][0].get("delta", {})
+                                        if delta.get("content") or delta.get("reasoning") or delta.get("tool_calls"):
+                                            if chunk_count == 0:
+                                                logger.info("First token after %.3fs", time.perf_counter() - start_time, extra=log_extra)
+                                            chunk_count += 1
+                                        if delta.get("tool_calls"):
+                                            tool_calls.feed(delta["tool_calls"])
+                                        if with_reasoning and delta.get("reasoning"):
+                                            yield ("reasoning", delta["reasoning"])
+                                        if delta.get("content"):
+                                            text = delta["content"]
+                                            yield ("content", text) if with_reasoning else text
+                                except json.JSONDecodeError:
+                                    continue
+                if cancelled is not None and cancelled.is_set():
+                    logger.info("Request cancelled after %d chunks in %.3fs", chunk_count, time.perf_counter() - start_time, extra=log_extra)
+                    return  # Partial tool calls must not run
+                logger.info("Request finished: %d chunks in %.3fs (served by %s)", chunk_count, time.perf_counter() - start_time, served_model, extra=log_extra)
+                if tool_calls and on_tool_calls is not None:
+                    on_tool_calls(tool_calls.calls())
+                return
             else:
-                # Non-streaming: return the full JSON response
-                return response.json()
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"API request failed for model '{model}': {e}")
-    except json.JSONDecodeError:
-        raise Exception("Failed to decode JSON response.")
\ No newline at end of file
+                with post_chat_completion(api_key, payload, (connect_timeout, read_timeout)) as response:
+                    # Non-streaming: return the full JSON response
+                    data = response.json()
+                logger.info("Request finished in %.3fs (served by %s)", time.perf_counter() - start_time, data.get("model"), extra=log_extra)
+                if on_model is not None and data.get("model"):
+                    on_model(data["model"])
+                if on_usage is not None and data.get("usage"):
+                    on_usage(data["usage"])
+                message = (data.get("choices") or [{}])[0].get("message") or {}
+                if message.get("tool_calls") and on_tool_calls is not None:
+                    tool_calls.feed(message["tool_calls"])
+                    on_tool_calls(tool_calls.calls())
+                return data
+        except (requests.exceptions.RequestException, APITimeoutError) as e:
+            timeout_error = _as_timeout(e, connect_timeout, read_timeout)
+            if timeout_error is not None:
+                e = timeout_error
+            # Fail over only before anything was streamed, so output is never duplicated
+            total_expired = timeout_error is not None and timeout_error.kind == "total"
+            if chunk_count == 0 and not total_expired and attempt < len(chain) - 1 and is_retryable_error(e):
+                logger.warning("Model %s failed after %.3fs (%s); falling back to %s", attempt_model, time.perf_counter() - start_time, e, chain[attempt + 1], extra=log_extra)
+                continue
+            logger.error("Request failed after %.3fs: %s", time.perf_counter() - start_time, e, extra=log_extra)
+            if timeout_error is not None:
+                seconds = total_timeout if timeout_error.kind == "total" else timeout_error.seconds
+                raise APITimeoutError(timeout_error.kind, seconds, attempt_model)
+            raise Exception(f"API request failed for model '{attempt_model}': {e}")
+        except json.JSONDecodeError:
+            logger.error("Failed to decode JSON response", extra=log_extra)
+            raise Exception("Failed to decode JSON response.")
+
+def stream_with_tools(api_key: str, message_history: list, model: str, registry, max_rounds: int = MAX_TOOL_ROUNDS, on_tool_results=None, with_reasoning: bool = False, **kwargs):
+    """
+    Stream a response, running the tools the model calls and sending their results back until it answers.
+
+    Each round is a streaming make_api_request with the registry's tools. When
+    the model ends a round with tool calls, they run in parallel and a follow-up
+    request carries the results. The last allowed round sets tool_choice to
+    "none", so the model has to answer.
+
+    Args:
+        api_key (str): The API key for authorization.
+        message_history (list): The conversation history.
+        model (str): The model to use.
+        registry (ToolRegistry): The local tools the model may call.
+        max_rounds (int, optional): Follow-up requests allowed. Defaults to MAX_TOOL_ROUNDS.
+        on_tool_results (callable, optional): Called with (tool calls, tool messages) after each round of tools.
+        with_reasoning (bool, optional): Yield (channel, text) tuples, as in make_api_request.
+        **kwargs: Passed on to make_api_request.
+
+    Yields:
+        str | tuple: The content chunks of every round, as make_api_request yields them.
+
+    Raises:
+        Exception: If a request fails.
+    """
+    kwargs.pop("stream", None)  # Every round streams
+    messages = list(message_history)
+    for round_number in range(max_rounds + 1):
+        calls = []
+        content = []
+        for chunk in make_api_request(
+            api_key, messages, model, stream=True, with_reasoning=with_reasoning,
+            tools=registry.definitions(), tool_choice="none" if round_number == max_rounds else None,
+            on_tool_calls=calls.extend, **kwargs
+        ):
+            if not with_reasoning:
+                content.append(chunk)
+            elif chunk[0] == "content":
+                content.append(chunk[1])
+            yield chunk
+        if not calls:
+            return
+        text = "".join(content)
+        messages.append({"role": "assistant", "content": text or None, "tool_calls": [call.to_dict() for call in calls]})
+        results = execute_tool_calls(calls, registry)
+        if on_tool_results is not None:
+            on_tool_results(calls, results)
+        messages.extend(results)
+        if text:
+            yield ("content", "\n\n") if with_reasoning else "\n\n"  # Separate this round's text from the answer
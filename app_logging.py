@@ -0,0 +1,170 @@
+# app_logging.py
+
+"""
+Logging setup for the application.
+
+Records go to an in-memory ring buffer (viewable from the debug log panel)
+and, through a background queue listener, to a rotating log file. Loggers
+use %-style arguments so disabled levels cost only a level check.
+
+Environment variables:
+    OPENROUTER_LOG_LEVEL: Minimum level to record (default INFO).
+    OPENROUTER_LOG_FILE: Log file path (default ~/.openrouter_chat/logs/app.log);
+        set to an empty string to disable file output.
+"""
+
+import atexit
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import uuid
+
+LOGGER_NAME = "openrouter"
+RING_BUFFER_SIZE = 2000
+LOG_FILE_MAX_BYTES = 1_000_000
+LOG_FILE_BACKUPS = 3
+DEFAULT_LOG_FILE = os.path.join(os.path.expanduser("~"), ".openrouter_chat", "logs", "app.log")
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s"
+
+_ring_buffer = None
+_queue_listener = None
+_formatter = logging.Formatter(LOG_FORMAT)
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    Gives every record a request_id attribute so the format string always works.
+    """
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return True
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the most recent records in a bounded deque.
+
+    deque.append with a maxlen is atomic, so emitting does not take the
+    handler lock and never blocks the streaming threads.
+    """
+    def __init__(self, capacity: int = RING_BUFFER_SIZE):
+        super().__init__()
+        self.records = collections.deque(maxlen=capacity)
+
+    def handle(self, record):
+        rv = self.filter(record)
+        if rv:
+            self.records.append(record)
+        return rv
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def snapshot(self, min_level: int = logging.NOTSET) -> list:
+        """
+        Return a copy of the buffered records at or above `min_level`.
+
+        Args:
+            min_level (int, optional): The minimum level to include.
+
+        Returns:
+            list: The matching logging.LogRecord objects, oldest first.
+        """
+        return [record for record in list(self.records) if record.levelno >= min_level]
+
+    def clear(self):
+        self.records.clear()
+
+
+def setup_logging(level: str | int | None = None, log_file: str | None = None) -> RingBufferHandler:
+    """
+    Configure the application logger. Safe to call more than once.
+
+    Args:
+        level (str | int, optional): The minimum level. Defaults to $OPENROUTER_LOG_LEVEL or INFO.
+        log_file (str, optional): The log file path. Defaults to $OPENROUTER_LOG_FILE or DEFAULT_LOG_FILE.
+
+    Returns:
+        RingBufferHandler: The in-memory handler backing the debug log panel.
+    """
+    global _ring_buffer, _queue_listener
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level or os.environ.get("OPENROUTER_LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+    if _ring_buffer is not None:
+        return _ring_buffer
+
+    correlation_filter = CorrelationFilter()
+    _ring_buffer = RingBufferHandler()
+    _ring_buffer.addFilter(correlation_filter)
+    logger.addHandler(_ring_buffer)
+
+    if log_file is None:
+        log_file = os.environ.get("OPENROUTER_LOG_FILE", DEFAULT_LOG_FILE)
+    if log_file:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+            )
+            file_handler.setFormatter(_formatter)
+            # File writes happen on the listener's thread, off the GUI and streaming threads
+            log_queue = queue.SimpleQueue()
+            queue_handler = logging.handlers.QueueHandler(log_queue)
+            queue_handler.addFilter(correlation_filter)
+            logger.addHandler(queue_handler)
+            _queue_listener = logging.handlers.QueueListener(log_queue, file_handler)
+            _queue_listener.start()
+            atexit.register(shutdown_logging)
+        except OSError as e:
+            logger.warning("File logging disabled: %s", e)
+
+    return _ring_buffer
+
+
+def shutdown_logging():
+    """
+    Flush and stop the background file writer.
+    """
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Return a child of the application logger.
+
+    Args:
+        name (str): The component name, e.g. "api".
+
+    Returns:
+        logging.Logger: The logger.
+    """
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def get_ring_buffer() -> RingBufferHandler | None:
+    """
+    Return the in-memory handler, or None if setup_logging has not been called.
+    """
+    return _ring_buffer
+
+
+def new_correlation_id() -> str:
+    """
+    Return a short random id that ties together the log events of one request.
+    """
+    return uuid.uuid4().hex[:8]
+
+
+def format_record(record: logging.LogRecord) -> str:
+    """
+    Format a record the same way as the log file.
+    """
+    return _formatter.format(record)
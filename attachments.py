@@ -0,0 +1,351 @@
+# attachments.py
+
+"""
+File and image attachments for multimodal requests.
+
+Attachments are prepared once into a content-addressed store
+(~/.openrouter_chat/attachments by default, or $OPENROUTER_ATTACHMENT_DIR):
+images are downscaled and re-encoded to fit MAX_IMAGE_SIDE and
+MAX_IMAGE_BYTES, and every attachment is base64-encoded incrementally from a
+memory-mapped source into a .b64 file. Later turns reuse the stored encoding,
+and request bodies stream it from a memory map in slices (see JSONBody), so
+no step builds the whole base64 string in memory.
+
+Messages reference attachments by a small JSON-serializable dict (see
+Attachment.to_dict), so conversations can be stored and indexed as before.
+"""
+
+import base64
+import hashlib
+import json
+import mimetypes
+import mmap
+import os
+
+ATTACHMENT_DIR = os.environ.get(
+    "OPENROUTER_ATTACHMENT_DIR", os.path.join(os.path.expanduser("~"), ".openrouter_chat", "attachments")
+)
+MAX_IMAGE_SIDE = 2048              # Longest side in pixels accepted by common vision models
+MAX_IMAGE_BYTES = 5 * 1024 * 1024  # Largest encoded image most providers accept
+JPEG_QUALITY = 85
+READ_BLOCK = 3 * 256 * 1024        # Multiple of 3, so base64 blocks concatenate without padding
+WRITE_SLICE = 256 * 1024           # Bytes per slice written into a request body
+IMAGE_MIME_TYPES = ("image/png", "image/jpeg", "image/webp", "image/gif")
+
+
+class Attachment:
+    """
+    A prepared attachment in the store.
+
+    Args:
+        key (str): The store key (hash of the source content and processing settings).
+        name (str): The original file name.
+        mime (str): The MIME type of the stored data.
+        kind (str): "image" or "file".
+        size (int): The size of the stored (pre-base64) data in bytes.
+        store_dir (str): The store directory.
+    """
+    def __init__(self, key, name, mime, kind, size, store_dir=None):
+        self.key = key
+        self.name = name
+        self.mime = mime
+        self.kind = kind
+        self.size = size
+        self.store_dir = store_dir or ATTACHMENT_DIR
+
+    @property
+    def encoded_path(self):
+        return os.path.join(self.store_dir, f"{self.key}.b64")
+
+    def to_dict(self) -> dict:
+        """
+        Return the reference stored on a message.
+        """
+        return {"key": self.key, "name": self.name, "mime": self.mime, "kind": self.kind, "size": self.size}
+
+    @classmethod
+    def from_dict(cls, data: dict, store_dir: str | None = None) -> "Attachment":
+        return cls(data["key"], data["name"], data["mime"], data["kind"], data["size"], store_dir)
+
+    def data_url(self) -> "DataURL":
+        """
+        Return a lazily streamed data URL for use in a request payload.
+
+        Raises:
+            Exception: If the attachment is no longer in the store.
+        """
+        if not os.path.exists(self.encoded_path):
+            raise Exception(f"Attachment '{self.name}' is missing from the attachment store.")
+        return DataURL(self.encoded_path, self.mime, self.key)
+
+    def content_part(self) -> dict:
+        """
+        Return the OpenAI-style content part for this attachment.
+        """
+        if self.kind == "image":
+            return {"type": "image_url", "image_url": {"url": self.data_url()}}
+        return {"type": "file", "file": {"filename": self.name, "file_data": self.data_url()}}
+
+
+class DataURL:
+    """
+    A "data:<mime>;base64,..." string whose payload stays on disk until it is sent.
+
+    Appears in request payloads in place of a str; JSONBody streams it and
+    request_fingerprint serializes it by its key.
+    """
+    def __init__(self, path, mime, key):
+        self.path = path
+        self.prefix = f"data:{mime};base64,".encode("ascii")
+        self.key = key
+
+    def __len__(self):
+        return len(self.prefix) + os.path.getsize(self.path)
+
+    def iter_bytes(self):
+        """
+        Yield the data URL in slices read from a memory map of the stored encoding.
+        """
+        yield self.prefix
+        size = os.path.getsize(self.path)
+        if not size:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, size, WRITE_SLICE):
+                yield mapped[offset:offset + WRITE_SLICE]
+
+    def fingerprint(self):
+        return {"attachment": self.key}
+
+
+def contains_data_urls(obj) -> bool:
+    """
+    Check whether a payload holds any DataURL values.
+    """
+    if isinstance(obj, DataURL):
+        return True
+    if isinstance(obj, dict):
+        return any(contains_data_urls(value) for value in obj.values())
+    if isinstance(obj, list):
+        return any(contains_data_urls(value) for value in obj)
+    return False
+
+
+def _json_pieces(obj):
+    if isinstance(obj, DataURL):
+        # Base64 and the data URL prefix never need JSON escaping
+        yield b'"'
+        yield obj
+        yield b'"'
+    elif isinstance(obj, dict):
+        yield b"{"
+        for index, (key, value) in enumerate(obj.items()):
+            yield (b"," if index else b"") + json.dumps(str(key)).encode("utf-8") + b":"
+            yield from _json_pieces(value)
+        yield b"}"
+    elif isinstance(obj, list):
+        yield b"["
+        for index, value in enumerate(obj):
+            if index:
+                yield b","
+            yield from _json_pieces(value)
+        yield b"]"
+    else:
+        yield json.dumps(obj).encode("utf-8")
+
+
+class JSONBody:
+    """
+    A JSON request body that streams DataURL values from disk.
+
+    Iterating yields bytes; len() gives the exact body size, so requests
+    sends a Content-Length header instead of chunked encoding.
+
+    Args:
+        payload (dict): The request payload, possibly containing DataURL values.
+    """
+    def __init__(self, payload):
+        self.pieces = []
+        pending = []
+        for piece in _json_pieces(payload):
+            if isinstance(piece, DataURL):
+                self.pieces.extend([b"".join(pending), piece])
+                pending = []
+            else:
+                pending.append(piece)
+        self.pieces.append(b"".join(pending))
+
+    def __len__(self):
+        return sum(len(piece) for piece in self.pieces)
+
+    def __iter__(self):
+        for piece in self.pieces:
+            if isinstance(piece, DataURL):
+                yield from piece.iter_bytes()
+            elif piece:
+                yield piece
+
+
+def hash_file(path: str) -> str:
+    """
+    Return the SHA-256 of a file, read through a memory map.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, len(mapped), READ_BLOCK):
+                    digest.update(mapped[offset:offset + READ_BLOCK])
+    return digest.hexdigest()
+
+
+def encode_file_base64(source_path: str, target_path: str):
+    """
+    Base64-encode a file into another file block by block from a memory map.
+
+    Args:
+        source_path (str): The file to encode.
+        target_path (str): The output file; written atomically.
+    """
+    temp_path = target_path + ".tmp"
+    with open(source_path, "rb") as source, open(temp_path, "wb") as target:
+        if os.fstat(source.fileno()).st_size:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, len(mapped), READ_BLOCK):
+                    target.write(base64.b64encode(mapped[offset:offset + READ_BLOCK]))
+    os.replace(temp_path, target_path)
+
+
+def prepare_image(path: str, max_side: int = MAX_IMAGE_SIDE, max_bytes: int = MAX_IMAGE_BYTES) -> tuple | None:
+    """
+    Downscale and re-encode an image if it exceeds the limits or is not a widely supported format.
+
+    Uses QImage, which is safe to use outside the GUI thread.
+
+    Args:
+        path (str): The image file.
+        max_side (int, optional): The longest allowed side in pixels.
+        max_bytes (int, optional): The largest allowed encoded size.
+
+    Returns:
+        tuple | None: (data, mime) for the re-encoded image, or None if the file can be sent as is.
+
+    Raises:
+        Exception: If the image cannot be read.
+    """
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+    from PyQt5.QtGui import QImage, QPainter
+
+    image = QImage(path)
+    if image.isNull():
+        raise Exception(f"Could not read image '{os.path.basename(path)}'.")
+    mime = mimetypes.guess_type(path)[0]
+    if (max(image.width(), image.height()) <= max_side and os.path.getsize(path) <= max_bytes
+            and mime in IMAGE_MIME_TYPES):
+        return None
+
+    keep_alpha = image.hasAlphaChannel()
+    side = min(max_side, max(image.width(), image.height()))
+    while True:
+        scaled = image.scaled(side, side, Qt.KeepAspectRatio, Qt.SmoothTransformation) if max(image.width(), image.height()) > side else image
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        scaled.save(buffer, "PNG" if keep_alpha else "JPEG", -1 if keep_alpha else JPEG_QUALITY)
+        buffer.close()
+        if data.size() <= max_bytes or side <= 256:
+            return bytes(data), "image/png" if keep_alpha else "image/jpeg"
+        if keep_alpha:
+            # Flatten onto white and try JPEG before shrinking further
+            flattened = QImage(image.size(), QImage.Format_RGB32)
+            flattened.fill(Qt.white)
+            painter = QPainter(flattened)
+            painter.drawImage(0, 0, image)
+            painter.end()
+            image, keep_alpha = flattened, False
+        else:
+            side = int(side * 0.75)
+
+
+class AttachmentStore:
+    """
+    Content-addressed store of prepared attachments.
+
+    Args:
+        store_dir (str, optional): The store directory. Defaults to ATTACHMENT_DIR.
+    """
+    def __init__(self, store_dir: str | None = None):
+        self.store_dir = store_dir or ATTACHMENT_DIR
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def add(self, path: str, max_side: int = MAX_IMAGE_SIDE, max_bytes: int = MAX_IMAGE_BYTES) -> Attachment:
+        """
+        Prepare a file for sending, reusing the stored result if this content was added before.
+
+        Args:
+            path (str): The file to attach.
+            max_side (int, optional): The longest image side in pixels.
+            max_bytes (int, optional): The largest encoded image size.
+
+        Returns:
+            Attachment: The prepared attachment.
+
+        Raises:
+            Exception: If the file cannot be read or encoded.
+        """
+        name = os.path.basename(path)
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        kind = "image" if mime.startswith("image/") else "file"
+        try:
+            settings = f"{max_side}:{max_bytes}" if kind == "image" else ""
+            key = hashlib.sha256(f"{hash_file(path)}:{settings}".encode("ascii")).hexdigest()
+            meta_path = os.path.join(self.store_dir, f"{key}.json")
+            if os.path.exists(meta_path) and os.path.exists(os.path.join(self.store_dir, f"{key}.b64")):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                return Attachment(key, name, meta["mime"], meta["kind"], meta["size"], self.store_dir)
+
+            attachment = Attachment(key, name, mime, kind, os.path.getsize(path), self.store_dir)
+            prepared = prepare_image(path, max_side, max_bytes) if kind == "image" else None
+            if prepared is not None:
+                data, attachment.mime = prepared
+                attachment.size = len(data)
+                raw_path = os.path.join(self.store_dir, f"{key}.raw")
+                with open(raw_path, "wb") as f:
+                    f.write(data)
+                encode_file_base64(raw_path, attachment.encoded_path)
+                os.remove(raw_path)
+            else:
+                encode_file_base64(path, attachment.encoded_path)
+
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"mime": attachment.mime, "kind": attachment.kind, "size": attachment.size}, f)
+            return attachment
+        except OSError as e:
+            raise Exception(f"Failed to attach '{name}': {e}")
+
+    def get(self, data: dict) -> Attachment:
+        """
+        Return the attachment for a reference stored on a message.
+        """
+        return Attachment.from_dict(data, self.store_dir)
+
+
+def message_content(message: dict, store_dir: str | None = None):
+    """
+    Return the API content of a message, with its attachments as content parts.
+
+    Args:
+        message (dict): The message; may have an "attachments" list of Attachment.to_dict() references.
+        store_dir (str, optional): The store directory. Defaults to ATTACHMENT_DIR.
+
+    Returns:
+        str | list: The plain content, or a list of content parts if there are attachments.
+    """
+    attachments = message.get("attachments")
+    if not attachments:
+        return message["content"]
+    parts = [{"type": "text", "text": str(message["content"])}] if message["content"] else []
+    for data in attachments:
+        parts.append(Attachment.from_dict(data, store_dir).content_part())
+    return parts
@@ -0,0 +1,350 @@
+# batch_runner.py
+
+"""
+Runs a set of prompts across models and temperatures without the GUI.
+
+Prompts are read from a JSON Lines file, one per line:
+
+    {"id": "greeting", "prompt": "Say hello in French."}
+    {"id": "review", "messages": [{"role": "system", "content": "..."}, {"role": "user", "content": "..."}], "max_tokens": 500}
+
+`id` defaults to the line number. Every prompt is sent to every model at
+every temperature, with at most --workers requests in flight. Each result
+is appended to the output file as soon as it completes:
+
+    {"prompt_id": "greeting", "model": "openai/gpt-4o-mini", "temperature": 0.7, "ok": true,
+     "content": "Bonjour !", "served_by": "openai/gpt-4o-mini", "ttft_ms": 412.0,
+     "latency_ms": 655.3, "prompt_tokens": 12, "completion_tokens": 5, "cost": 0.0000048,
+     "cost_estimated": false, "error": null, "finished_at": 1729555200.0}
+
+Runs are resumable: combinations that already have a successful record in
+the output file are skipped, so an interrupted batch continues where it
+stopped (failed ones are retried). At the end, throughput, latency
+percentiles and cost are reported overall and per model. Costs come from
+the API's usage accounting; when it is missing they are estimated from the
+catalog prices.
+
+Uses api_module and the catalog only, so it runs without PyQt.
+
+Usage:
+    python main.py batch PROMPTS.jsonl --models MODEL [MODEL ...] [--temperatures 0.7 ...]
+        [--output results.jsonl] [--workers 4] [--max-tokens 1024] [--no-content]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+from api_module import get_api_key, make_api_request
+from app_logging import get_logger, new_correlation_id, setup_logging
+from catalog import load_catalog
+from request_validator import CHARS_PER_TOKEN, estimate_prompt_tokens, find_model
+
+logger = get_logger("batch")
+
+DEFAULT_WORKERS = 4
+DEFAULT_TEMPERATURES = [0.7]
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def load_prompts(path: str) -> list:
+    """
+    Read the prompt set.
+
+    Args:
+        path (str): The JSON Lines file.
+
+    Returns:
+        list: Dicts with "id", "messages" and optionally "max_tokens".
+
+    Raises:
+        Exception: If a line is not valid JSON or has neither "prompt" nor "messages".
+    """
+    prompts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise Exception(f"{path}:{number}: invalid JSON: {e}")
+            if "messages" in entry:
+                messages = entry["messages"]
+            elif "prompt" in entry:
+                messages = [{"role": "user", "content": entry["prompt"]}]
+            else:
+                raise Exception(f"{path}:{number}: expected a \"prompt\" or \"messages\" field")
+            prompts.append({"id": str(entry.get("id", number)), "messages": messages, "max_tokens": entry.get("max_tokens")})
+    return prompts
+
+
+def result_key(prompt_id, model, temperature) -> tuple:
+    return (str(prompt_id), model, None if temperature is None else float(temperature))
+
+
+def load_finished(path: str) -> tuple:
+    """
+    Read the results already in an output file.
+
+    A final line cut short by an interruption is ignored (and rewritten on the next run).
+
+    Returns:
+        tuple: (records, set of result_key()s of the successful ones).
+    """
+    records = []
+    if not os.path.exists(path):
+        return records, set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    finished = {result_key(r["prompt_id"], r["model"], r["temperature"]) for r in records if r.get("ok")}
+    return records, finished
+
+
+def estimate_cost(model: dict | None, prompt_tokens: int, completion_tokens: int) -> float | None:
+    """
+    Estimate a request's cost in USD from the catalog prices (per token), or None if unknown.
+    """
+    pricing = (model or {}).get("pricing") or {}
+    try:
+        return prompt_tokens * float(pricing["prompt"]) + completion_tokens * float(pricing["completion"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def run_one(api_key: str, prompt: dict, model_id: str, temperature: float | None, catalog: list, max_tokens: int | None = None, keep_content: bool = True) -> dict:
+    """
+    Send one prompt to one model and measure it.
+
+    Returns:
+        dict: The output record (see the module docstring). Failures are recorded, not raised.
+    """
+    request_id = new_correlation_id()
+    served, usage = [], {}
+    content = []
+    first_token = None
+    error = None
+    start = time.perf_counter()
+    try:
+        for chunk in make_api_request(
+            api_key, prompt["messages"], model_id, temperature=temperature, stream=True,
+            max_tokens=prompt["max_tokens"] or max_tokens, request_id=request_id, coalesce=False,
+            on_model=served.append, on_usage=usage.update
+        ):
+            if first_token is None:
+                first_token = time.perf_counter()
+            content.append(chunk)
+    except Exception as e:
+        error = str(e)
+    end = time.perf_counter()
+
+    text = "".join(content)
+    cost_estimated = "cost" not in usage
+    prompt_tokens = usage.get("prompt_tokens") or estimate_prompt_tokens(prompt["messages"])
+    completion_tokens = usage.get("completion_tokens") or len(text) // CHARS_PER_TOKEN
+    if not cost_estimated:
+        cost = usage["cost"]
+    elif error is None:
+        cost = estimate_cost(find_model(catalog, model_id), prompt_tokens, completion_tokens)
+    else:
+        cost, cost_estimated = None, False  # Failed requests are not billed
+    return {
+        "prompt_id": prompt["id"],
+        "model": model_id,
+        "temperature": temperature,
+        "ok": error is None,
+        "content": text if keep_content else None,
+        "served_by": served[0] if served else None,
+        "ttft_ms": round((first_token - start) * 1000, 1) if first_token is not None else None,
+        "latency_ms": round((end - start) * 1000, 1),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost": cost,
+        "cost_estimated": cost_estimated,
+        "error": error,
+        "finished_at": time.time(),
+    }
+
+
+def percentile(values: list, fraction: float) -> float | None:
+    """
+    Return the linearly interpolated percentile of values (fraction in [0, 1]), or None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(records: list, wall_seconds: float | None = None) -> dict:
+    """
+    Aggregate result records.
+
+    Args:
+        records (list): Output records.
+        wall_seconds (float, optional): Elapsed time of the run, for throughput.
+
+    Returns:
+        dict: requests, ok, failed, latency_ms and ttft_ms percentiles ({"p50": ...}),
+            completion_tokens, cost, cost_estimated and, with wall_seconds, requests_per_sec
+            and tokens_per_sec.
+    """
+    ok = [r for r in records if r.get("ok")]
+    summary = {
+        "requests": len(records),
+        "ok": len(ok),
+        "failed": len(records) - len(ok),
+        "latency_ms": {f"p{round(p * 100)}": percentile([r["latency_ms"] for r in ok], p) for p in PERCENTILES},
+        "ttft_ms": {f"p{round(p * 100)}": percentile([r["ttft_ms"] for r in ok if r.get("ttft_ms") is not None], p) for p in PERCENTILES},
+        "completion_tokens": sum(r.get("completion_tokens") or 0 for r in ok),
+        "cost": sum(r.get("cost") or 0 for r in records),
+        "cost_estimated": any(r.get("cost_estimated") for r in records),
+    }
+    if wall_seconds:
+        summary["requests_per_sec"] = len(records) / wall_seconds
+        summary["tokens_per_sec"] = summary["completion_tokens"] / wall_seconds
+    return summary
+
+
+def run_batch(api_key: str, prompts: list, models: list, temperatures: list, output_path: str, workers: int = DEFAULT_WORKERS, max_tokens: int | None = None, keep_content: bool = True, progress_callback=None) -> list:
+    """
+    Run every prompt on every model at every temperature, appending each result to the output file.
+
+    Combinations with a successful record in the output file are skipped. On
+    KeyboardInterrupt, requests not yet started are cancelled and the ones in
+    flight are written before the interrupt is re-raised.
+
+    Args:
+        api_key (str): The API key for authorization.
+        prompts (list): Prompts as returned by load_prompts.
+        models (list): Model IDs.
+        temperatures (list): Temperatures; None uses each model's default.
+        output_path (str): The JSON Lines output file.
+        workers (int, optional): Maximum concurrent requests. Defaults to DEFAULT_WORKERS.
+        max_tokens (int, optional): Completion budget for prompts that do not set their own.
+        keep_content (bool, optional): Whether to store the responses. Defaults to True.
+        progress_callback (callable, optional): Called with (record, done, total) after each result.
+
+    Returns:
+        list: The records written by this run.
+    """
+    catalog = []
+    try:
+        catalog = load_catalog()
+    except Exception as e:
+        logger.warning("No catalog, costs will not be estimated: %s", e)
+    previous, finished = load_finished(output_path)
+    jobs = [(prompt, model, temperature) for prompt in prompts for model in models for temperature in temperatures
+            if result_key(prompt["id"], model, temperature) not in finished]
+    if finished:
+        logger.info("Resuming: %d results already in %s, %d to run", len(finished), output_path, len(jobs))
+
+    records = []
+    with open(output_path, "a", encoding="utf-8") as output:
+        if previous and not _ends_with_newline(output_path):
+            output.write("\n")  # Close a line cut short by an interruption
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        pending = set()
+        queue = iter(jobs)
+        try:
+            while True:
+                # Keep a bounded window of submitted jobs so huge prompt sets stay cheap
+                while len(pending) < workers * 2:
+                    job = next(queue, None)
+                    if job is None:
+                        break
+                    pending.add(executor.submit(run_one, api_key, *job, catalog, max_tokens, keep_content))
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    records.append(record)
+                    if progress_callback:
+                        progress_callback(record, len(records), len(jobs))
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            for future in concurrent.futures.as_completed([f for f in pending if not f.cancelled()]):
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                records.append(record)
+            raise
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    return records
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def print_report(records: list, wall_seconds: float):
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    summary = summarize(records, wall_seconds)
+    cost_note = " (partly estimated)" if summary["cost_estimated"] else ""
+    print(f"\n{summary['requests']} requests, {summary['failed']} failed, in {wall_seconds:.1f}s: "
+          f"{summary['requests_per_sec']:.2f} requests/s, {summary['tokens_per_sec']:.0f} completion tokens/s, "
+          f"cost ${summary['cost']:.4f}{cost_note}")
+    print(f"\n{'model':<45} {'ok':>5} {'fail':>5} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'cost $':>9}")
+    for model in dict.fromkeys(r["model"] for r in records):
+        entry = summarize([r for r in records if r["model"] == model])
+        latency = entry["latency_ms"]
+        print(f"{model:<45} {entry['ok']:>5} {entry['failed']:>5} {ms(latency['p50']):>8} {ms(latency['p90']):>8} "
+              f"{ms(latency['p99']):>8} {ms(entry['ttft_ms']['p50']):>9} {entry['cost']:>9.4f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py batch", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("prompts", help="JSON Lines file of prompts")
+    parser.add_argument("--models", nargs="+", required=True, help="Model IDs to run every prompt on")
+    parser.add_argument("--temperatures", nargs="+", type=float, default=DEFAULT_TEMPERATURES)
+    parser.add_argument("--output", help="JSON Lines results file, appended to and resumed (default: PROMPTS.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Maximum concurrent requests")
+    parser.add_argument("--max-tokens", type=int, help="Completion budget for prompts without their own")
+    parser.add_argument("--no-content", action="store_true", help="Do not store the responses, only the measurements")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    prompts = load_prompts(args.prompts)
+    output_path = args.output or os.path.splitext(args.prompts)[0] + ".results.jsonl"
+    api_key = get_api_key("API_KEY_OPENROUTER")
+
+    def progress(record, done, total):
+        status = "ok" if record["ok"] else f"FAILED: {record['error']}"
+        print(f"[{done}/{total}] {record['prompt_id']} {record['model']} t={record['temperature']}: {record['latency_ms']:.0f} ms {status}", flush=True)
+
+    start = time.perf_counter()
+    try:
+        records = run_batch(api_key, prompts, args.models, args.temperatures, output_path, args.workers, args.max_tokens, not args.no_content, progress)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; finished results are in {output_path}. Run the same command again to resume.")
+        sys.exit(130)
+    if records:
+        print_report(records, time.perf_counter() - start)
+    else:
+        print("Nothing to run: every combination already has a result.")
+    print(f"\nResults: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
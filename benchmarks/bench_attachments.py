@@ -0,0 +1,97 @@
+# bench_attachments.py
+
+"""
+Compares client memory for sending a large attachment: building the base64
+data URL and JSON body in memory versus streaming it from the attachment
+store (attachments.JSONBody).
+
+The fake upstream runs in a subprocess so its own parsing of the body is not
+counted.
+
+Usage:
+    python benchmarks/bench_attachments.py [--size-mb 30]
+"""
+
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_module
+import attachments
+
+SERVER_SCRIPT = (
+    "import sys, time; sys.path.insert(0, sys.argv[1]);"
+    "from fake_openrouter import FakeOpenRouter;"
+    "server = FakeOpenRouter().start(); print(server.base_url, flush=True); time.sleep(3600)"
+)
+
+
+def measure(send):
+    """
+    Runs `send` and returns (seconds, peak traced memory in MB).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    send()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=30)
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SCRIPT, os.path.dirname(os.path.abspath(__file__))],
+        stdout=subprocess.PIPE, text=True
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            api_module.OPENROUTER_API_URL = server.stdout.readline().strip()
+            source = os.path.join(work_dir, "attachment.bin")
+            with open(source, "wb") as f:
+                f.write(os.urandom(args.size_mb * 1024 * 1024))
+            attachments.ATTACHMENT_DIR = os.path.join(work_dir, "store")  # Messages resolve references here
+            store = attachments.AttachmentStore()
+            prepare_seconds = measure(lambda: store.add(source))[0]
+            attachment = store.add(source)
+            cached_seconds = measure(lambda: store.add(source))[0]
+
+            def send_in_memory():
+                with open(source, "rb") as f:
+                    data_url = "data:application/octet-stream;base64," + base64.b64encode(f.read()).decode("ascii")
+                payload = {"model": "fake/model", "messages": [{"role": "user", "content": [
+                    {"type": "text", "text": "Hi"},
+                    {"type": "file", "file": {"filename": "attachment.bin", "file_data": data_url}},
+                ]}]}
+                api_module.get_session().post(f"{api_module.OPENROUTER_API_URL}/chat/completions", data=json.dumps(payload)).close()
+
+            def send_streamed():
+                message = {"role": "user", "content": "Hi", "attachments": [attachment.to_dict()]}
+                for _ in api_module.make_api_request("test-key", [message], "fake/model", stream=True):
+                    pass
+
+            in_memory = measure(send_in_memory)
+            streamed = measure(send_streamed)
+        finally:
+            api_module.reset_session()
+            server.kill()
+
+    print(f"{args.size_mb} MB attachment: prepared in {prepare_seconds:.2f}s, re-attached from the store in {cached_seconds:.2f}s")
+    print(f"in-memory body   {in_memory[0]:6.2f}s  peak {in_memory[1]:8.1f} MB")
+    print(f"streamed body    {streamed[0]:6.2f}s  peak {streamed[1]:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_coalesce.py
+
+"""
+Checks single-flight coalescing of identical streaming requests.
+
+Sends the same prompt from several threads at once against the local fake
+upstream and reports how many upstream generations were started, then
+cancels one subscriber mid-stream to show the others still complete, and
+cancels all of them to show the upstream stream is aborted.
+
+Usage:
+    python benchmarks/bench_coalesce.py [--concurrent 8]
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_module
+from fake_openrouter import FakeOpenRouter
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def collect(stop_after=None):
+    """
+    Streams one request and returns the text, stopping early after `stop_after` chunks.
+    """
+    text = []
+    stream = api_module.make_api_request("test-key", MESSAGES, "fake/model", temperature=0, stream=True)
+    for chunk in stream:
+        text.append(chunk)
+        if stop_after is not None and len(text) >= stop_after:
+            stream.close()
+            break
+    return "".join(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrent", type=int, default=8)
+    args = parser.parse_args()
+
+    chunks = [f"token{i} " for i in range(20)]
+    server = FakeOpenRouter(first_token_delay=0.05, chunks=chunks, chunk_delay=0.01).start()
+    api_module.OPENROUTER_API_URL = server.base_url
+    expected = "".join(chunks)
+    try:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrent) as executor:
+            # The first subscriber cancels after 3 chunks; the rest must still get everything
+            futures = [executor.submit(collect, 3 if i == 0 else None) for i in range(args.concurrent)]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+        complete = sum(result == expected for result in results[1:])
+        print(f"{args.concurrent} identical requests in {elapsed * 1000:.0f} ms -> {server.request_count} upstream call(s)")
+        print(f"cancelled subscriber got {len(results[0])} chars; {complete}/{args.concurrent - 1} others complete")
+
+        before = server.request_count
+        workers = [threading.Thread(target=collect, args=(1,)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        time.sleep(0.1)
+        print(f"all subscribers cancelled -> {server.request_count - before} upstream call(s), in flight now: {len(api_module._flights)}")
+        print(f"stats: {api_module.get_coalescing_stats()}")
+    finally:
+        api_module.reset_session()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
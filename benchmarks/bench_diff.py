@@ -0,0 +1,86 @@
+# bench_diff.py
+
+"""
+Times the response picker's diff against difflib on large generated answers.
+
+Each case diffs a synthetic code answer with an edited copy of itself:
+
+    similar     a few hundred lines changed, inserted or removed
+    rewritten   a quarter of the lines changed
+    unrelated   two independent answers (the deadline path)
+
+text_diff is run word-level (lines first, then words within changed lines);
+difflib's SequenceMatcher is run on the same word tokens, and skipped above
+--difflib-max lines because it gets very slow.
+
+Usage:
+    python benchmarks/bench_diff.py [--lines 10000] [--limit 2.0]
+"""
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_diff import diff_texts, split_words
+
+WORDS = ["def", "return", "self", "value", "for", "in", "if", "else", "print", "data", "item", "result", "=", "(", ")", ":"]
+
+
+def make_answer(rng, lines):
+    return ["    " * rng.randint(0, 3) + " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10))) + "\n" for _ in range(lines)]
+
+
+def edit(rng, lines, count):
+    edited = list(lines)
+    for n in range(count):
+        i = rng.randrange(len(edited))
+        op = rng.random()
+        if op < 0.5:
+            edited[i] = " ".join(rng.choice(WORDS) for _ in range(6)) + "\n"
+        elif op < 0.75:
+            del edited[i]
+        else:
+            edited.insert(i, f"inserted_{n} = {i}\n")
+    return edited
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=10000, help="Lines per answer")
+    parser.add_argument("--limit", type=float, default=2.0, help="text_diff time limit in seconds")
+    parser.add_argument("--difflib-max", type=int, default=2000, help="Skip difflib above this many lines")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    base = make_answer(rng, args.lines)
+    cases = {
+        "similar": edit(rng, base, args.lines // 25),
+        "rewritten": edit(rng, base, args.lines // 4),
+        "unrelated": make_answer(rng, args.lines),
+    }
+    text_a = "".join(base)
+    print(f"{'case':<10} {'text_diff':>10} {'complete':>9} {'ratio':>7} {'difflib':>10} {'ratio':>7}")
+    for name, lines in cases.items():
+        text_b = "".join(lines)
+        start = time.perf_counter()
+        result = diff_texts(text_a, text_b, time_limit=args.limit)
+        ours = time.perf_counter() - start
+
+        if args.lines <= args.difflib_max:
+            start = time.perf_counter()
+            matcher = difflib.SequenceMatcher(None, split_words(text_a), split_words(text_b), autojunk=False)
+            matcher.get_opcodes()
+            theirs = f"{time.perf_counter() - start:9.2f}s"
+            theirs_ratio = f"{matcher.ratio():7.3f}"
+        else:
+            theirs, theirs_ratio = f"{'skipped':>10}", f"{'':>7}"
+        print(f"{name:<10} {ours:9.2f}s {str(result.complete):>9} {result.ratio():7.3f} {theirs} {theirs_ratio}")
+
+
+if __name__ == "__main__":
+    main()
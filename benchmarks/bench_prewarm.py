@@ -0,0 +1,65 @@
+# bench_prewarm.py
+
+"""
+Measures first-message time to first token (TTFT) with and without
+connection pre-warming, against a local stand-in that simulates handshake
+latency on every new connection.
+
+Usage:
+    python benchmarks/bench_prewarm.py [--handshake 0.15] [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_module
+from fake_openrouter import FakeOpenRouter
+
+
+def first_token_time():
+    """
+    Sends one streaming request and returns the seconds until the first chunk.
+    """
+    start = time.perf_counter()
+    stream = api_module.make_api_request("test-key", [{"role": "user", "content": "Hi"}], "fake/model", stream=True)
+    next(stream)
+    ttft = time.perf_counter() - start
+    for _ in stream:
+        pass
+    return ttft
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handshake", type=float, default=0.15, help="Simulated handshake latency in seconds")
+    parser.add_argument("--first-token", type=float, default=0.02, help="Simulated provider latency in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    server = FakeOpenRouter(handshake_delay=args.handshake, first_token_delay=args.first_token).start()
+    api_module.OPENROUTER_API_URL = server.base_url
+    try:
+        cold, warm = [], []
+        for _ in range(args.runs):
+            api_module.reset_session()
+            cold.append(first_token_time())
+
+            api_module.reset_session()
+            api_module.warm_connection()
+            warm.append(first_token_time())
+    finally:
+        api_module.reset_session()
+        server.stop()
+
+    print(f"Simulated handshake {args.handshake * 1000:.0f} ms, provider latency {args.first_token * 1000:.0f} ms, {args.runs} runs")
+    print(f"cold   TTFT median {statistics.median(cold) * 1000:7.1f} ms")
+    print(f"warmed TTFT median {statistics.median(warm) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_proxy.py
+
+"""
+Load-tests proxy_server.py against the local fake upstream.
+
+Starts the fake upstream and the proxy on free ports, then has several
+concurrent clients send streaming chat completions through the proxy and
+reports time to first byte, total latency and the proxy's per-client
+metrics.
+
+Usage:
+    python benchmarks/bench_proxy.py [--clients 8] [--requests 10]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import api_module
+from fake_openrouter import FakeOpenRouter
+from proxy_server import ProxyServer
+
+
+def run_client(base_url, client_index, count):
+    """
+    Sends `count` streaming requests as one client and returns (ttfb, total) pairs.
+    """
+    session = requests.Session()
+    headers = {"X-Client-Id": f"client-{client_index}", "Authorization": "Bearer local"}
+    timings = []
+    for request_index in range(count):
+        # Distinct prompts, so the load is not collapsed by request coalescing
+        payload = {"model": "fake/model", "messages": [{"role": "user", "content": f"Hi {client_index}.{request_index}"}], "stream": True}
+        start = time.perf_counter()
+        with session.post(f"{base_url}/chat/completions", json=payload, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            first_byte = None
+            for data in response.iter_content(chunk_size=None):
+                if first_byte is None and data:
+                    first_byte = time.perf_counter() - start
+        timings.append((first_byte, time.perf_counter() - start))
+    session.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10, help="Requests per client")
+    parser.add_argument("--handshake", type=float, default=0.05, help="Simulated upstream handshake latency in seconds")
+    args = parser.parse_args()
+
+    upstream = FakeOpenRouter(handshake_delay=args.handshake, first_token_delay=0.02).start()
+    api_module.OPENROUTER_API_URL = upstream.base_url
+    proxy = ProxyServer(("127.0.0.1", 0), "test-key")
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+    try:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.clients) as executor:
+            futures = [executor.submit(run_client, proxy.base_url, index, args.requests) for index in range(args.clients)]
+            timings = [timing for future in futures for timing in future.result()]
+        elapsed = time.perf_counter() - start
+        metrics = requests.get(proxy.base_url.rsplit("/v1", 1)[0] + "/metrics").json()
+    finally:
+        proxy.shutdown()
+        proxy.server_close()
+        api_module.reset_session()
+        upstream.stop()
+
+    total = args.clients * args.requests
+    print(f"{total} streaming requests from {args.clients} clients in {elapsed:.2f}s ({total / elapsed:.1f} req/s)")
+    print(f"upstream requests: {upstream.request_count}")
+    print(f"TTFB  median {statistics.median(t[0] for t in timings) * 1000:7.1f} ms")
+    print(f"total median {statistics.median(t[1] for t in timings) * 1000:7.1f} ms")
+    print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
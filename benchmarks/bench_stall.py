@@ -0,0 +1,86 @@
+# bench_stall.py
+
+"""
+Checks the API deadlines against a local upstream that deliberately stalls.
+
+Each scenario reports how long make_api_request took to give up and which
+APITimeoutError it raised:
+
+    silent      the stream goes quiet after two chunks (read timeout / watchdog)
+    keepalive   the stream keeps sending ": OPENROUTER PROCESSING" comments
+                but no tokens (only the stall watchdog catches this)
+    first       no token ever arrives, only keep-alives
+    total       tokens trickle in but the request exceeds its total deadline
+    fallback    the primary model stalls before its first token and the
+                fallback model answers
+
+Usage:
+    python benchmarks/bench_stall.py [--stall 1.0] [--read 3.0]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_module
+from fake_openrouter import FakeOpenRouter
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def run(model, **kwargs):
+    """
+    Streams one request and returns (outcome, seconds, text received).
+    """
+    text = []
+    start = time.perf_counter()
+    try:
+        for chunk in api_module.make_api_request("test-key", MESSAGES, model, stream=True, coalesce=False, **kwargs):
+            text.append(chunk)
+        outcome = "completed"
+    except api_module.APITimeoutError as e:
+        outcome = f"APITimeoutError({e.kind})"
+    except Exception as e:
+        outcome = f"error: {e}"
+    return outcome, time.perf_counter() - start, "".join(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stall", type=float, default=1.0, help="Stall watchdog in seconds")
+    parser.add_argument("--read", type=float, default=3.0, help="Socket read timeout in seconds")
+    args = parser.parse_args()
+
+    server = FakeOpenRouter(
+        chunks=[f"t{i} " for i in range(10)],
+        chunk_delay=0.2,
+        stalling_models={
+            "fake/silent": (2, None),
+            "fake/keepalive": (2, 0.2),
+            "fake/first": (0, 0.2),
+        },
+        stall_seconds=10,
+    ).start()
+    api_module.OPENROUTER_API_URL = server.base_url
+    deadlines = {"read_timeout": args.read, "stall_timeout": args.stall}
+    scenarios = [
+        ("silent", "fake/silent", deadlines),
+        ("keepalive", "fake/keepalive", deadlines),
+        ("first", "fake/first", deadlines),
+        ("total", "fake/model", dict(deadlines, total_timeout=1.0)),
+        ("fallback", "fake/first", dict(deadlines, fallback_models=["fake/model"], server_fallback=False)),
+    ]
+    try:
+        for name, model, kwargs in scenarios:
+            outcome, seconds, text = run(model, **kwargs)
+            print(f"{name:<10} {outcome:<26} after {seconds:5.2f}s, received {text!r}")
+    finally:
+        api_module.reset_session()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
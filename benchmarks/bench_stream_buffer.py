@@ -0,0 +1,105 @@
+# bench_stream_buffer.py
+
+"""
+Benchmarks chunk accumulation for concurrent streamed choices.
+
+Compares naive `str +=` accumulation with stream_buffer.ResponseBuffer, feeding
+each of several threads a long stream of small chunks (as produced by
+make_api_request) and reporting CPU time, wall time and peak traced memory.
+"str +=" is the loop APICallThread used to run; "str += preview" also keeps
+a second reference to the text after every chunk, as a live preview of the
+response would.
+
+Usage:
+    python benchmarks/bench_stream_buffer.py [--chunks 120000] [--choices 6]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_buffer import ResponseBuffer, DEFAULT_SPILL_CHARS
+
+CHUNK_TEXTS = ["The ", "quick ", "brown ", "fox ", "jumps ", "over ", "the ", "lazy ", "dog.\n", "```py\n", "x = 1\n", "```\n"]
+
+
+def accumulate_str(num_chunks, results, index):
+    # The loop APICallThread ran before ResponseBuffer: nothing else holds
+    # response_text, so CPython may resize it in place
+    response_text = ''
+    for i in range(num_chunks):
+        response_text += CHUNK_TEXTS[i % len(CHUNK_TEXTS)]
+    results[index] = len(response_text)
+
+
+def accumulate_str_preview(num_chunks, results, index):
+    response_text = ''
+    for i in range(num_chunks):
+        response_text += CHUNK_TEXTS[i % len(CHUNK_TEXTS)]
+        # Keep a second reference alive, as a progress preview would, which
+        # defeats CPython's in-place concatenation optimization
+        results[index] = response_text
+    results[index] = len(response_text)
+
+
+def accumulate_buffer(num_chunks, results, index, spill_chars=DEFAULT_SPILL_CHARS):
+    response_text = ResponseBuffer(spill_chars)
+    for i in range(num_chunks):
+        response_text.append(CHUNK_TEXTS[i % len(CHUNK_TEXTS)])
+        results[index] = response_text
+    results[index] = len(response_text)
+    response_text.close()
+
+
+def run_case(name, target, num_chunks, num_choices):
+    """
+    Runs `target` in `num_choices` concurrent threads and reports its cost.
+
+    Returns:
+        dict: The measured CPU seconds, wall seconds and peak memory in MB.
+    """
+    results = [None] * num_choices
+    threads = [threading.Thread(target=target, args=(num_chunks, results, i)) for i in range(num_choices)]
+
+    tracemalloc.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "case": name,
+        "cpu_s": round(cpu, 3),
+        "wall_s": round(wall, 3),
+        "peak_mb": round(peak / 1_000_000, 2),
+        "chars_per_choice": results[0],
+    }
+    print(f"{name:<16} cpu={result['cpu_s']:>7}s wall={result['wall_s']:>7}s peak={result['peak_mb']:>8} MB chars/choice={results[0]}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=120_000, help="Chunks streamed per choice")
+    parser.add_argument("--choices", type=int, default=6, help="Concurrent choices")
+    args = parser.parse_args()
+
+    print(f"{args.choices} concurrent choices x {args.chunks} chunks")
+    run_case("str +=", accumulate_str, args.chunks, args.choices)
+    run_case("str += preview", accumulate_str_preview, args.chunks, args.choices)
+    run_case("ResponseBuffer", accumulate_buffer, args.chunks, args.choices)
+
+
+if __name__ == "__main__":
+    main()
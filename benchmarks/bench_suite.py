@@ -0,0 +1,317 @@
+# bench_suite.py
+
+"""
+Benchmarks the request, parse and render hot paths, headless, and compares runs.
+
+Cases:
+
+    request.payload_200_messages   make_api_request for a 200-message history (payload
+                                   building, fingerprinting and JSON encoding)
+    request.stream_parse_20k       make_api_request parsing a 20,000-event SSE stream
+    markdown.small                 mdizer.markdown_to_html on a short answer
+    markdown.large                 mdizer.markdown_to_html on a ~100 KB answer
+    markdown.code_heavy            mdizer.markdown_to_html on 40 highlighted code blocks
+    render.display_message         20 answers appended to a 500-message chat_display (the GUI
+                                   thread's part; their markdown renders on the render pool)
+    render.response_picker         ResponsePicker built with 6 long choices
+    render.model_table             ModelListWindow.populate_table with 2,000 models
+
+The API cases run against an in-memory transport, so no network or key is
+needed; Qt uses the offscreen platform unless QT_QPA_PLATFORM is set.
+
+Each case is set up outside the timed region, run once to warm up and then
+--repeat times. The results (min, median and every run, in seconds) are
+written as JSON with --output. With --baseline, the fastest runs are
+compared with a stored result file (the minimum is the least disturbed by
+other load on the machine) and any case slower by more than --tolerance,
+and by more than --noise-floor seconds, is flagged; the exit status is then 1.
+
+Usage:
+    python benchmarks/bench_suite.py --output baseline.json
+    python benchmarks/bench_suite.py --baseline baseline.json [--tolerance 0.15] [--filter markdown]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("OPENROUTER_MODELS_FILE", os.path.join(ROOT, "fixtures", "models_data.json"))
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+os.environ.setdefault("OPENROUTER_CHAT_DB", os.path.join(tempfile.gettempdir(), "openrouter_bench_chats.sqlite"))
+os.environ.setdefault("OPENROUTER_LOG_FILE", "")
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+CASES = {}
+
+
+def case(name):
+    """
+    Register a benchmark. The decorated function does the untimed setup and returns the callable to time.
+    """
+    def register(function):
+        CASES[name] = function
+        return function
+    return register
+
+
+class _CannedStream:
+    """
+    A raw response body that hands out pre-split chunks, like a socket would.
+    """
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, chunk_size=None, decode_content=True):
+        yield from self.chunks
+
+    def close(self):
+        pass
+
+
+class CannedAdapter(BaseAdapter):
+    """
+    Answers every request with the same stream of SSE events, without a network.
+    """
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict({"Content-Type": "text/event-stream"})
+        response.url = request.url
+        response.request = request
+        response.raw = _CannedStream(self.chunks)
+        return response
+
+    def close(self):
+        pass
+
+
+def sse_events(texts):
+    events = [f'data: {{"model": "openai/gpt-4o-mini", "choices": [{{"delta": {{"content": {json.dumps(text)}}}}}]}}\n\n'.encode() for text in texts]
+    return events + [b"data: [DONE]\n\n"]
+
+
+def sample_answer(paragraphs, code_blocks=0):
+    parts = []
+    for i in range(paragraphs):
+        parts.append(f"## Section {i}\n\nThis is **paragraph {i}** with `inline code`, a [link](https://example.com/{i}) and *emphasis*. "
+                     "It explains the approach in a few sentences so the renderer sees realistic prose.\n\n"
+                     f"- first point {i}\n- second point\n- third point\n")
+    for i in range(code_blocks):
+        parts.append(f"```python\ndef handler_{i}(request, retries=3):\n    for attempt in range(retries):\n"
+                     f"        result = process(request, attempt)  # step {i}\n        if result.ok:\n"
+                     "            return {'status': result.status, 'data': result.json()}\n    raise RuntimeError('failed')\n```\n")
+    return "\n".join(parts)
+
+
+_app = None
+
+
+def _application():
+    """
+    Return the QApplication, after finishing the background renders queued by earlier runs.
+    """
+    global _app
+    from PyQt5.QtWidgets import QApplication
+    from render_pool import get_render_pool
+    if QApplication.instance() is None:
+        _app = QApplication(sys.argv[:1])  # Kept referenced for the whole run
+    get_render_pool().thread_pool.waitForDone()
+    QApplication.processEvents()  # Delivers the results, which are inserted into the display
+    return QApplication.instance()
+
+
+def _run_api_request(history, chunks):
+    import api_module
+    api_module.set_transport(CannedAdapter(chunks))
+    return lambda: sum(1 for chunk in api_module.make_api_request("benchmark", history, "openai/gpt-4o-mini", stream=True, coalesce=False))
+
+
+@case("request.payload_200_messages")
+def payload_case():
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": sample_answer(3, 1)} for i in range(200)]
+    return _run_api_request(history, sse_events(["ok"]))
+
+
+@case("request.stream_parse_20k")
+def stream_parse_case():
+    return _run_api_request([{"role": "user", "content": "Hi"}], sse_events([f"token{i} " for i in range(20000)]))
+
+
+@case("markdown.small")
+def markdown_small_case():
+    import mdizer
+    text = sample_answer(2)
+    return lambda: [mdizer.markdown_to_html(text) for _ in range(20)]
+
+
+@case("markdown.large")
+def markdown_large_case():
+    import mdizer
+    text = sample_answer(300)
+    return lambda: mdizer.markdown_to_html(text)
+
+
+@case("markdown.code_heavy")
+def markdown_code_case():
+    import mdizer
+    text = sample_answer(5, code_blocks=40)
+    return lambda: mdizer.markdown_to_html(text)
+
+
+_chat_window = None
+
+
+@case("render.display_message")
+def display_message_case():
+    global _chat_window
+    import markdown
+    _application()
+    if _chat_window is None:
+        from gui_module import ChatWindow
+        _chat_window = ChatWindow()
+    window = _chat_window
+    # Earlier messages as plain HTML: setHtml with 500 rendered answers (each with its own style block) takes minutes
+    body = markdown.markdown(sample_answer(2, 1), extensions=["fenced_code"])
+    chat_html = "".join(f"<b>Assistant:</b><br>{body}<br><br>" for i in range(500))
+    window.chat_display.setHtml(chat_html)
+    window.message_positions = []
+    answer = sample_answer(4, 2)
+
+    def run():
+        for _ in range(20):
+            window.display_message("Assistant", answer)
+    return run
+
+
+@case("render.response_picker")
+def response_picker_case():
+    from PyQt5.QtCore import QCoreApplication, QEvent
+    from response_picker import ResponsePicker
+    _application()
+    choices = [{"message": {"content": sample_answer(60 + i, 10), "reasoning": "Thinking. " * 2000}} for i in range(6)]
+
+    def run():
+        picker = ResponsePicker(None, choices)
+        picker.deleteLater()
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    return run
+
+
+_model_window = None
+
+
+@case("render.model_table")
+def model_table_case():
+    global _model_window
+    from catalog import MODELS_DATA_FILE
+    _application()
+    if _model_window is None:
+        from model_list import ModelListWindow
+        _model_window = ModelListWindow()
+    window = _model_window
+    with open(MODELS_DATA_FILE, "r", encoding="utf-8") as f:
+        templates = json.load(f)["data"]
+    models = []
+    for i in range(2000):
+        model = dict(templates[i % len(templates)])
+        model["id"] = f"{model['id']}-{i}"
+        model["name"] = f"{model['name']} #{i}"
+        models.append(model)
+    window.columns = window.get_columns_from_models(models)
+    window.table.setColumnCount(len(window.columns))
+    window.table.setHorizontalHeaderLabels(window.columns)
+    return lambda: window.populate_table(models)
+
+
+def run_case(name, repeat):
+    """
+    Return the timings of one case: {"min", "median", "runs"} in seconds.
+    """
+    runs = []
+    CASES[name]()()  # Warm-up: imports, caches, first allocations
+    for _ in range(repeat):
+        function = CASES[name]()
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def compare(results, baseline, tolerance, noise_floor):
+    """
+    Print the fastest runs next to the baseline's and return the names of the cases that regressed.
+    """
+    regressions = []
+    print(f"\n{'case':32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            print(f"{name:32} {'-':>10} {result['min']:10.4f} {'new':>8}")
+            continue
+        change = result["min"] / old["min"] - 1 if old["min"] else 0.0
+        regressed = change > tolerance and result["min"] - old["min"] > noise_floor
+        print(f"{name:32} {old['min']:10.4f} {result['min']:10.4f} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with a results file written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown of the fastest run, as a fraction")
+    parser.add_argument("--noise-floor", type=float, default=0.002, help="Ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    results = {}
+    for name in CASES:
+        if args.filter in name:
+            results[name] = run_case(name, args.repeat)
+            print(f"{name:32} median {results[name]['median']:.4f}s  min {results[name]['min']:.4f}s")
+
+    from PyQt5.QtCore import QT_VERSION_STR
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.noise_floor)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench_tool_calls.py
+
+"""
+Measures assembling large streamed tool call arguments.
+
+Parser: the arguments of one call (a JSON object with a large string and
+many small members) are split into fragments and fed to
+
+    naive        concatenate and try json.loads after every fragment, the
+                 usual way to tell whether the arguments are complete
+    incremental  tool_calls.IncrementalJSONParser
+
+The naive approach is quadratic and skipped above --naive-max bytes.
+
+End to end: the same arguments are streamed by the fake upstream as
+delta.tool_calls events and assembled by make_api_request; the tool runs and
+the follow-up request completes.
+
+Usage:
+    python benchmarks/bench_tool_calls.py [--sizes 16384,262144,2097152] [--fragment 32]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_module
+from fake_openrouter import FakeOpenRouter
+from tool_calls import IncrementalJSONParser, ToolRegistry
+
+
+def make_arguments(size):
+    """
+    Return JSON arguments of about `size` bytes: a file body plus a list of edits.
+    """
+    edits = [{"line": i, "text": f"value = {i}  # \"quoted\" \\ path"} for i in range(size // 200)]
+    body = "def f(x):\n    return x * 2\n" * (size // 60)
+    return json.dumps({"path": "src/module.py", "content": body, "edits": edits})
+
+
+def naive(fragments):
+    text = ""
+    for fragment in fragments:
+        text += fragment
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def incremental(fragments):
+    parser = IncrementalJSONParser()
+    for fragment in fragments:
+        parser.feed(fragment)
+    return parser.value()
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="16384,262144,2097152", help="Argument sizes in bytes, comma-separated")
+    parser.add_argument("--fragment", type=int, default=32, help="Characters per streamed fragment")
+    parser.add_argument("--naive-max", type=int, default=262144, help="Skip the naive parser above this size")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'fragments':>10} {'naive':>10} {'incremental':>12} {'end to end':>11}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        arguments = make_arguments(size)
+        fragments = [arguments[i:i + args.fragment] for i in range(0, len(arguments), args.fragment)]
+        expected = json.loads(arguments)
+
+        if len(arguments) <= args.naive_max:
+            result, naive_time = timed(naive, fragments)
+            assert result == expected
+            naive_text = f"{naive_time:9.3f}s"
+        else:
+            naive_text = f"{'skipped':>10}"
+        result, incremental_time = timed(incremental, fragments)
+        assert result == expected
+
+        server = FakeOpenRouter(chunks=["Saved."], tool_calls=[("write_file", arguments)], tool_chunk_size=args.fragment).start()
+        api_module.OPENROUTER_API_URL = server.base_url
+        registry = ToolRegistry()
+        received = []
+        registry.register("write_file", lambda **kw: received.append(kw) or "ok", "Write a file.", {"type": "object"})
+        start = time.perf_counter()
+        answer = "".join(api_module.stream_with_tools("bench-key", [{"role": "user", "content": "Save it"}], "fake/model", registry, coalesce=False))
+        end_to_end = time.perf_counter() - start
+        server.stop()
+        assert answer == "Saved." and received == [expected]
+
+        print(f"{len(arguments):>10} {len(fragments):>10} {naive_text} {incremental_time:11.3f}s {end_to_end:10.3f}s")
+
+
+if __name__ == "__main__":
+    main()
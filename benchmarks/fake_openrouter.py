@@ -0,0 +1,188 @@
+# fake_openrouter.py
+
+"""
+A local stand-in for the OpenRouter API, used by the benchmarks.
+
+Serves /api/v1/models and a streaming /api/v1/chat/completions over plain
+HTTP/1.1 with keep-alive. `handshake_delay` is paid once per new connection,
+simulating DNS/TCP/TLS setup, so connection reuse can be measured.
+"""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_MODELS = {
+    "data": [
+        {
+            "id": "fake/model",
+            "name": "Fake Model",
+            "context_length": 8192,
+            "top_provider": {"context_length": 8192, "max_completion_tokens": 2048},
+            "supported_parameters": ["temperature", "max_tokens"],
+            "pricing": {"prompt": "0.000001", "completion": "0.000002"},
+        }
+    ]
+}
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive between requests
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        time.sleep(self.server.handshake_delay)  # Paid once per connection
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200, body=True):
+        encoded = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        if body:
+            self.wfile.write(encoded)
+
+    def do_HEAD(self):
+        self.send_json(FAKE_MODELS, body=False)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(FAKE_MODELS)
+        else:
+            self.send_json({"error": {"message": "Not found"}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.request_count += 1
+        self.server.last_payload = payload
+        time.sleep(self.server.first_token_delay)
+
+        status = self.server.failing_models.get(payload.get("model"))
+        if status:
+            self.send_json({"error": {"message": "Simulated failure", "code": status}}, status=status)
+            return
+
+        if not payload.get("stream"):
+            self.send_json({
+                "model": payload.get("model"),
+                "choices": [{"message": {"role": "assistant", "content": "".join(self.server.chunks)}}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        messages = payload.get("messages") or [{}]
+        if self.server.tool_calls and payload.get("tools") and payload.get("tool_choice") != "none" and messages[-1].get("role") != "tool":
+            self.stream_tool_calls(payload.get("model"))
+            return
+        stall = self.server.stalling_models.get(payload.get("model"))
+        try:
+            for index, text in enumerate(self.server.chunks):
+                if stall is not None and index == stall[0]:
+                    self.stall(stall[1])
+                    return
+                event = {"model": payload.get("model"), "choices": [{"delta": {"content": text}}]}
+                self.write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                if self.server.chunk_delay:
+                    time.sleep(self.server.chunk_delay)
+            if (payload.get("usage") or {}).get("include"):
+                prompt_tokens = len(json.dumps(messages)) // 4
+                completion_tokens = len(self.server.chunks)
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                         "total_tokens": prompt_tokens + completion_tokens, "cost": (prompt_tokens + 4 * completion_tokens) * 1e-7}
+                self.write_chunk(f"data: {json.dumps({'model': payload.get('model'), 'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # The client aborted the stream
+
+    def stream_tool_calls(self, model):
+        """
+        Streams the configured tool calls, their arguments in `tool_chunk_size` character fragments.
+        """
+        size = self.server.tool_chunk_size
+        try:
+            for index, (name, arguments) in enumerate(self.server.tool_calls):
+                head = {"index": index, "id": f"call_{index}", "type": "function", "function": {"name": name, "arguments": ""}}
+                fragments = [head] + [{"index": index, "function": {"arguments": arguments[i:i + size]}} for i in range(0, len(arguments), size)]
+                for fragment in fragments:
+                    event = {"model": model, "choices": [{"delta": {"tool_calls": [fragment]}}]}
+                    self.write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            event = {"model": model, "choices": [{"delta": {}, "finish_reason": "tool_calls"}]}
+            self.write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def stall(self, keepalive_interval):
+        """
+        Stops sending events for `stall_seconds`, optionally sending SSE keep-alive comments.
+        """
+        end = time.monotonic() + self.server.stall_seconds
+        while time.monotonic() < end:
+            if keepalive_interval:
+                time.sleep(keepalive_interval)
+                self.write_chunk(b": OPENROUTER PROCESSING\n\n")
+            else:
+                time.sleep(0.05)
+        self.close_connection = True
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenRouter(ThreadingHTTPServer):
+    """
+    A threaded fake API server listening on an ephemeral local port.
+
+    Args:
+        handshake_delay (float): Seconds of delay per new connection.
+        first_token_delay (float): Seconds before each response starts.
+        chunks (list): The content chunks streamed for every completion.
+        chunk_delay (float): Seconds between streamed chunks.
+        failing_models (dict): Model ID -> HTTP status returned instead of a completion.
+        stalling_models (dict): Model ID -> (chunks sent before stalling, keep-alive interval in
+            seconds or None for silence). The stall lasts `stall_seconds`.
+        stall_seconds (float): How long a stall lasts.
+        tool_calls (list): (name, JSON arguments) calls streamed instead of content when the
+            request has tools and does not end with a tool result.
+        tool_chunk_size (int): Characters of arguments per streamed fragment.
+    """
+    daemon_threads = True
+
+    def __init__(self, handshake_delay=0.0, first_token_delay=0.0, chunks=None, chunk_delay=0.0, failing_models=None, stalling_models=None, stall_seconds=30.0, tool_calls=None, tool_chunk_size=16):
+        super().__init__(("127.0.0.1", 0), FakeOpenRouterHandler)
+        self.handshake_delay = handshake_delay
+        self.first_token_delay = first_token_delay
+        self.chunks = chunks if chunks is not None else ["Hello", ", ", "world", "!"]
+        self.chunk_delay = chunk_delay
+        self.failing_models = failing_models or {}
+        self.stalling_models = stalling_models or {}
+        self.stall_seconds = stall_seconds
+        self.tool_calls = tool_calls or []
+        self.tool_chunk_size = tool_chunk_size
+        self.request_count = 0
+        self.last_payload = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
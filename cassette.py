@@ -0,0 +1,445 @@
+# cassette.py
+
+"""
+Record and replay HTTP traffic to the API, for offline regression and performance tests.
+
+A cassette is a JSON Lines file (gzip-compressed if its name ends in .gz)
+with one interaction per line:
+
+    {"method": "POST", "path": "/api/v1/chat/completions", "key": "<sha256 of the body>",
+     "model": "openai/gpt-4o", "status": 200, "reason": "OK",
+     "headers": {"Content-Type": "text/event-stream"}, "wait": 412,
+     "chunks": [[0, "data: {...}\\n\\n"], [35, "data: {...}\\n\\n"], ...]}
+
+`wait` is the time to the response headers and each chunk carries the
+milliseconds since the previous one, so streams replay with their recorded
+pacing. Authorization headers are never written.
+
+The transports are requests adapters, so they plug into api_module's shared
+session. They are selected through the environment:
+
+    OPENROUTER_CASSETTE       the cassette file; unset means live traffic
+    OPENROUTER_CASSETTE_MODE  "replay" (default) or "record"
+    OPENROUTER_REPLAY_SPEED   "recorded" (default), a speed-up factor such as "10",
+                              "instant", or "worst" (every gap as long as the longest one)
+
+On replay a request gets the next unused interaction with the same body,
+or, failing that, the next one for the same model, then for the same method
+and path, in recorded order, so a cassette can drive sessions whose prompts
+differ.
+
+Run as a script to record a completion or to replay a cassette and time it:
+
+    python cassette.py record out.jsonl --model openai/gpt-4o-mini --prompt "Hi"
+    python cassette.py replay out.jsonl [--speed worst]
+"""
+
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from app_logging import get_logger
+
+logger = get_logger("cassette")
+
+CASSETTE_FILE = os.environ.get("OPENROUTER_CASSETTE")
+CASSETTE_MODE = os.environ.get("OPENROUTER_CASSETTE_MODE", "replay")
+REPLAY_SPEED = os.environ.get("OPENROUTER_REPLAY_SPEED", "recorded")
+MERGE_GAP_MS = 1          # Chunks arriving closer together than this are stored as one
+RECORDED_HEADERS = ("Content-Type",)
+
+
+def body_key(body) -> str:
+    """
+    Return a fingerprint of a request body that ignores JSON key order.
+
+    Args:
+        body: The prepared body: bytes, str, an iterable of bytes (streamed uploads) or None.
+
+    Returns:
+        str: A hex digest.
+    """
+    if body is None:
+        data = b""
+    elif isinstance(body, str):
+        data = body.encode("utf-8")
+    elif isinstance(body, (bytes, bytearray)):
+        data = bytes(body)
+    else:
+        data = b"".join(body)  # Streamed bodies (attachments) can be iterated again
+    try:
+        data = json.dumps(json.loads(data), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    return hashlib.sha256(data).hexdigest()
+
+
+def _body_model(body):
+    if isinstance(body, (bytes, str)):
+        try:
+            return json.loads(body).get("model")
+        except (ValueError, AttributeError):
+            return None
+    return None
+
+
+def parse_speed(speed) -> float | str:
+    """
+    Parse a replay speed: a factor dividing the recorded delays, or "worst".
+
+    Args:
+        speed (str | float): "recorded", "instant", "worst" or a number (e.g. "10" for 10x faster).
+
+    Returns:
+        float | str: The factor (0 means no delays), or "worst".
+
+    Raises:
+        ValueError: If the speed is not recognized.
+    """
+    if speed in ("worst", "instant", "recorded"):
+        return {"worst": "worst", "instant": 0.0, "recorded": 1.0}[speed]
+    factor = float(speed)
+    if factor < 0:
+        raise ValueError(f"Invalid replay speed: {speed}")
+    return 1.0 / factor if factor else 0.0
+
+
+class Cassette:
+    """
+    The interactions stored in one cassette file.
+
+    Args:
+        path (str): The cassette file.
+        interactions (list, optional): Use these instead of reading the file.
+    """
+    def __init__(self, path: str, interactions: list | None = None):
+        self.path = path
+        self.interactions = list(interactions or [])
+        self._used = set()
+        self._lock = threading.Lock()
+        if interactions is None and os.path.exists(path):
+            with self._open("rt") as f:
+                self.interactions = [json.loads(line) for line in f if line.strip()]
+
+    def _open(self, mode):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode, encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def append(self, interaction: dict):
+        """
+        Add an interaction and write it to the end of the file.
+        """
+        line = json.dumps(interaction, separators=(",", ":"))  # ASCII-escaped: chunks may hold lone surrogates
+        with self._lock:
+            self.interactions.append(interaction)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._open("at") as f:
+                f.write(line + "\n")
+
+    def match(self, method: str, path: str, key: str, model: str | None = None) -> dict | None:
+        """
+        Return the interaction to replay for a request, or None.
+
+        Prefers the next unused interaction with the same body, then the next
+        unused one for the same model, then for the same method and path; once
+        all have been used they are handed out again in order.
+        """
+        with self._lock:
+            candidates = [i for i, item in enumerate(self.interactions) if item["method"] == method and item["path"] == path]
+            if not candidates:
+                return None
+            exact = [i for i in candidates if self.interactions[i].get("key") == key]
+            same_model = [i for i in candidates if model and self.interactions[i].get("model") == model]
+            for index in itertools.chain(exact, same_model, candidates):
+                if index not in self._used:
+                    break
+            else:
+                # Everything has been replayed once: start over
+                self._used.difference_update(candidates)
+                index = (exact or same_model or candidates)[0]
+            if self.interactions[index].get("key") != key:
+                logger.debug("No recorded body matches; replaying %s %s #%d", method, path, index)
+            self._used.add(index)
+            return self.interactions[index]
+
+
+class _RecordingStream:
+    """
+    Wraps a urllib3 response body, timing each chunk the client reads.
+    """
+    def __init__(self, raw, interaction, cassette, started):
+        self._raw = raw
+        self._interaction = interaction
+        self._cassette = cassette
+        self._last = started
+        self._saved = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def _record(self, data):
+        now = time.monotonic()
+        delay = round((now - self._last) * 1000)
+        self._last = now
+        chunks = self._interaction["chunks"]
+        text = data.decode("utf-8", "surrogateescape")  # Chunks may split a multi-byte character
+        if chunks and delay < MERGE_GAP_MS:
+            chunks[-1][1] += text
+        else:
+            chunks.append([delay, text])
+
+    def _save(self, error=None):
+        if self._saved:
+            return
+        self._saved = True
+        if error:
+            self._interaction["error"] = error
+        self._cassette.append(self._interaction)
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        try:
+            for data in self._raw.stream(amt, decode_content=decode_content):
+                if data:
+                    self._record(data)
+                yield data
+        except ReadTimeoutError:
+            self._save("read_timeout")
+            raise
+        except Exception:
+            self._save("connection")
+            raise
+        self._save()
+
+    def read(self, amt=None, decode_content=None, **kwargs):
+        data = self._raw.read(amt, decode_content=decode_content, **kwargs)
+        if data:
+            self._record(data)
+        if not data or amt is None:
+            self._save()
+        return data
+
+    def close(self):
+        self._save("closed" if not self._raw.closed else None)
+        self._raw.close()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    A pooled HTTP adapter that also writes every response to a cassette.
+
+    Args:
+        cassette (Cassette | str): The cassette, or its file path.
+    """
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        response = super().send(request, **kwargs)
+        if request.method == "HEAD":
+            return response  # Connection warm-ups are not recorded; replays answer them directly
+        interaction = {
+            "method": request.method,
+            "path": urlsplit(request.url).path,
+            "key": body_key(request.body),
+            "model": _body_model(request.body),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            "wait": round((time.monotonic() - started) * 1000),
+            "chunks": [],
+        }
+        response.raw = _RecordingStream(response.raw, interaction, self.cassette, time.monotonic())
+        return response
+
+
+class _ReplayStream:
+    """
+    Plays back recorded chunks with their delays. Closing it interrupts a pending delay.
+    """
+    def __init__(self, chunks, delays, read_timeout, url, error=None):
+        self._chunks = chunks
+        self._delays = delays
+        self._read_timeout = read_timeout
+        self._url = url
+        self._error = error
+        self._closed = threading.Event()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def _wait(self, delay):
+        if self._read_timeout is not None and delay > self._read_timeout:
+            self._closed.wait(self._read_timeout)
+            raise ReadTimeoutError(None, self._url, "Read timed out. (replayed)")
+        if delay:
+            self._closed.wait(delay)
+
+    def stream(self, amt=None, decode_content=None):
+        for delay, data in zip(self._delays, self._chunks):
+            self._wait(delay)
+            if self.closed:
+                return
+            yield data
+        if self._error == "read_timeout":
+            self._wait(float("inf"))
+        elif self._error:
+            raise ProtocolError("Connection broken. (replayed)")
+
+    def read(self, amt=None, decode_content=None, **kwargs):
+        return b"".join(self.stream())
+
+    def close(self):
+        self._closed.set()
+
+    def release_conn(self):
+        pass
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    An adapter that answers requests from a cassette instead of the network.
+
+    Args:
+        cassette (Cassette | str): The cassette, or its file path.
+        speed (str | float, optional): See parse_speed(). Defaults to REPLAY_SPEED.
+    """
+    def __init__(self, cassette, speed=None):
+        super().__init__()
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+        self.speed = parse_speed(speed if speed is not None else REPLAY_SPEED)
+
+    def _delays(self, interaction):
+        """
+        Return (seconds before the headers, seconds before each chunk) at the replay speed.
+        """
+        wait = interaction.get("wait", 0) / 1000
+        gaps = [delay / 1000 for delay, text in interaction.get("chunks", [])]
+        if self.speed == "worst":
+            longest = max(gaps, default=0.0)
+            return wait, [longest] * len(gaps)
+        return wait * self.speed, [gap * self.speed for gap in gaps]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        path = urlsplit(request.url).path
+        interaction = self.cassette.match(request.method, path, body_key(request.body), _body_model(request.body))
+        if interaction is None:
+            if request.method == "HEAD":
+                interaction = {"status": 200, "reason": "OK", "headers": {}, "chunks": []}  # Connection warm-ups
+            else:
+                raise requests.exceptions.ConnectionError(f"No recorded response for {request.method} {path} in {self.cassette.path}", request=request)
+
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        wait, delays = self._delays(interaction)
+        if read_timeout is not None and wait > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(f"Read timed out. (replayed {path})", request=request)
+        time.sleep(wait)
+
+        headers = CaseInsensitiveDict(interaction.get("headers", {}))
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction.get("reason", "")
+        response.headers = headers
+        response.encoding = get_encoding_from_headers(headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        chunks = [text.encode("utf-8", "surrogateescape") for delay, text in interaction.get("chunks", [])]
+        response.raw = _ReplayStream(chunks, delays, read_timeout, request.url, interaction.get("error"))
+        return response
+
+    def close(self):
+        pass
+
+
+def transport_from_env():
+    """
+    Return the adapter selected by OPENROUTER_CASSETTE and OPENROUTER_CASSETTE_MODE, or None for live traffic.
+
+    Raises:
+        Exception: If the mode is unknown or the replay cassette does not exist.
+    """
+    if not CASSETTE_FILE:
+        return None
+    if CASSETTE_MODE == "record":
+        logger.info("Recording API traffic to %s", CASSETTE_FILE)
+        return RecordingAdapter(CASSETTE_FILE)
+    if CASSETTE_MODE == "replay":
+        if not os.path.exists(CASSETTE_FILE):
+            raise Exception(f"Cassette not found: {CASSETTE_FILE}")
+        logger.info("Replaying API traffic from %s at %s speed", CASSETTE_FILE, REPLAY_SPEED)
+        return ReplayAdapter(CASSETTE_FILE)
+    raise Exception(f"Unknown OPENROUTER_CASSETTE_MODE: {CASSETTE_MODE}")
+
+
+def is_replaying() -> bool:
+    """
+    Check whether API traffic is answered from a cassette.
+    """
+    return bool(CASSETTE_FILE) and CASSETTE_MODE == "replay"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay API cassettes.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="Record one streamed completion")
+    record.add_argument("cassette")
+    record.add_argument("--model", required=True)
+    record.add_argument("--prompt", default="Hello!")
+    record.add_argument("--upstream", help="API base URL (default: OpenRouter)")
+    replay = subparsers.add_parser("replay", help="Replay every streamed completion and time it")
+    replay.add_argument("cassette")
+    replay.add_argument("--speed", default=REPLAY_SPEED)
+    args = parser.parse_args()
+
+    import api_module  # Imported here: api_module itself reads this module's settings
+    if args.command == "record":
+        if args.upstream:
+            api_module.OPENROUTER_API_URL = args.upstream.rstrip("/")
+        api_module.set_transport(RecordingAdapter(args.cassette))
+        api_key = api_module.get_api_key("API_KEY_OPENROUTER")
+        messages = [{"role": "user", "content": args.prompt}]
+        for chunk in api_module.make_api_request(api_key, messages, args.model, stream=True, coalesce=False):
+            print(chunk, end="", flush=True)
+        print()
+        return
+
+    cassette = Cassette(args.cassette)
+    streams = [item for item in cassette.interactions if item["method"] == "POST" and item.get("chunks")]
+    print(f"{'#':>3} {'model':<32} {'first token':>12} {'total':>9} {'chars':>8}")
+    for index, item in enumerate(streams):
+        api_module.set_transport(ReplayAdapter(Cassette(args.cassette, [item]), args.speed))
+        start = time.perf_counter()
+        first = None
+        chars = 0
+        try:
+            for chunk in api_module.make_api_request("replay", [{"role": "user", "content": ""}], item.get("model") or "replay", stream=True, coalesce=False, server_fallback=False):
+                if first is None:
+                    first = time.perf_counter() - start
+                chars += len(chunk)
+            outcome = f"{chars:8d}"
+        except Exception as e:
+            outcome = f"  {e}"
+        total = time.perf_counter() - start
+        first_text = f"{first * 1000:10.0f}ms" if first is not None else f"{'-':>12}"
+        print(f"{index:3d} {str(item.get('model')):<32} {first_text} {total:8.2f}s {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# catalog.py
+
+"""
+Access to the locally cached model catalog (the OpenRouter /models response).
+
+Has no PyQt dependency, so headless tools can share it with the GUI.
+"""
+
+import json
+import os
+
+MODELS_DATA_FILE = os.environ.get(
+    "OPENROUTER_MODELS_FILE",
+    r'C:\Code - Copy\FlyAway-pyrq\__PYDATA\models_jason\models_data.json'
+)
+
+
+def catalog_path(file_name: str) -> str:
+    """
+    Return the path of a data file stored alongside the catalog.
+
+    Args:
+        file_name (str): The file name, e.g. "latency_data.json".
+
+    Returns:
+        str: The full path.
+    """
+    return os.path.join(os.path.dirname(MODELS_DATA_FILE), file_name)
+
+
+def load_catalog(file_path: str | None = None) -> list:
+    """
+    Load the model entries from the catalog file.
+
+    Args:
+        file_path (str, optional): The catalog file. Defaults to MODELS_DATA_FILE.
+
+    Returns:
+        list: The model entries.
+
+    Raises:
+        Exception: If the file cannot be read or parsed.
+    """
+    file_path = file_path or MODELS_DATA_FILE
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise Exception(f"Failed to load model catalog from {file_path}: {e}")
+    if isinstance(data, dict):
+        return data.get('data', [])
+    return data if isinstance(data, list) else []
@@ -0,0 +1,251 @@
+# chat_index.py
+
+"""
+Persistent full-text index over chat messages (SQLite FTS5).
+
+Every message added to a conversation is stored with its conversation and
+parent ids, so a search hit can be reopened as the branch that led to it.
+Writes are queued to a background thread with its own connection; searches
+use a separate read connection and return ranked hits with highlighted
+snippets.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from app_logging import get_logger
+
+logger = get_logger("chat_index")
+
+DEFAULT_INDEX_FILE = os.environ.get(
+    "OPENROUTER_CHAT_DB",
+    os.path.join(os.path.expanduser("~"), ".openrouter_chat", "chat_index.db")
+)
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START = "<b style='background-color: #fff59d;'>"
+HIGHLIGHT_END = "</b>"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    node_id TEXT PRIMARY KEY,
+    parent_id TEXT,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    reasoning TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages(conversation_id);
+CREATE INDEX IF NOT EXISTS messages_parent ON messages(parent_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, reasoning, content='messages', content_rowid='rowid', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content, reasoning) VALUES (new.rowid, new.content, new.reasoning);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content, reasoning) VALUES ('delete', old.rowid, old.content, old.reasoning);
+END;
+"""
+
+
+def to_fts_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query that matches all words, the last one as a prefix.
+
+    Args:
+        text (str): The user's search text.
+
+    Returns:
+        str: The FTS5 MATCH expression, or an empty string if there are no words.
+    """
+    words = [word.replace('"', '""') for word in text.split()]
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"  # Search as you type
+    return " ".join(terms)
+
+
+class ChatIndex:
+    """
+    Stores chat messages and searches them.
+
+    Args:
+        db_path (str, optional): The SQLite database file. Defaults to DEFAULT_INDEX_FILE.
+    """
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or DEFAULT_INDEX_FILE
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked by the writer
+            conn.executescript(SCHEMA)
+        conn.close()
+
+        self._read_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._read_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="chat-index-writer", daemon=True)
+        self._writer.start()
+
+    def add_message(self, conversation_id: str, node_id: str, parent_id: str | None, message: dict):
+        """
+        Queue a message for indexing. Returns immediately.
+
+        Args:
+            conversation_id (str): The conversation the message belongs to.
+            node_id (str): The message's node id.
+            parent_id (str | None): The parent message's node id, or None for the first message.
+            message (dict): The message; its reasoning may be a str or a ResponseBuffer.
+        """
+        self._queue.put(("add", (node_id, parent_id, conversation_id, message, time.time())))
+
+    def remove_message(self, node_id: str):
+        """
+        Queue the removal of a message. Returns immediately.
+        """
+        self._queue.put(("remove", node_id))
+
+    def flush(self, timeout: float = None):
+        """
+        Wait until every queued write has been committed.
+        """
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        done.wait(timeout)
+
+    def close(self):
+        """
+        Commit pending writes and stop the writer thread.
+        """
+        self._queue.put(("stop", None))
+        self._writer.join()
+        self._read_conn.close()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        while True:
+            operations = [self._queue.get()]
+            # Batch everything already queued into one transaction
+            while True:
+                try:
+                    operations.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            events = []
+            try:
+                with conn:
+                    for operation, value in operations:
+                        if operation == "add":
+                            node_id, parent_id, conversation_id, message, created = value
+                            reasoning = message.get("reasoning")
+                            conn.execute(
+                                "INSERT OR REPLACE INTO messages (node_id, parent_id, conversation_id, role, content, reasoning, created) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (node_id, parent_id, conversation_id, message["role"], str(message["content"]), str(reasoning) if reasoning else "", created)
+                            )
+                        elif operation == "remove":
+                            conn.execute("DELETE FROM messages WHERE node_id = ?", (value,))
+                        elif operation == "flush":
+                            events.append(value)
+                        elif operation == "stop":
+                            stop = True
+            except sqlite3.Error as e:
+                logger.error("Chat index write failed: %s", e)
+            for event in events:
+                event.set()
+            if stop:
+                conn.close()
+                return
+
+    def search(self, text: str, limit: int = 50) -> list:
+        """
+        Search message contents and reasoning.
+
+        Args:
+            text (str): The search text; all words must match, the last one as a prefix.
+            limit (int, optional): The maximum number of hits. Defaults to 50.
+
+        Returns:
+            list: Hits as dicts with node_id, conversation_id, role, created and snippet
+                (HTML with the matches highlighted), best match first.
+        """
+        query = to_fts_query(text)
+        if not query:
+            return []
+        sql = (
+            "SELECT m.node_id, m.conversation_id, m.role, m.created, "
+            f"snippet(messages_fts, -1, ?, ?, '…', {SNIPPET_TOKENS}) "
+            "FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid "
+            "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?"
+        )
+        try:
+            with self._read_lock:
+                rows = self._read_conn.execute(sql, ("\x01", "\x02", query, limit)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Chat index search failed: %s", e)
+            return []
+        return [
+            {
+                "node_id": node_id,
+                "conversation_id": conversation_id,
+                "role": role,
+                "created": created,
+                "snippet": escape_snippet(snippet),
+            }
+            for node_id, conversation_id, role, created, snippet in rows
+        ]
+
+    def get_branch(self, node_id: str) -> list:
+        """
+        Return the stored branch through a message.
+
+        The branch runs from the first message of its conversation to `node_id`,
+        then continues through the most recent reply at each step.
+
+        Args:
+            node_id (str): The message's node id.
+
+        Returns:
+            list: Dicts with node_id, conversation_id, role, content and reasoning, oldest first.
+        """
+        columns = "node_id, parent_id, conversation_id, role, content, reasoning"
+        with self._read_lock:
+            branch = []
+            current = node_id
+            while current:
+                row = self._read_conn.execute(f"SELECT {columns} FROM messages WHERE node_id = ?", (current,)).fetchone()
+                if row is None:
+                    break
+                branch.append(row)
+                current = row[1]
+            branch.reverse()
+
+            current = node_id
+            while branch:
+                row = self._read_conn.execute(
+                    f"SELECT {columns} FROM messages WHERE parent_id = ? ORDER BY created DESC LIMIT 1", (current,)
+                ).fetchone()
+                if row is None:
+                    break
+                branch.append(row)
+                current = row[0]
+
+        return [
+            {"node_id": row[0], "conversation_id": row[2], "role": row[3], "content": row[4], "reasoning": row[5]}
+            for row in branch
+        ]
+
+
+def escape_snippet(snippet: str) -> str:
+    """
+    HTML-escape a snippet and turn the match markers into highlight tags.
+    """
+    escaped = snippet.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\n', ' ')
+    return escaped.replace("\x01", HIGHLIGHT_START).replace("\x02", HIGHLIGHT_END)
@@ -0,0 +1,201 @@
+# compaction.py
+
+"""
+Summarization-based context compaction for long chats.
+
+When the active branch grows past a share of the model's context, the older
+turns are summarized by a cheap model in a background job. The summary is
+stored against the node of the last message it covers and, from then on,
+sent as a pinned system message in place of those turns; the original
+messages stay in the conversation tree and on screen.
+
+A summary covers the path from the first message to its node, which is the
+same on every branch through that node, so branching and editing need no
+bookkeeping: a branch that does not pass through the node simply does not
+use the summary. Later compactions summarize the previous summary plus the
+turns added since, so each job only reads new text.
+"""
+
+import os
+import threading
+import time
+
+from PyQt5.QtCore import pyqtSignal
+
+from api_module import make_api_request
+from app_logging import get_logger, new_correlation_id
+from request_pool import JobSignals, PoolJob
+from request_validator import estimate_prompt_tokens
+
+logger = get_logger("compaction")
+
+COMPACTION_ENABLED = os.environ.get("OPENROUTER_COMPACTION", "0") == "1"  # Default of the Chat menu toggle
+COMPACTION_MODEL = os.environ.get("OPENROUTER_COMPACTION_MODEL", "openai/gpt-4o-mini")  # Cheap model that writes the summaries
+COMPACTION_THRESHOLD = float(os.environ.get("OPENROUTER_COMPACTION_THRESHOLD", 0.5))  # Share of the context that triggers compaction
+COMPACTION_MIN_TOKENS = 4000     # Shorter prompts are never compacted
+COMPACTION_MAX_TOKENS = 32000    # Trigger when the model's context is unknown
+KEEP_RECENT_MESSAGES = 6         # Latest messages always sent verbatim
+SUMMARY_MAX_TOKENS = 1024        # Completion budget for a summary
+MAX_TRANSCRIPT_MESSAGE_CHARS = 8000  # Longer messages are shortened in the middle for the summarizer
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n\n"
+SUMMARY_INSTRUCTIONS = (
+    "You compress chat transcripts. Summarize the conversation below so the assistant can "
+    "continue it without the original messages. Keep facts, decisions, names, numbers, code "
+    "identifiers, open questions and the user's stated preferences; drop pleasantries. "
+    "Write concise bullet points. If a previous summary is included, merge it in."
+)
+
+
+def summary_message(text: str, covered: int) -> dict:
+    """
+    Return the pinned system message that stands in for summarized turns.
+
+    Args:
+        text (str): The summary.
+        covered (int): How many messages of the branch it replaces.
+    """
+    return {"role": "system", "content": SUMMARY_PREFIX + text.strip(), "pinned": True, "covered": covered}
+
+
+def compaction_trigger(context_length: int | None, threshold: float = COMPACTION_THRESHOLD) -> int:
+    """
+    Return the estimated prompt size, in tokens, above which a chat is compacted.
+    """
+    if not context_length:
+        return COMPACTION_MAX_TOKENS
+    return max(COMPACTION_MIN_TOKENS, int(context_length * threshold))
+
+
+def compacted_history(nodes: list, summaries: dict) -> tuple:
+    """
+    Build the messages to send for a branch, replacing summarized turns by their summary.
+
+    Args:
+        nodes (list): The MessageNodes of the active branch, oldest first.
+        summaries (dict): Summary messages keyed by the node id of the last message they cover.
+
+    Returns:
+        tuple: (messages, number of branch messages replaced by the summary).
+    """
+    for index in range(len(nodes) - 1, -1, -1):
+        summary = summaries.get(nodes[index].node_id)
+        if summary is not None:
+            return [summary] + [node.message for node in nodes[index + 1:]], index + 1
+    return [node.message for node in nodes], 0
+
+
+def compaction_cut(nodes: list, keep_recent: int = KEEP_RECENT_MESSAGES) -> int:
+    """
+    Return the index of the last message to summarize, or -1 if there is nothing to compact.
+
+    The kept messages start at a user message, so a turn and its tool calls are never split.
+    """
+    index = len(nodes) - keep_recent
+    while index > 0 and nodes[index].message.get("role") != "user":
+        index -= 1
+    return index - 1
+
+
+def _transcript_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    content = str(content)
+    if len(content) > MAX_TRANSCRIPT_MESSAGE_CHARS:
+        half = MAX_TRANSCRIPT_MESSAGE_CHARS // 2
+        content = f"{content[:half]}\n[... {len(content) - 2 * half} characters omitted ...]\n{content[-half:]}"
+    for attachment in message.get("attachments") or []:
+        content += f"\n[{attachment['kind']} attachment: {attachment['name']}]"
+    for call in message.get("tool_calls") or []:
+        content += f"\n[Called tool {call['function']['name']}]"
+    return content
+
+
+def summarize(api_key: str, messages: list, model: str = COMPACTION_MODEL, request_id: str | None = None, cancelled: threading.Event | None = None) -> str:
+    """
+    Ask a model for a summary of messages.
+
+    Args:
+        api_key (str): The API key for authorization.
+        messages (list): The messages to summarize; a leading summary message is merged in.
+        model (str, optional): The summarizing model. Defaults to COMPACTION_MODEL.
+        request_id (str, optional): Correlation id for the log.
+        cancelled (threading.Event, optional): Stops the request once set; the result is then partial.
+
+    Returns:
+        str: The summary.
+
+    Raises:
+        Exception: If the request fails or returns no text.
+    """
+    names = {"user": "User", "assistant": "Assistant", "tool": "Tool result", "system": "Previous summary"}
+    transcript = "\n\n".join(f"{names.get(message['role'], message['role'])}: {_transcript_text(message)}" for message in messages)
+    prompt = [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": transcript},
+    ]
+    text = "".join(make_api_request(
+        api_key, prompt, model, temperature=0.2, stream=True, max_tokens=SUMMARY_MAX_TOKENS,
+        coalesce=False, request_id=request_id, cancelled=cancelled
+    ))
+    if not text.strip():
+        raise Exception("The summary was empty.")
+    return text
+
+
+class CompactionSignals(JobSignals):
+    summary_ready = pyqtSignal(str, dict)  # Emits the id of the last summarized node and the summary message
+    failed = pyqtSignal(str)
+
+
+class CompactionJob(PoolJob):
+    """
+    Summarizes the older turns of a branch on the shared request pool.
+
+    Args:
+        api_key (str): The API key for authorization.
+        nodes (list): The MessageNodes of the active branch, oldest first.
+        summaries (dict): The chat's existing summaries, keyed by node id.
+        cut (int): The index of the last node to summarize (see compaction_cut).
+        model (str, optional): The summarizing model.
+    """
+    def __init__(self, api_key, nodes, summaries, cut, model=COMPACTION_MODEL):
+        super().__init__(CompactionSignals())
+        self.api_key = api_key
+        self.node_id = nodes[cut].node_id
+        self.model = model
+        # Start from the newest summary that is still inside the cut
+        self.messages = compacted_history(nodes[:cut + 1], summaries)[0]
+        self.covered = cut + 1
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Stops the summary request; neither summary_ready nor failed is emitted.
+        """
+        self.cancelled.set()
+
+    def work(self):
+        request_id = new_correlation_id()
+        start_time = time.perf_counter()
+        if self.cancelled.is_set():
+            return
+        try:
+            text = summarize(self.api_key, self.messages, self.model, request_id, self.cancelled)
+        except Exception as e:
+            if self.cancelled.is_set():
+                return
+            logger.warning("Compaction failed: %s", e, extra={"request_id": request_id})
+            self.signals.failed.emit(str(e))
+            return
+        if self.cancelled.is_set():
+            logger.info("Compaction cancelled", extra={"request_id": request_id})
+            return
+        summary = summary_message(text, self.covered)
+        logger.info(
+            "Compacted %d messages (~%d tokens) into ~%d tokens in %.1fs",
+            self.covered, estimate_prompt_tokens(self.messages), estimate_prompt_tokens([summary]),
+            time.perf_counter() - start_time, extra={"request_id": request_id}
+        )
+        self.signals.summary_ready.emit(self.node_id, summary)
@@ -0,0 +1,313 @@
+# conversation_tree.py
+
+import uuid
+
+from message_store import HOT_MESSAGES, MessageStore
+
+
+class MessageNode:
+    """
+    A single message in the conversation tree.
+
+    Every branch that shares a prefix shares the same nodes, so memory grows
+    with the number of unique messages rather than branches times depth.
+    An offloaded node keeps only a reference into a MessageStore.
+    """
+    __slots__ = ("_message", "_stored", "parent", "children", "active_child", "node_id", "replaced_child")
+
+    def __init__(self, message, parent=None, node_id=None):
+        self._message = message
+        self._stored = None  # (MessageStore, reference) once offloaded
+        self.parent = parent
+        self.children = []
+        self.active_child = 0  # Index of the child followed when descending
+        self.replaced_child = None  # For an edit, the index of the sibling that was active before it
+        self.node_id = node_id or uuid.uuid4().hex  # Stable id used by the chat index
+
+    @property
+    def message(self):
+        """
+        dict: The message; an offloaded message is read back from its store as a new dict.
+        """
+        if self._stored is not None:
+            store, reference = self._stored
+            return store.get(reference)
+        return self._message
+
+    @property
+    def offloaded(self):
+        """
+        bool: Whether the message lives in a MessageStore instead of RAM.
+        """
+        return self._stored is not None
+
+    def offload(self, store):
+        """
+        Moves the message into `store`. Does nothing for the root or an offloaded node.
+
+        Args:
+            store (MessageStore): The store to write to.
+        """
+        if self._stored is None and self._message is not None:
+            self._stored = (store, store.put(self._message))
+            self._message = None
+
+    def add_child(self, message, activate=True, node_id=None):
+        """
+        Adds a child node for `message`.
+
+        Args:
+            message (dict): The message to store.
+            activate (bool, optional): Whether the new child becomes the active one. Defaults to True.
+            node_id (str, optional): The id of the node, when restoring a stored message.
+
+        Returns:
+            MessageNode: The new child node.
+        """
+        child = MessageNode(message, self, node_id)
+        self.children.append(child)
+        if activate:
+            self.active_child = len(self.children) - 1
+        return child
+
+
+class ConversationTree:
+    """
+    Stores the chat history as a tree of messages.
+
+    The active branch is the path from the root to `current`. Edits and
+    regenerated responses become siblings of the original message, so earlier
+    branches can be revisited without calling the API again.
+
+    `on_add` and `on_remove`, if set, are called with each node added to or
+    removed from the tree.
+    """
+    def __init__(self):
+        self.root = MessageNode(None)
+        self.current = self.root
+        self.on_add = None
+        self.on_remove = None
+        self.store = MessageStore()  # Holds the offloaded messages
+
+    def _added(self, node):
+        if self.on_add is not None:
+            self.on_add(node)
+        return node
+
+    def path_nodes(self):
+        """
+        Returns the nodes on the active branch, oldest first.
+
+        Returns:
+            list: The MessageNode objects from the first message to `current`.
+        """
+        nodes = []
+        node = self.current
+        while node is not self.root:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+    def messages(self):
+        """
+        Returns the messages on the active branch, oldest first.
+
+        Returns:
+            list: The message dicts, suitable for sending to the API.
+        """
+        return [node.message for node in self.path_nodes()]
+
+    def append(self, message, alternatives=()):
+        """
+        Appends a message to the active branch.
+
+        Args:
+            message (dict): The message to append.
+            alternatives (iterable, optional): Messages kept as inactive siblings, such as
+                unchosen response choices. Defaults to ().
+
+        Returns:
+            MessageNode: The node of the appended message.
+        """
+        parent = self.current
+        for alternative in alternatives:
+            self._added(parent.add_child(alternative, activate=False))
+        self.current = self._added(parent.add_child(message))
+        return self.current
+
+    def branch(self, index, message):
+        """
+        Starts a new branch by adding `message` as a sibling of the message at `index`.
+
+        Args:
+            index (int): The position of the message on the active branch.
+            message (dict): The replacement message.
+
+        Returns:
+            MessageNode: The node of the new message, which becomes `current`.
+        """
+        parent = self.path_nodes()[index].parent
+        replaced_child = parent.active_child
+        self.current = self._added(parent.add_child(message))
+        self.current.replaced_child = replaced_child
+        return self.current
+
+    def rewind(self, index):
+        """
+        Moves `current` back to the message at `index` without discarding later messages.
+
+        Args:
+            index (int): The position of the message on the active branch.
+        """
+        self.current = self.path_nodes()[index]
+
+    def descend(self):
+        """
+        Follows the active children from `current` down to a leaf.
+        """
+        node = self.current
+        while node.children:
+            node = node.children[node.active_child]
+        self.current = node
+
+    def pop(self):
+        """
+        Removes the last message of the active branch if it has no descendants.
+
+        If the message was added by branch(), the sibling that was active
+        before it becomes active again.
+
+        Returns:
+            dict | None: The removed message, or None if nothing was removed.
+        """
+        node = self.current
+        if node is self.root or node.children:
+            return None
+        parent = node.parent
+        parent.children.remove(node)
+        if node.replaced_child is not None:
+            parent.active_child = node.replaced_child  # Siblings are appended, so earlier indexes are unchanged
+        else:
+            parent.active_child = max(0, len(parent.children) - 1)
+        self.current = parent
+        if self.on_remove is not None:
+            self.on_remove(node)
+        return node.message
+
+    def find(self, node_id):
+        """
+        Finds a node anywhere in the tree by its id.
+
+        Args:
+            node_id (str): The node id.
+
+        Returns:
+            MessageNode | None: The node, or None if it is not in the tree.
+        """
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.node_id == node_id:
+                return node
+            stack.extend(node.children)
+        return None
+
+    def activate(self, node):
+        """
+        Makes the branch through `node` active and moves `current` to its active leaf.
+
+        Args:
+            node (MessageNode): A node of this tree.
+        """
+        child = node
+        while child.parent is not None:
+            child.parent.active_child = child.parent.children.index(child)
+            child = child.parent
+        self.current = node
+        self.descend()
+
+    def siblings(self, index):
+        """
+        Returns the position of the message at `index` among its siblings.
+
+        Args:
+            index (int): The position of the message on the active branch.
+
+        Returns:
+            tuple: (position, count), with position starting at 0.
+        """
+        node = self.path_nodes()[index]
+        return node.parent.children.index(node), len(node.parent.children)
+
+    def switch_branch(self, index, offset):
+        """
+        Switches the message at `index` to a neighbouring sibling branch.
+
+        Args:
+            index (int): The position of the message on the active branch.
+            offset (int): -1 for the previous sibling, 1 for the next one.
+
+        Returns:
+            bool: True if the branch changed.
+        """
+        node = self.path_nodes()[index]
+        parent = node.parent
+        position = parent.children.index(node) + offset
+        if not 0 <= position < len(parent.children):
+            return False
+        parent.active_child = position
+        self.current = parent.children[position]
+        self.descend()
+        return True
+
+    def offload(self, keep_recent=HOT_MESSAGES):
+        """
+        Moves every message except the newest `keep_recent` of the active branch into the store.
+
+        Args:
+            keep_recent (int, optional): Messages at the end of the active branch kept in RAM.
+                Defaults to HOT_MESSAGES.
+
+        Returns:
+            int: The number of messages offloaded by this call.
+        """
+        path = self.path_nodes()
+        keep = {id(node) for node in path[max(0, len(path) - keep_recent):]}
+        offloaded = 0
+        stack = list(self.root.children)
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children)
+            if id(node) not in keep and not node.offloaded:
+                node.offload(self.store)
+                offloaded += 1
+        return offloaded
+
+    def memory_stats(self):
+        """
+        Returns how many messages the tree holds and how many of them are offloaded.
+
+        Returns:
+            tuple: (messages, offloaded messages).
+        """
+        messages = offloaded = 0
+        stack = list(self.root.children)
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children)
+            messages += 1
+            offloaded += node.offloaded
+        return messages, offloaded
+
+    def clear(self):
+        """
+        Removes every message and empties the store.
+        """
+        self.root = MessageNode(None)
+        self.current = self.root
+        self.store.close()
+        self.store = MessageStore()
+
+    def __len__(self):
+        return len(self.path_nodes())
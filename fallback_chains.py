@@ -0,0 +1,80 @@
+# fallback_chains.py
+
+"""
+Per-model fallback lists, stored in fallback_chains.json next to the catalog.
+
+The file maps a model ID to the models to try, in order, when it fails with
+a rate limit (429), a server error (5xx) or a timeout. A "*" entry applies
+to models without their own list:
+
+    {
+        "anthropic/claude-3.5-sonnet": ["openai/gpt-4o", "google/gemini-pro-1.5"],
+        "*": ["openai/gpt-4o-mini"]
+    }
+"""
+
+import json
+import os
+
+from catalog import catalog_path
+
+FALLBACK_CHAINS_FILE = catalog_path("fallback_chains.json")
+DEFAULT_CHAIN_KEY = "*"
+
+
+def load_fallback_chains(file_path: str | None = None) -> dict:
+    """
+    Load the configured fallback lists.
+
+    Args:
+        file_path (str, optional): The config file. Defaults to FALLBACK_CHAINS_FILE.
+
+    Returns:
+        dict: Model ID -> list of fallback model IDs. Empty if the file does not exist or is invalid.
+    """
+    file_path = file_path or FALLBACK_CHAINS_FILE
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {model_id: [m for m in chain if isinstance(m, str)] for model_id, chain in data.items() if isinstance(chain, list)}
+
+
+def save_fallback_chains(chains: dict, file_path: str | None = None):
+    """
+    Write the fallback lists atomically, dropping empty ones.
+
+    Args:
+        chains (dict): Model ID -> list of fallback model IDs.
+        file_path (str, optional): The config file. Defaults to FALLBACK_CHAINS_FILE.
+    """
+    file_path = file_path or FALLBACK_CHAINS_FILE
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temp_path = file_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({model_id: chain for model_id, chain in chains.items() if chain}, f, indent=2)
+    os.replace(temp_path, file_path)
+
+
+def get_fallback_models(model_id: str, chains: dict | None = None) -> list:
+    """
+    Return the fallback models for a model, without the model itself or duplicates.
+
+    Args:
+        model_id (str): The primary model.
+        chains (dict, optional): The fallback lists. Loaded from FALLBACK_CHAINS_FILE if omitted.
+
+    Returns:
+        list: The fallback model IDs in the order they should be tried.
+    """
+    if chains is None:
+        chains = load_fallback_chains()
+    chain = chains.get(model_id, chains.get(DEFAULT_CHAIN_KEY, []))
+    fallbacks = []
+    for fallback in chain:
+        if fallback != model_id and fallback not in fallbacks:
+            fallbacks.append(fallback)
+    return fallbacks
@@ -1,35 +1,66 @@
 # chat_interface.py
 
 import sys
+import itertools
 import json
+import re
+import threading
+import time
+import uuid
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QComboBox, QTextBrowser, QPushButton, QSpinBox, QMessageBox,
     QLineEdit, QMenu, QAction, QDialog, QMenuBar, QProgressBar, QTextEdit,
-    QSlider, QCheckBox
+    QSlider, QCheckBox, QInputDialog, QFileDialog, QTabWidget, QToolButton, QShortcut
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QTextCursor
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QTextCursor, QTextCharFormat, QDesktopServices, QKeySequence
 
 # Import the updated API module
-from api_module import get_api_key, make_api_request
+from api_module import APITimeoutError, get_api_key, make_api_request, stream_with_tools, warm_connection_async
+from attachments import AttachmentStore
+from catalog import MODELS_DATA_FILE
+from fallback_chains import get_fallback_models, load_fallback_chains, save_fallback_chains
+from request_validator import RequestValidationError, estimate_prompt_tokens, find_model, get_model_limits, supports_parameter, validate_request
+from compaction import COMPACTION_ENABLED, CompactionJob, compacted_history, compaction_cut, compaction_trigger
 import mdizer
+from app_logging import get_logger, new_correlation_id, setup_logging
+from log_viewer import LogViewerDialog
+from conversation_tree import ConversationTree
+from message_store import HOT_MESSAGES, RENDER_PAGE, RENDER_WINDOW, process_memory
+from chat_index import ChatIndex
+from search_dialog import SearchDialog
+from stream_buffer import ResponseBuffer, ReasoningBuffer, DEFAULT_SPILL_CHARS, DEFAULT_REASONING_CAP, DEFAULT_REASONING_MEMORY
+from tool_calls import default_tools
 from response_picker import ResponsePicker
 from model_list import ModelListWindow
+from request_pool import JobSignals, PoolJob, get_request_pool
+from profiling import profiled
+from render_pool import submit_render
+from ui_watchdog import EventLoopWatchdog
 import markdown
 # Import BeautifulSoup for HTML parsing
 from bs4 import BeautifulSoup
 
-class APICallThread(QThread):
-    """
-    Worker thread to handle API calls without blocking the GUI.
-    """
+logger = get_logger("gui")
+
+PREWARM_MIN_INTERVAL = 30      # Seconds since the connection was last used before warming again
+PREWARM_IDLE_INTERVAL_MS = 60000  # How often the idle timer keeps the connection warm
+MEMORY_STATUS_INTERVAL_MS = 2000  # How often the memory indicator is refreshed
+MODEL_VERSION_SUFFIX = re.compile(r"(:[\w.-]+|-\d{4}-\d{2}-\d{2}|-\d{8}|-\d{4})$")  # e.g. ":free", "-2024-08-06", "-0613"
+
+class APICallSignals(JobSignals):
     response_ready = pyqtSignal(list)      # Emits the list of choices once all responses are received
-    no_responses = pyqtSignal()            # Emits if no responses are received
+    no_responses = pyqtSignal(str)         # Emits the reason if no responses are received
     progress_update = pyqtSignal(int)      # Emits the number of chunks received for progress bar
+    reasoning_update = pyqtSignal(int)     # Emits the number of reasoning chunks received
 
-    def __init__(self, api_key, message_history, model, temperature_values, num_choices=1, context_length=None, max_completion_tokens=None, reasoning_effort=None, reasoning_max_tokens=None, exclude_reasoning=False, parent=None):
-        super().__init__(parent)
+class APICallJob(PoolJob):
+    """
+    Runs the API calls of one send on the shared request pool without blocking the GUI.
+    """
+    def __init__(self, api_key, message_history, model, temperature_values, num_choices=1, context_length=None, max_completion_tokens=None, max_tokens=None, reasoning_effort=None, reasoning_max_tokens=None, exclude_reasoning=False, spill_chars=DEFAULT_SPILL_CHARS, reasoning_cap=DEFAULT_REASONING_CAP, reasoning_memory=DEFAULT_REASONING_MEMORY, fallback_models=None, tool_registry=None):
+        super().__init__(APICallSignals())
         self.api_key = api_key
         self.message_history = message_history.copy()
         self.model = model
@@ -37,53 +68,160 @@ class APICallThread(QThread):
         self.num_choices = num_choices
         self.context_length = context_length
         self.max_completion_tokens = max_completion_tokens
+        self.max_tokens = max_tokens
         self.reasoning_effort = reasoning_effort
         self.reasoning_max_tokens = reasoning_max_tokens
         self.exclude_reasoning = exclude_reasoning
-        self.parent_window = parent  # Reference to the main window for HTML extraction
+        self.spill_chars = spill_chars
+        self.reasoning_cap = reasoning_cap
+        self.reasoning_memory = reasoning_memory
+        self.fallback_models = list(fallback_models or [])
+        self.tool_registry = tool_registry
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Stops the job within api_module.CANCEL_POLL seconds, even while it waits for a first token.
 
-    def run(self):
+        The stream is closed, no further choice is requested, and no result is emitted.
+        """
+        self.cancelled.set()
+
+    def work(self):
         choices = []
+        chain = [self.model] + self.fallback_models
         try:
             for i in range(self.num_choices):
+                if self.cancelled.is_set():
+                    logger.info("API call cancelled before choice %d", i + 1)
+                    return
                 temperature = self.temperature_values[i % len(self.temperature_values)]
-                print(f"Choice {i+1}, Temperature: {temperature}")  # Debug statement
-
-                response_text = ''
+                request_id = new_correlation_id()
+                logger.debug("Choice %d, temperature %s", i + 1, temperature, extra={"request_id": request_id})
+
+                response_text = ResponseBuffer(self.spill_chars)
+                reasoning = ReasoningBuffer(self.reasoning_cap, self.reasoning_memory)
+                served = []
+                request_args = {}
+                request = make_api_request
+                if self.tool_registry:
+                    # Tool calls run locally and are noted in the reasoning section
+                    request = stream_with_tools
+                    request_args = {"registry": self.tool_registry, "on_tool_results": lambda calls, results: reasoning.append(
+                        "".join(f"\n[Tool {call.name}: {len(result['content'])} characters]\n" for call, result in zip(calls, results)))}
                 # Make the streaming API request
-                for chunk in make_api_request(
+                stream = request(
                     api_key=self.api_key,
                     message_history=self.message_history,
-                    model=self.model,
+                    model=chain[0],
+                    fallback_models=chain[1:],
+                    on_model=served.append,
                     temperature=temperature,
                     stream=True,
                     context_length=self.context_length,
                     max_completion_tokens=self.max_completion_tokens,
+                    max_tokens=self.max_tokens,
                     reasoning_effort=self.reasoning_effort,
                     reasoning_max_tokens=self.reasoning_max_tokens,
-                    exclude_reasoning=self.exclude_reasoning
-                ):
-                    response_text += chunk
-                    self.progress_update.emit(1)  # Emit one chunk received
+                    exclude_reasoning=self.exclude_reasoning,
+                    with_reasoning=True,
+                    request_id=request_id,
+                    cancelled=self.cancelled,
+                    **request_args
+                )
+                try:
+                    for channel, chunk in stream:
+                        if self.cancelled.is_set():
+                            break
+                        if channel == "reasoning":
+                            reasoning.append(chunk)
+                            self.signals.reasoning_update.emit(1)
+                            continue
+                        response_text.append(chunk)
+                        self.signals.progress_update.emit(1)  # Emit one chunk received
+                finally:
+                    stream.close()  # Unsubscribes from a shared flight, or closes the connection
+                if self.cancelled.is_set():
+                    logger.info("API call cancelled", extra={"request_id": request_id})
+                    return
 
                 # After the full response is received
                 choice = {'message': {'content': response_text}}
+                if reasoning:
+                    choice['message']['reasoning'] = reasoning
+                choice['message']['requested_model'] = self.model
+                if served:
+                    choice['message']['model'] = served[0]
+                    # Once a fallback has taken over, later choices skip the failing models
+                    if served[0] in chain[1:]:
+                        chain = chain[chain.index(served[0]):]
                 choices.append(choice)
+        except APITimeoutError as e:
+            logger.error("API call timed out (%s): %s", e.kind, e)
+            reason = str(e)
         except Exception as e:
-            # Log the exception if needed
-            print(f"Exception during API call: {str(e)}")
+            logger.error("Exception during API call: %s", e)
+            reason = str(e)
+        else:
+            reason = ""
 
         # After attempting all API calls, determine what to emit
         if choices:
-            self.response_ready.emit(choices)
+            self.signals.response_ready.emit(choices)
         else:
-            self.no_responses.emit()
+            self.signals.no_responses.emit(reason)
+
+def same_model(served, requested):
+    """
+    Returns whether `served` is the `requested` model id, ignoring a version or variant suffix.
+    """
+    return MODEL_VERSION_SUFFIX.sub("", served) == MODEL_VERSION_SUFFIX.sub("", requested)
+
+def format_size(size):
+    """
+    Formats a byte count for display, e.g. "1.5 MB".
+    """
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+class AttachmentThread(QThread):
+    """
+    Prepares attachments (hashing, image downscaling, base64 encoding) off the GUI thread.
+    """
+    attachments_ready = pyqtSignal(list)   # Emits the Attachment.to_dict() references
+    attachment_failed = pyqtSignal(str)    # Emits the error message for a file that failed
+
+    def __init__(self, store, paths, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.paths = paths
+
+    def run(self):
+        attachments = []
+        for path in self.paths:
+            try:
+                attachments.append(self.store.add(path).to_dict())
+            except Exception as e:
+                logger.error("Attachment failed: %s", e)
+                self.attachment_failed.emit(str(e))
+        self.attachments_ready.emit(attachments)
 
 class ChatWindow(QMainWindow):
     """
-    Main window of the chat application.
+    One conversation with its own model and settings; shown as a tab of ChatTabs.
+
+    Args:
+        chat_index (ChatIndex, optional): A search index shared with other chats. If omitted
+            the chat opens its own and closes it with the window.
     """
-    def __init__(self):
+    status_changed = pyqtSignal()      # The tab title or pending state changed
+    new_tab_requested = pyqtSignal()
+    open_message_requested = pyqtSignal(str, str)  # A search result from another chat: node id, conversation id
+
+    def __init__(self, chat_index=None):
         super().__init__()
         self.setWindowTitle("OpenRouter Chat Interface")
         self.setGeometry(100, 100, 800, 600)
@@ -92,10 +230,43 @@ class ChatWindow(QMainWindow):
         self.model_id = ""
         self.context_length = 0
         self.max_completion_tokens = 0
-        self.message_history = []
-        self.message_positions = []
+        self.conversation = ConversationTree()
+        self.conversation_id = uuid.uuid4().hex
+        self.message_positions = []  # Document ranges of the rendered messages
+        self.render_start = 0  # Active-branch index of the first rendered message
+        self.render_limit = RENDER_WINDOW  # Messages kept rendered; grows when earlier ones are shown
+        self.pending_renders = {}  # Markdown renders in flight, keyed by message index
+        self.render_serial = itertools.count()
+        # Index every message for search; writes happen on the index's own thread
+        self.owns_chat_index = chat_index is None
+        try:
+            self.chat_index = chat_index or ChatIndex()
+            self.conversation.on_add = self.index_message
+            self.conversation.on_remove = lambda node: self.chat_index.remove_message(node.node_id)
+        except Exception as e:
+            logger.warning("Chat index unavailable: %s", e)
+            self.chat_index = None
+        self.reasoning_chunks = 0
+        self.last_connection_use = 0.0
+        self.pending_attachments = []  # Attachment references for the next message
+        self.attachment_thread = None
+        self.request_pool = get_request_pool()
+        self.active_job = None  # The job computing this chat's pending response
+        self.prompt_queue = []  # User messages waiting for the pending response
+        self.deferred_result = None  # (handler, args) of a result that arrived while the tab was hidden
+        self.summaries = {}  # Pinned summary messages keyed by the id of the last node they cover
+        self.compaction_job = None
+        self.compaction_failed_node = None  # Id of the last node a failed compaction tried to summarize
         self.initUI()
 
+    @property
+    def message_history(self):
+        """
+        list: The messages on the active branch of the conversation.
+        """
+        return self.conversation.messages()
+
+    @profiled("ChatWindow.initUI")
     def initUI(self):
         """
         Initializes the user interface.
@@ -106,7 +277,7 @@ class ChatWindow(QMainWindow):
 
         # Load models from the JSON file
         try:
-            with open(r'C:\Code - Copy\FlyAway-pyrq\__PYDATA\models_jason\models_data.json', 'r') as f:
+            with open(MODELS_DATA_FILE, 'r', encoding='utf-8') as f:
                 model_data = json.load(f)
             self.model_data = model_data['data']
             self.model_id_map = {model['name']: model['id'] for model in self.model_data}
@@ -121,6 +292,8 @@ class ChatWindow(QMainWindow):
         model_label = QLabel("Select Model:")
         self.model_combo = QComboBox()
         self.model_combo.addItems(models_list)  # Use the loaded models_list instead of MODELS
+        self.model_combo.currentIndexChanged.connect(self.prewarm_connection)
+        self.model_combo.currentIndexChanged.connect(self.on_model_changed)
         model_layout.addWidget(model_label)
         model_layout.addWidget(self.model_combo)
         main_layout.addLayout(model_layout)
@@ -130,16 +303,23 @@ class ChatWindow(QMainWindow):
         choices_label = QLabel("Number of Choices:")
         self.choices_spin = QSpinBox()
         self.choices_spin.setMinimum(1)
-        self.choices_spin.setMaximum(6)  # Updated maximum to 6
+        self.choices_spin.setMaximum(32)  # ResponsePicker renders choices lazily
         self.choices_spin.setValue(1)
         choices_layout.addWidget(choices_label)
         choices_layout.addWidget(self.choices_spin)
+        # Let the model call local tools (current time, chat history search)
+        self.tools_checkbox = QCheckBox("Use Tools")
+        self.tools_checkbox.setToolTip("Let the model check the time and search your previous chats.")
+        choices_layout.addWidget(self.tools_checkbox)
         main_layout.addLayout(choices_layout)
 
         # Chat display using QTextBrowser for better HTML rendering
         self.chat_display = QTextBrowser()
         self.chat_display.setReadOnly(True)
-        self.chat_display.setOpenExternalLinks(True)  # Enable clickable links
+        self.chat_display.setOpenLinks(False)  # Links are handled in handle_anchor_clicked
+        self.chat_display.setUndoRedoEnabled(False)  # The undo stack would keep every inserted message
+        self.chat_display.document().setDefaultStyleSheet(mdizer.MARKDOWN_CSS)  # Shared instead of repeated per message
+        self.chat_display.anchorClicked.connect(self.handle_anchor_clicked)
         self.chat_display.setContextMenuPolicy(Qt.CustomContextMenu)
         self.chat_display.customContextMenuRequested.connect(self.show_chat_context_menu)
         main_layout.addWidget(self.chat_display)
@@ -149,12 +329,26 @@ class ChatWindow(QMainWindow):
         self.prompt_input = QLineEdit()
         self.prompt_input.setPlaceholderText("Type your message here...")
         self.prompt_input.returnPressed.connect(self.handle_user_input)
+        self.prompt_input.textEdited.connect(self.prewarm_connection)  # Warm up while the user types
+        attach_button = QPushButton("Attach...")
+        attach_button.clicked.connect(self.attach_files)
         send_button = QPushButton("Send")
         send_button.clicked.connect(self.handle_user_input)
         prompt_layout.addWidget(self.prompt_input)
+        prompt_layout.addWidget(attach_button)
         prompt_layout.addWidget(send_button)
         main_layout.addLayout(prompt_layout)
 
+        # Attachments waiting to be sent with the next message
+        attachments_layout = QHBoxLayout()
+        self.attachments_label = QLabel()
+        self.clear_attachments_button = QPushButton("Remove Attachments")
+        self.clear_attachments_button.clicked.connect(self.clear_attachments)
+        attachments_layout.addWidget(self.attachments_label, 1)
+        attachments_layout.addWidget(self.clear_attachments_button)
+        main_layout.addLayout(attachments_layout)
+        self.update_attachments_label()
+
         # Progress Bar Layout
         progress_layout = QHBoxLayout()
         self.progress_label = QLabel("Progress: 0")
@@ -216,7 +410,7 @@ class ChatWindow(QMainWindow):
 
         # Reasoning Controls
         # First, group box to organize and frame the reasoning controls
-        reasoning_group = QWidget()
+        self.reasoning_group = reasoning_group = QWidget()
         reasoning_layout = QVBoxLayout(reasoning_group)
         reasoning_title = QLabel("<b>Reasoning Token Controls</b>")
         reasoning_layout.addWidget(reasoning_title)
@@ -263,14 +457,55 @@ class ChatWindow(QMainWindow):
         main_widget.setLayout(main_layout)
         self.setCentralWidget(main_widget)
 
+        # Status bar with the request queue and worker pool load
+        self.queue_status_label = QLabel()
+        self.statusBar().addPermanentWidget(self.queue_status_label)
+        self.request_pool.stats_changed.connect(self.update_queue_status)
+        self.update_queue_status()
+        self.memory_status_label = QLabel()
+        self.statusBar().addPermanentWidget(self.memory_status_label)
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setInterval(MEMORY_STATUS_INTERVAL_MS)
+        self.memory_timer.timeout.connect(self.update_memory_status)
+        self.memory_timer.start()
+        self.update_memory_status()
+
         # Menu bar
         menu_bar = self.menuBar()
         chat_menu = menu_bar.addMenu('Chat')
 
+        new_tab_action = QAction('New Tab', self)
+        new_tab_action.triggered.connect(self.new_tab_requested.emit)
+        chat_menu.addAction(new_tab_action)
+
         clear_chat_action = QAction('Clear Chat', self)
         clear_chat_action.triggered.connect(self.clear_chat)
         chat_menu.addAction(clear_chat_action)
 
+        search_action = QAction('Search Conversations...', self)
+        search_action.setShortcut('Ctrl+F')
+        search_action.triggered.connect(self.show_search)
+        chat_menu.addAction(search_action)
+
+        self.compaction_action = QAction('Compact Long Chats', self)
+        self.compaction_action.setCheckable(True)
+        self.compaction_action.setChecked(COMPACTION_ENABLED)
+        self.compaction_action.toggled.connect(lambda checked: self.maybe_compact())
+        chat_menu.addAction(self.compaction_action)
+
+        summary_action = QAction('Show Context Summary', self)
+        summary_action.triggered.connect(self.show_summary)
+        chat_menu.addAction(summary_action)
+
+        fallback_action = QAction('Fallback Models...', self)
+        fallback_action.triggered.connect(self.edit_fallback_models)
+        chat_menu.addAction(fallback_action)
+
+        debug_menu = menu_bar.addMenu('Debug')
+        debug_log_action = QAction('Debug Log', self)
+        debug_log_action.triggered.connect(self.show_debug_log)
+        debug_menu.addAction(debug_log_action)
+
         # Retrieve API key
         try:
             self.api_key = get_api_key("API_KEY_OPENROUTER")
@@ -278,10 +513,20 @@ class ChatWindow(QMainWindow):
             QMessageBox.critical(self, "API Key Error", str(e))
             self.close()
 
+        # Keep a pooled connection to the API host warm in the background
+        self.prewarm_timer = QTimer(self)
+        self.prewarm_timer.setInterval(PREWARM_IDLE_INTERVAL_MS)
+        self.prewarm_timer.timeout.connect(self.prewarm_connection)
+        self.prewarm_timer.start()
+        self.prewarm_connection()
+
         # After loading the model data:
         self.model_data = model_data['data']
         self.model_id_map = {model['name']: model['id'] for model in self.model_data}
 
+        # Give the sliders the initial model's ranges
+        self.on_model_changed()
+
     def extract_text_from_html(self, html_content):
         """
         Extracts plain text from HTML content.
@@ -296,7 +541,7 @@ class ChatWindow(QMainWindow):
             soup = BeautifulSoup(html_content, 'html.parser')
             return soup.get_text()
         except Exception as e:
-            print(f"Error extracting text from HTML: {e}")
+            logger.warning("Error extracting text from HTML: %s", e)
             return html_content  # Return the original content if extraction fails
 
     def update_progress(self, chunks_received):
@@ -305,12 +550,27 @@ class ChatWindow(QMainWindow):
         """
         current_value = self.progress_bar.value() + chunks_received
         self.progress_bar.setValue(current_value)
-        self.progress_label.setText(f"Chunks received: {current_value}")
+        self.update_progress_label()
+
+    def update_reasoning_progress(self, chunks_received):
+        """
+        Counts reasoning chunks separately from content chunks.
+        """
+        self.reasoning_chunks += chunks_received
+        self.update_progress_label()
+
+    def update_progress_label(self):
+        text = f"Chunks received: {self.progress_bar.value()}"
+        if self.reasoning_chunks:
+            text += f" (reasoning: {self.reasoning_chunks})"
+        self.progress_label.setText(text)
 
     def clear_chat(self):
         """
         Clears the chat history and the display.
         """
+        if self.is_busy("clear the chat"):
+            return
         confirmation = QMessageBox.question(
             self,
             "Clear Chat",
@@ -319,33 +579,117 @@ class ChatWindow(QMainWindow):
             QMessageBox.No
         )
         if confirmation == QMessageBox.Yes:
-            self.message_history.clear()
-            self.message_positions.clear()
-            self.chat_display.clear()
+            self.reset_chat()
             QMessageBox.information(self, "Chat Cleared", "The chat has been cleared.")
 
+    def reset_chat(self):
+        """
+        Empties the conversation, its summaries and the display, and starts a new conversation id.
+        """
+        self.conversation.clear()
+        self.conversation_id = uuid.uuid4().hex  # The old chat stays searchable
+        self.summaries.clear()
+        self.compaction_failed_node = None
+        self.message_positions.clear()
+        self.pending_renders.clear()
+        self.render_start = 0
+        self.render_limit = RENDER_WINDOW
+        self.chat_display.clear()
+        self.update_memory_status()
+
     def handle_user_input(self):
         """
         Handles the user's input when they send a message.
         """
         user_input = self.prompt_input.text().strip()
-        if not user_input:
+        if self.attachment_thread is not None and self.attachment_thread.isRunning():
+            QMessageBox.warning(self, "Input Error", "Attachments are still being prepared.")
+            return
+        if not user_input and not self.pending_attachments:
             QMessageBox.warning(self, "Input Error", "Please enter a message.")
             return
 
-        self.message_history.append({"role": "user", "content": user_input})
+        message = {"role": "user", "content": user_input}
+        if self.pending_attachments:
+            message["attachments"] = self.pending_attachments
+            self.pending_attachments = []
+            self.update_attachments_label()
         self.prompt_input.clear()
-        self.display_message("You", user_input)
+        if self.active_job is not None:
+            # Sent once the pending response has been handled
+            self.prompt_queue.append(message)
+            self.update_queue_status()
+            return
+        self.send_message(message)
+
+    def send_message(self, message):
+        """
+        Appends a user message to the conversation, displays it and requests a response.
+        """
+        self.conversation.append(message)
+        self.trim_memory()
+        self.render_limit = RENDER_WINDOW  # Messages shown for reading back are dropped again
+        self.display_message("You", message["content"], attachments=message.get("attachments"))
         self.start_api_call()
 
+    def attach_files(self):
+        """
+        Lets the user pick files or images to send with the next message.
+
+        The files are prepared in an AttachmentThread; the content-addressed
+        store makes re-attaching the same file cheap.
+        """
+        if self.attachment_thread is not None and self.attachment_thread.isRunning():
+            return
+        paths, _ = QFileDialog.getOpenFileNames(
+            self, "Attach Files", "",
+            "Images and documents (*.png *.jpg *.jpeg *.webp *.gif *.bmp *.pdf *.txt *.md *.csv *.json);;All files (*)"
+        )
+        if not paths:
+            return
+        try:
+            store = AttachmentStore()
+        except OSError as e:
+            QMessageBox.critical(self, "Attachment Error", f"The attachment store could not be opened: {e}")
+            return
+        self.attachments_label.setText(f"Preparing {len(paths)} attachment(s)...")
+        self.attachments_label.setVisible(True)
+        self.attachment_thread = AttachmentThread(store, paths, self)
+        self.attachment_thread.attachments_ready.connect(self.add_attachments)
+        self.attachment_thread.attachment_failed.connect(lambda error: QMessageBox.warning(self, "Attachment Error", error))
+        self.attachment_thread.start()
+
+    def add_attachments(self, attachments):
+        self.pending_attachments.extend(attachments)
+        self.update_attachments_label()
+
+    def clear_attachments(self):
+        self.pending_attachments = []
+        self.update_attachments_label()
+
+    def update_attachments_label(self):
+        """
+        Lists the attachments waiting to be sent, hiding the row when there are none.
+        """
+        names = ", ".join(f"{attachment['name']} ({format_size(attachment['size'])})" for attachment in self.pending_attachments)
+        self.attachments_label.setText(f"Attachments: {names}" if names else "")
+        self.attachments_label.setVisible(bool(names))
+        self.clear_attachments_button.setVisible(bool(names))
+
     def start_api_call(self):
         """
-        Initiates the API call in a separate thread.
+        Queues the API call on the shared request pool.
+
+        If no job can be started, the queued prompts are sent on, so they
+        are never overtaken by a prompt typed later.
         """
+        if self.is_busy("send another request"):
+            return
         self.model_name = self.model_combo.currentText()
         model_id = self.model_id_map.get(self.model_name, self.model_id)
         if not model_id:
             QMessageBox.warning(self, "Model Error", f"Could not find ID for model: {self.model_name}")
+            self.api_call_finished()
             return
 
         num_choices = self.choices_spin.value()
@@ -355,19 +699,14 @@ class ChatWindow(QMainWindow):
             temperature_values = [self.temp_slider.value() / 100]
         else:
             all_temperatures = [0.5, 0.6, 0.7, 1.0, 1.1, 1.25]
-            temperature_values = all_temperatures[:num_choices]
-
-        print(f"Number of choices: {num_choices}, Temperatures: {temperature_values}")  # Debug statement
-
-        # Initialize progress bar
-        self.progress_bar.setMaximum(0)  # Indeterminate
-        self.progress_bar.setValue(0)
-        self.progress_label.setText("Chunks received: 0")
-        self.progress_bar.setVisible(True)
-        self.progress_label.setVisible(True)
+            if num_choices <= len(all_temperatures):
+                temperature_values = all_temperatures[:num_choices]
+            else:
+                # Spread larger batches evenly over the same range
+                step = (1.25 - 0.5) / (num_choices - 1)
+                temperature_values = [round(0.5 + i * step, 2) for i in range(num_choices)]
 
-        # Disable input during API call
-        self.prompt_input.setEnabled(False)
+        logger.debug("Number of choices: %d, temperatures: %s", num_choices, temperature_values)
 
         # Use the stored context_length and max_completion_tokens if available
         context_length = self.context_length if self.context_length > 0 else None
@@ -396,33 +735,252 @@ class ChatWindow(QMainWindow):
         # Get exclude reasoning setting
         exclude_reasoning = self.exclude_reasoning_checkbox.isChecked()
         
-        print(f"Reasoning parameters - Effort: {reasoning_effort}, Max Tokens: {reasoning_max_tokens}, Exclude: {exclude_reasoning}")
+        logger.debug("Reasoning parameters - effort: %s, max tokens: %s, exclude: %s", reasoning_effort, reasoning_max_tokens, exclude_reasoning)
+
+        # Older turns are replaced by their summary, if compaction has produced one
+        prompt = self.prompt_messages()
+
+        # Check the request against the model's catalog entry before sending it
+        try:
+            request_kwargs, notes = validate_request(
+                find_model(self.model_data, model_id),
+                prompt,
+                temperature=temperature_values[0],
+                context_length=context_length,
+                max_completion_tokens=max_completion_tokens,
+                reasoning_effort=reasoning_effort,
+                reasoning_max_tokens=reasoning_max_tokens,
+                exclude_reasoning=exclude_reasoning
+            )
+        except RequestValidationError as e:
+            self.handle_no_responses(str(e))
+            self.api_call_finished()
+            return
+        for note in notes:
+            logger.info("Request adjusted: %s", note)
+        if request_kwargs["temperature"] is None:
+            temperature_values = [None]
+
+        # Initialize progress bar
+        self.progress_bar.setMaximum(0)  # Indeterminate
+        self.progress_bar.setValue(0)
+        self.reasoning_chunks = 0
+        self.progress_label.setText("Chunks received: 0")
+        self.progress_bar.setVisible(True)
+        self.progress_label.setVisible(True)
 
-        self.thread = APICallThread(
+        self.active_job = APICallJob(
             api_key=self.api_key,
-            message_history=self.message_history,
+            message_history=prompt,
             model=model_id,
             temperature_values=temperature_values,
             num_choices=num_choices,
-            context_length=self.context_length,
-            max_completion_tokens=self.max_completion_tokens,
-            reasoning_effort=reasoning_effort,
-            reasoning_max_tokens=reasoning_max_tokens,
-            exclude_reasoning=exclude_reasoning,
-            parent=self
+            max_tokens=request_kwargs["max_tokens"],
+            reasoning_effort=request_kwargs["reasoning_effort"],
+            reasoning_max_tokens=request_kwargs["reasoning_max_tokens"],
+            exclude_reasoning=request_kwargs["exclude_reasoning"],
+            fallback_models=get_fallback_models(model_id),
+            tool_registry=default_tools(self.chat_index) if self.tools_checkbox.isEnabled() and self.tools_checkbox.isChecked() else None
         )
-        self.thread.response_ready.connect(self.handle_responses)
-        self.thread.no_responses.connect(self.handle_no_responses)
-        self.thread.progress_update.connect(self.update_progress)
-        self.thread.finished.connect(self.api_call_finished)
-        self.thread.start()
+        self.active_job.signals.response_ready.connect(self.on_job_responses)
+        self.active_job.signals.no_responses.connect(self.on_job_failed)
+        self.active_job.signals.progress_update.connect(self.update_progress)
+        self.active_job.signals.reasoning_update.connect(self.update_reasoning_progress)
+        self.request_pool.submit(self.active_job)
+        self.last_connection_use = time.monotonic()
+        self.status_changed.emit()
+
+    def prompt_messages(self):
+        """
+        Returns the messages to send for the active branch, with summarized turns compacted.
+
+        Reports the estimated prompt tokens saved by the summary in the status bar and the log.
+        """
+        if not self.compaction_action.isChecked():
+            return self.message_history
+        prompt, covered = compacted_history(self.conversation.path_nodes(), self.summaries)
+        if covered:
+            sent = estimate_prompt_tokens(prompt)
+            full = estimate_prompt_tokens(self.message_history)
+            logger.info("Prompt compacted: %d messages summarized, ~%d of ~%d tokens sent (~%d saved)", covered, sent, full, full - sent)
+            self.statusBar().showMessage(f"Context summary: ~{sent:,} prompt tokens sent, ~{full - sent:,} saved ({covered} messages summarized)")
+        return prompt
+
+    def maybe_compact(self):
+        """
+        Starts summarizing older turns in the background once the prompt passes the compaction threshold.
+
+        The summary is only used by sends that start after it is ready, so it never delays a send.
+        """
+        if not self.compaction_action.isChecked() or self.compaction_job is not None:
+            return
+        nodes = self.conversation.path_nodes()
+        prompt, covered = compacted_history(nodes, self.summaries)
+        if estimate_prompt_tokens(prompt) <= compaction_trigger(self.context_length or None):
+            return
+        cut = compaction_cut(nodes)
+        if cut < covered:
+            return  # Only the recent turns are left; nothing new to summarize
+        if nodes[cut].node_id == self.compaction_failed_node:
+            return  # Retried once a new turn moves the cut
+        self.compaction_job = CompactionJob(self.api_key, nodes, self.summaries, cut)
+        self.compaction_job.signals.summary_ready.connect(self.on_summary_ready)
+        self.compaction_job.signals.failed.connect(self.on_compaction_failed)
+        self.compaction_job.signals.finished.connect(self.on_compaction_finished)
+        self.request_pool.submit(self.compaction_job)
+        logger.debug("Compacting the first %d messages", cut + 1)
+
+    def on_summary_ready(self, node_id, summary):
+        self.summaries[node_id] = summary
+        self.statusBar().showMessage(f"Summarized {summary['covered']} older messages; they are sent as a summary from now on.", 10000)
+
+    def on_compaction_failed(self, reason):
+        self.compaction_failed_node = self.compaction_job.node_id
+        self.statusBar().showMessage(f"Context compaction failed: {reason}", 10000)
+
+    def on_compaction_finished(self):
+        job, self.compaction_job = self.compaction_job, None
+        if job.node_id in self.summaries:
+            self.maybe_compact()  # The chat may have grown past the threshold again meanwhile
+
+    def show_summary(self):
+        """
+        Shows the summary that is sent in place of the older turns of the active branch.
+        """
+        prompt, covered = compacted_history(self.conversation.path_nodes(), self.summaries)
+        if not covered:
+            QMessageBox.information(self, "Context Summary", "No part of this conversation has been summarized.")
+            return
+        summary_dialog = QDialog(self)
+        summary_dialog.setWindowTitle(f"Context Summary ({covered} messages)")
+        layout = QVBoxLayout(summary_dialog)
+        summary_browser = QTextBrowser(summary_dialog)
+        summary_browser.setPlainText(prompt[0]["content"])
+        submit_render(prompt[0]["content"], summary_browser.setHtml)
+        layout.addWidget(summary_browser)
+        summary_dialog.resize(700, 500)
+        summary_dialog.exec_()
+
+    def on_job_responses(self, choices):
+        if self.defer_result(self.on_job_responses, choices):
+            return
+        try:
+            self.handle_responses(choices)
+        finally:
+            self.api_call_finished()
+
+    def on_job_failed(self, reason):
+        if self.defer_result(self.on_job_failed, reason):
+            return
+        try:
+            self.handle_no_responses(reason)
+        finally:
+            self.api_call_finished()
+
+    def defer_result(self, handler, *args):
+        """
+        Holds a finished job's result while this chat is in a background tab.
+
+        Rendering the response (and any picker or error dialog) waits until the
+        tab is shown, so background generations cost no render time.
+
+        Returns:
+            bool: True if the result was deferred.
+        """
+        if self.isVisible():
+            return False
+        self.deferred_result = (handler, args)
+        self.status_changed.emit()
+        return True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.deferred_result is not None:
+            handler, args = self.deferred_result
+            self.deferred_result = None
+            QTimer.singleShot(0, lambda: handler(*args))
+
+    def tab_title(self):
+        """
+        Returns the tab text: the first prompt (or the model), marked while a response is pending or unread.
+        """
+        nodes = self.conversation.path_nodes()
+        title = nodes[0].message["content"] if nodes else self.model_combo.currentText().split(": ")[-1]
+        title = " ".join(str(title).split())
+        if len(title) > 24:
+            title = title[:23] + "\u2026"
+        if self.deferred_result is not None:
+            return "\u25cf " + title  # A response is waiting to be shown
+        if self.active_job is not None:
+            return "\u23f3 " + title
+        return title or "New Chat"
 
     def api_call_finished(self):
         """
-        Re-enables the input after the API call is finished.
+        Clears the running job once its result has been handled and sends the next queued prompt.
+
+        Runs after the result handlers rather than on the job's finished signal,
+        so a queued prompt can never be appended before the response it follows.
+        """
+        self.active_job = None
+        self.progress_bar.setVisible(False)
+        self.progress_label.setVisible(False)
+        self.last_connection_use = time.monotonic()
+        self.trim_memory()
+        self.maybe_compact()
+        if self.prompt_queue:
+            self.send_message(self.prompt_queue.pop(0))
+        self.update_queue_status()
+        self.status_changed.emit()
+
+    def cancel_requests(self):
+        """
+        Stops the pending response and summary and drops the queued prompts, for a chat that is being closed.
+
+        Jobs still waiting for a pool worker are taken off the queue, so they never send a request.
         """
-        self.prompt_input.setEnabled(True)
+        self.prompt_queue.clear()
+        for job in (self.active_job, self.compaction_job):
+            if job is not None:
+                job.cancel()
+                self.request_pool.cancel(job)
 
+    def is_busy(self, action=None):
+        """
+        Returns True, after warning if `action` is given, while a response is pending for this chat.
+        """
+        if self.active_job is None:
+            return False
+        if action:
+            QMessageBox.warning(self, "Response Pending", f"Wait for the current response before you {action}.")
+        return True
+
+    def update_queue_status(self, *args):
+        """
+        Shows this chat's queued prompts and the shared pool's load in the status bar.
+        """
+        queued, running, max_workers = self.request_pool.stats()
+        text = f"Workers: {running}/{max_workers} busy"
+        if queued:
+            text += f", {queued} request(s) waiting for a worker"
+        if self.prompt_queue:
+            text = f"{len(self.prompt_queue)} prompt(s) queued in this chat | " + text
+        self.queue_status_label.setText(text)
+
+    def prewarm_connection(self, *args):
+        """
+        Opens or refreshes the pooled API connection in the background.
+
+        Called at startup, on model switch, while the user types and on an idle
+        timer. Skipped if the connection was used recently, so it costs at most
+        one HEAD request per PREWARM_MIN_INTERVAL and never a billable call.
+        """
+        if time.monotonic() - self.last_connection_use < PREWARM_MIN_INTERVAL or not self.isVisible():
+            return  # Background tabs leave it to the visible one
+        self.last_connection_use = time.monotonic()
+        warm_connection_async()
+
+    @profiled("handle_responses")
     def handle_responses(self, choices):
         """
         Handles the responses received from the API.
@@ -432,55 +990,92 @@ class ChatWindow(QMainWindow):
 
         if len(choices) == 1:
             response = choices[0]["message"]
-            content = response.get("content", "").strip()
+            content = str(response.get("content", "")).strip()
             reasoning = response.get("reasoning", "")
             
             # Add the response to message history
             message_data = {"role": "assistant", "content": content}
             if reasoning:
                 message_data["reasoning"] = reasoning
-            self.message_history.append(message_data)
+            for key in ("model", "requested_model"):
+                if response.get(key):
+                    message_data[key] = response[key]
+            self.conversation.append(message_data)
             
             # Display in the chat
-            self.display_message("Assistant", content, reasoning)
+            self.display_message("Assistant", content, reasoning, message_data.get("model"), requested_model=message_data.get("requested_model"))
         else:
             response_picker = ResponsePicker(self, choices)
             if response_picker.exec_() == QDialog.Accepted:
                 selected_content = response_picker.get_selected_content()
                 selected_reasoning = response_picker.get_selected_reasoning()
+                selected_index = response_picker.get_selected_index()
                 if selected_content:
                     # Create message data for history
                     message_data = {"role": "assistant", "content": selected_content}
                     if selected_reasoning:
                         message_data["reasoning"] = selected_reasoning
-                    self.message_history.append(message_data)
+                    for key in ("model", "requested_model"):
+                        if choices[selected_index]["message"].get(key):
+                            message_data[key] = choices[selected_index]["message"][key]
+                    # Keep the unchosen choices as sibling branches
+                    alternatives = [self.choice_to_message(choice) for i, choice in enumerate(choices) if i != selected_index]
+                    self.conversation.append(message_data, alternatives)
                     
                     # Display in chat
-                    self.display_message("Assistant", selected_content, selected_reasoning)
+                    self.display_message("Assistant", selected_content, selected_reasoning, message_data.get("model"), requested_model=message_data.get("requested_model"))
             else:
                 QMessageBox.warning(self, "Selection Cancelled", "No response was selected.")
 
-    def handle_no_responses(self):
+    def choice_to_message(self, choice):
+        """
+        Converts a response choice into a message dict for the conversation tree.
+        """
+        message_data = {"role": "assistant", "content": str(choice["message"].get("content", "")).strip()}
+        if choice["message"].get("reasoning"):
+            message_data["reasoning"] = choice["message"]["reasoning"]
+        for key in ("model", "requested_model"):
+            if choice["message"].get(key):
+                message_data[key] = choice["message"][key]
+        return message_data
+
+    def handle_no_responses(self, reason=None):
         """
         Handles the scenario where no responses are received.
+
+        Args:
+            reason (str, optional): Why the request failed, shown to the user.
         """
+        # A failed regeneration keeps the user message and returns to the previous response
+        if self.conversation.current.children:
+            self.conversation.descend()
+            self.refresh_chat_display()
+            QMessageBox.warning(self, "Error", "No responses received due to an error. The previous response has been restored." + (f"\n\n{reason}" if reason else ""))
+            return
+
         # Delete the last user message
-        if self.message_history and self.message_history[-1]["role"] == "user":
-            last_message = self.message_history.pop()
-            if self.message_positions:
-                self.message_positions.pop()
-            self.chat_display.undo()  # Undo the last display
-            self.alert_user_no_responses(last_message["content"])
+        last = self.conversation.current.message
+        if last is not None and last["role"] == "user":
+            last_message = self.conversation.pop()
+            parent = self.conversation.current
+            self.conversation.descend()  # A failed edit falls back to the original branch
+            if self.conversation.current is not parent:
+                self.refresh_chat_display()
+            else:
+                self.remove_last_displayed_message()
+            self.alert_user_no_responses(last_message["content"], reason)
         else:
             # In case there's no user message to delete
-            self.alert_user_no_responses(None)
+            self.alert_user_no_responses(None, reason)
 
-    def alert_user_no_responses(self, last_message_content):
+    def alert_user_no_responses(self, last_message_content, reason=None):
         """
         Alerts the user that no responses were received.
         """
         error_dialog = QMessageBox(self)
         error_dialog.setWindowTitle("Error")
+        if reason:
+            error_dialog.setInformativeText(reason)
         if last_message_content:
             error_dialog.setText("No responses received due to an error. Your last message has been removed.")
             copy_button = error_dialog.addButton("Copy Message", QMessageBox.ActionRole)
@@ -505,48 +1100,203 @@ class ChatWindow(QMainWindow):
         clipboard.setText(message)
         QMessageBox.information(self, "Copied", "Your message has been copied to the clipboard.")
 
-    def display_message(self, sender, message, reasoning=None):
+    @profiled("display_message")
+    def display_message(self, sender, message, reasoning=None, model=None, attachments=None, requested_model=None):
         """
         Displays a message in the chat window with proper markdown formatting.
+
+        Reasoning is not rendered inline; a link is shown instead and the
+        reasoning is rendered only when the user opens it. `model` is the model
+        that served a response; it is shown when it differs from `requested_model`,
+        the model the response was requested from.
+        Attachments are listed by name.
+
+        Assistant messages are shown as plain text first and converted to
+        markdown on the render pool; on_markdown_rendered swaps the HTML in.
         """
-        if sender.lower() == "assistant":
-            try:
-                formatted_message = mdizer.markdown_to_html(message)
-                if reasoning:
-                    formatted_reasoning = mdizer.markdown_to_html(reasoning)
-                else:
-                    formatted_reasoning = None
-            except Exception as e:
-                formatted_message = self.escape_html(message)
-                formatted_reasoning = self.escape_html(reasoning) if reasoning else None
-                print(f"Markdown conversion failed: {e}")
-        else:
-            formatted_message = self.escape_html(message)
-            formatted_reasoning = None
-        
+        index = self.render_start + len(self.message_positions)
+
         # Start with sender and the main message
-        full_message = f"<b>{sender}:</b><br>{formatted_message}"
+        header = f"<b>{sender}:</b>"
+        if model and requested_model and not same_model(model, requested_model):
+            header += f" <i>(served by {self.escape_html(model)})</i>"
+        footer = ""
+        for attachment in attachments or []:
+            footer += f"<br><i>[{attachment['kind']}: {self.escape_html(attachment['name'])}, {format_size(attachment['size'])}]</i>"
         
-        # Add reasoning if it exists
-        if formatted_reasoning:
-            full_message += f"<br><br><details><summary><b>Reasoning</b></summary><div class='reasoning'>{formatted_reasoning}</div></details>"
+        # Add a link to the reasoning if it exists (keyed by message index)
+        if reasoning:
+            footer += f"<br><a href='reasoning:{index}'><b>Show Reasoning</b></a> ({len(reasoning)} characters)"
             
         # Add final break
-        full_message += "<br><br>"
+        footer += "<br><br>"
         
         # Use insertHtml instead of append
         cursor = self.chat_display.textCursor()
         cursor.movePosition(QTextCursor.End)
-        cursor.insertHtml(full_message)
+        start_pos = cursor.position()
+        cursor.insertHtml(f"{header}<br>")
+        body_start = cursor.position()
+        if sender.lower() == "assistant":
+            cursor.insertText(message, QTextCharFormat())  # Escaped plain text until the markdown is rendered
+        else:
+            cursor.insertHtml(self.escape_html(message))
+        body_end = cursor.position()
+        cursor.insertHtml(footer)
         
         # Record the start and end positions for editing
         end_pos = cursor.position()
-        start_pos = end_pos - len(full_message)
         self.message_positions.append((start_pos, end_pos))
+        if sender.lower() == "assistant" and message:
+            key = (index, body_start - start_pos, body_end - start_pos, next(self.render_serial))
+            self.pending_renders[index] = key
+            submit_render(message, self.on_markdown_rendered, key, include_style=False)
+        self.trim_display()
         
         # Ensure the latest message is visible
         self.chat_display.ensureCursorVisible()
 
+    def on_markdown_rendered(self, html, key):
+        """
+        Replaces the plain text of a displayed message with its rendered markdown.
+
+        Results for messages that were removed or re-displayed meanwhile are dropped.
+        """
+        index, body_start, body_end, serial = key
+        if self.pending_renders.get(index) != key:
+            return
+        del self.pending_renders[index]
+        local = index - self.render_start
+        if not 0 <= local < len(self.message_positions):
+            return
+        start, end = self.message_positions[local]
+        scroll_bar = self.chat_display.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+        document = self.chat_display.document()
+        size = document.characterCount()
+        cursor = QTextCursor(document)
+        cursor.setPosition(start + body_start)
+        cursor.setPosition(start + body_end, QTextCursor.KeepAnchor)
+        cursor.insertHtml(html)
+        shift = document.characterCount() - size
+        self.message_positions[local] = (start, end + shift)
+        for i in range(local + 1, len(self.message_positions)):
+            later_start, later_end = self.message_positions[i]
+            self.message_positions[i] = (later_start + shift, later_end + shift)
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def insert_earlier_link(self):
+        """
+        Inserts the link to the messages above the rendered window at the top of the display.
+
+        Returns:
+            int: The number of characters inserted.
+        """
+        if self.render_start == 0:
+            return 0
+        document = self.chat_display.document()
+        size = document.characterCount()
+        cursor = QTextCursor(document)
+        cursor.insertHtml(
+            f"<a href='earlier:'><b>Show {min(RENDER_PAGE, self.render_start)} earlier messages</b></a>"
+            f" ({self.render_start} not shown)<br><br>"
+        )
+        return document.characterCount() - size
+
+    def trim_display(self):
+        """
+        Removes the oldest rendered messages once more than `render_limit` are shown.
+        """
+        excess = len(self.message_positions) - self.render_limit
+        if excess <= 0:
+            return
+        cut = self.message_positions[excess - 1][1]
+        cursor = QTextCursor(self.chat_display.document())
+        cursor.setPosition(cut, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()  # Also removes the old earlier-messages link
+        del self.message_positions[:excess]
+        self.render_start += excess
+        shift = self.insert_earlier_link() - cut
+        self.message_positions = [(start + shift, end + shift) for start, end in self.message_positions]
+
+    def remove_last_displayed_message(self):
+        """
+        Removes the newest rendered message from the display.
+        """
+        if not self.message_positions:
+            return
+        start, end = self.message_positions.pop()
+        self.pending_renders.pop(self.render_start + len(self.message_positions), None)
+        cursor = QTextCursor(self.chat_display.document())
+        cursor.setPosition(start)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+
+    def show_earlier_messages(self):
+        """
+        Renders another page of the messages above the rendered window, read back from the store if needed.
+        """
+        first_shown = self.render_start
+        self.render_limit += RENDER_PAGE
+        self.refresh_chat_display()
+        self.scroll_to_message(first_shown)
+
+    def trim_memory(self):
+        """
+        Moves all but the newest messages of the conversation out of RAM.
+        """
+        offloaded = self.conversation.offload(HOT_MESSAGES)
+        if offloaded:
+            logger.debug("Offloaded %d messages to the message store", offloaded)
+
+    def update_memory_status(self):
+        """
+        Shows the process memory and how many of the chat's messages are offloaded in the status bar.
+        """
+        messages, offloaded = self.conversation.memory_stats()
+        memory = process_memory()
+        text = f"Memory: {format_size(memory)}" if memory is not None else "Memory: n/a"
+        text += f" | {messages:,} messages"
+        if offloaded:
+            store = self.conversation.store
+            text += f", {offloaded:,} offloaded ({format_size(store.stored_bytes)} compressed)"
+        self.memory_status_label.setText(text)
+
+    def handle_anchor_clicked(self, url):
+        """
+        Opens reasoning links in a viewer and external links in the browser.
+        """
+        if url.scheme() == "reasoning":
+            self.show_reasoning(int(url.path()))
+        elif url.scheme() == "earlier":
+            self.show_earlier_messages()
+        else:
+            QDesktopServices.openUrl(url)
+
+    def show_reasoning(self, index):
+        """
+        Renders the reasoning of a message on demand in a separate dialog.
+        """
+        nodes = self.conversation.path_nodes()
+        if not 0 <= index < len(nodes):
+            return
+        reasoning = nodes[index].message.get("reasoning")
+        if not reasoning:
+            return
+
+        reasoning_dialog = QDialog(self)
+        reasoning_dialog.setWindowTitle("Reasoning")
+        layout = QVBoxLayout(reasoning_dialog)
+        reasoning_browser = QTextBrowser(reasoning_dialog)
+        reasoning_browser.setOpenExternalLinks(True)
+        reasoning = str(reasoning)
+        reasoning_browser.setPlainText(reasoning)  # Until the markdown is rendered
+        submit_render(reasoning, reasoning_browser.setHtml)
+        layout.addWidget(reasoning_browser)
+        reasoning_dialog.resize(700, 500)
+        reasoning_dialog.exec_()
+
     def escape_html(self, text):
         """
         Escapes HTML special characters in text.
@@ -570,7 +1320,7 @@ class ChatWindow(QMainWindow):
         message_index = None
         for i, (start, end) in enumerate(self.message_positions):
             if start <= pos <= end:
-                message_index = i
+                message_index = self.render_start + i
                 break
 
         if message_index is not None:
@@ -578,6 +1328,24 @@ class ChatWindow(QMainWindow):
             edit_action = QAction('Edit Message', self)
             edit_action.triggered.connect(lambda: self.edit_message_in_place(message_index))
             menu.addAction(edit_action)
+
+            if self.message_at(message_index)['role'] == 'assistant':
+                regenerate_action = QAction('Regenerate Response', self)
+                regenerate_action.triggered.connect(lambda: self.regenerate_response(message_index))
+                menu.addAction(regenerate_action)
+
+            # Branch navigation between edits, regenerations and unchosen choices
+            position, count = self.conversation.siblings(message_index)
+            if count > 1:
+                menu.addSeparator()
+                previous_action = QAction(f'Previous Branch ({position + 1}/{count})', self)
+                previous_action.setEnabled(position > 0)
+                previous_action.triggered.connect(lambda: self.switch_branch(message_index, -1))
+                menu.addAction(previous_action)
+                next_action = QAction(f'Next Branch ({position + 1}/{count})', self)
+                next_action.setEnabled(position < count - 1)
+                next_action.triggered.connect(lambda: self.switch_branch(message_index, 1))
+                menu.addAction(next_action)
             menu.exec_(self.chat_display.viewport().mapToGlobal(position))
         else:
             QMessageBox.warning(self, "Error", "Could not determine the message to edit.")
@@ -586,8 +1354,8 @@ class ChatWindow(QMainWindow):
         """
         Allows the user to edit a message in place.
         """
-        if 0 <= index < len(self.message_history):
-            message = self.message_history[index]
+        if 0 <= index < len(self.conversation):
+            message = self.message_at(index)
             role = message['role']
             content = message['content']
 
@@ -629,27 +1397,190 @@ class ChatWindow(QMainWindow):
 
     def edit_message(self, index, new_content):
         """
-        Edits a message in the message history and updates the display.
-        """
-        if 0 <= index < len(self.message_history):
-            self.message_history[index]['content'] = new_content
-            # Remove messages after the edited one
-            self.message_history = self.message_history[:index + 1]
-            # Reset message_positions
-            self.message_positions = []
-            # Clear and re-display messages up to the edited message
-            self.chat_display.clear()
-            for i in range(len(self.message_history)):
-                message = self.message_history[i]
-                sender = "You" if message['role'] == 'user' else "Assistant"
-                content = message['content']
-                self.display_message(sender, content)  # Markdown handled internally
+        Edits a message by starting a new branch and updates the display.
+
+        The original message and everything after it stay in the conversation
+        tree and can be reached again with the branch navigation actions.
+        """
+        if self.is_busy("edit messages"):
+            return
+        if 0 <= index < len(self.conversation):
+            message = self.message_at(index)
+            role = message['role']
+            new_message = {"role": role, "content": new_content}
+            if message.get('attachments'):
+                new_message['attachments'] = message['attachments']  # Edits keep the attachments
+            self.conversation.branch(index, new_message)
+            self.refresh_chat_display()
             # If the edited message is from the user, re-send API call
-            if self.message_history[index]['role'] == 'user':
+            if role == 'user':
                 self.start_api_call()
         else:
             self.chat_display.append("<b>Error:</b> Invalid message index.")
 
+    def regenerate_response(self, index):
+        """
+        Requests a new response for the assistant message at `index` as a sibling branch.
+        """
+        if self.is_busy("regenerate a response"):
+            return
+        if 0 < index < len(self.conversation):
+            self.conversation.rewind(index - 1)
+            self.refresh_chat_display()
+            self.start_api_call()
+
+    def switch_branch(self, index, offset):
+        """
+        Switches the message at `index` to a neighbouring branch without calling the API.
+        """
+        if self.is_busy("switch branches"):
+            return
+        if self.conversation.switch_branch(index, offset):
+            self.refresh_chat_display()
+
+    def message_at(self, index):
+        """
+        Returns the message at `index` on the active branch, reading only that one back if it was offloaded.
+        """
+        return self.conversation.path_nodes()[index].message
+
+    def refresh_chat_display(self):
+        """
+        Clears the chat display and re-displays the newest `render_limit` messages of the active branch.
+        """
+        nodes = self.conversation.path_nodes()
+        self.render_start = max(0, len(nodes) - self.render_limit)
+        self.message_positions = []
+        self.pending_renders.clear()
+        self.chat_display.clear()
+        self.insert_earlier_link()
+        for node in nodes[self.render_start:]:
+            message = node.message
+            sender = "You" if message['role'] == 'user' else "Assistant"
+            self.display_message(sender, message['content'], message.get('reasoning'), message.get('model'), message.get('attachments'), message.get('requested_model'))  # Markdown handled internally
+
+    def index_message(self, node):
+        """
+        Queues a newly added conversation node for full-text indexing.
+        """
+        parent_id = node.parent.node_id if node.parent is not self.conversation.root else None
+        self.chat_index.add_message(self.conversation_id, node.node_id, parent_id, node.message)
+
+    def show_search(self):
+        """
+        Opens the conversation search dialog.
+        """
+        if self.chat_index is None:
+            QMessageBox.warning(self, "Search Unavailable", "The chat index could not be opened.")
+            return
+        search_dialog = SearchDialog(self, self.chat_index, self.conversation_id)
+        search_dialog.message_selected.connect(self.jump_to_message)
+        search_dialog.exec_()
+
+    def jump_to_message(self, node_id, conversation_id):
+        """
+        Shows the branch containing a message and scrolls to it.
+
+        Messages from other chats open in a new tab when the chat is in one;
+        otherwise, after confirming, their branch is reloaded from the index in
+        place of the current chat.
+        """
+        if self.is_busy("jump to another message"):
+            return
+        node = self.conversation.find(node_id) if conversation_id == self.conversation_id else None
+        if node is None:
+            if len(self.conversation) and self.receivers(self.open_message_requested):
+                self.open_message_requested.emit(node_id, conversation_id)
+                return
+            branch = self.chat_index.get_branch(node_id)
+            if not branch:
+                QMessageBox.warning(self, "Search", "The message could not be found.")
+                return
+            if len(self.conversation):
+                confirmation = QMessageBox.question(
+                    self,
+                    "Open Chat",
+                    "This message is from another chat. Open it in place of the current chat? Only its branch is restored.",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No
+                )
+                if confirmation != QMessageBox.Yes:
+                    return
+            # Rebuild the stored branch without re-indexing it
+            self.conversation.on_add = None
+            self.reset_chat()
+            for stored in branch:
+                message = {"role": stored["role"], "content": stored["content"]}
+                if stored["reasoning"]:
+                    message["reasoning"] = stored["reasoning"]
+                self.conversation.current = self.conversation.current.add_child(message, node_id=stored["node_id"])
+            self.conversation.on_add = self.index_message
+            self.conversation_id = conversation_id
+            node = self.conversation.find(node_id)
+            self.trim_memory()
+
+        self.conversation.activate(node)
+        self.refresh_chat_display()
+        self.scroll_to_message(self.conversation.path_nodes().index(node))
+
+    def scroll_to_message(self, index):
+        """
+        Scrolls the chat display to the start of the message at `index`, rendering earlier messages if needed.
+        """
+        if 0 <= index < self.render_start:
+            self.render_limit += self.render_start - index
+            self.refresh_chat_display()
+        index -= self.render_start
+        if not 0 <= index < len(self.message_positions):
+            return
+        start = self.message_positions[index][0]
+        cursor = self.chat_display.textCursor()
+        cursor.setPosition(start)
+        self.chat_display.setTextCursor(cursor)
+        # Scroll the message to the top rather than just into view
+        self.chat_display.verticalScrollBar().setValue(self.chat_display.cursorRect().top() + self.chat_display.verticalScrollBar().value())
+
+    def closeEvent(self, event):
+        if self.chat_index is not None and self.owns_chat_index:
+            self.chat_index.close()
+        super().closeEvent(event)
+
+    def edit_fallback_models(self):
+        """
+        Edits the fallback list of the selected model.
+
+        The models are tried in order when the selected one is rate limited,
+        failing or timing out.
+        """
+        model_id = self.model_id_map.get(self.model_combo.currentText())
+        if not model_id:
+            return
+        chains = load_fallback_chains()
+        text, ok = QInputDialog.getText(
+            self, "Fallback Models",
+            f"Models to try when {model_id} fails (comma-separated IDs, in order):",
+            text=", ".join(chains.get(model_id, []))
+        )
+        if not ok:
+            return
+        fallbacks = [m.strip() for m in text.split(",") if m.strip()]
+        unknown = [m for m in fallbacks if find_model(self.model_data, m) is None]
+        if unknown:
+            QMessageBox.warning(self, "Fallback Models", f"Not in the model catalog: {', '.join(unknown)}")
+            return
+        chains[model_id] = fallbacks
+        try:
+            save_fallback_chains(chains)
+        except OSError as e:
+            QMessageBox.critical(self, "Fallback Models", f"Failed to save fallback models: {e}")
+
+    def show_debug_log(self):
+        """
+        Opens the debug log panel showing recent log events.
+        """
+        self.log_viewer = LogViewerDialog(self)
+        self.log_viewer.show()
+
     def show_model_list(self):
         """
         Opens the model list window and connects the model selection and update signals.
@@ -675,21 +1606,50 @@ class ChatWindow(QMainWindow):
         else:
             QMessageBox.warning(self, "Model Selection Error", f"Model '{model_name}' not found in the list.")
 
-        # Update slider maximums and current values
+        # Update slider maximums and current values from the catalog
+        self.apply_model_limits(model_id)
+
+        # Display model information
+        info_message = (f"Model '{model_name}' selected.\n"
+                        f"Context Length: {self.context_length}\n"
+                        f"Max Completion Tokens: {self.max_completion_tokens}")
+        QMessageBox.information(self, "Model Selected", info_message)
+
+    def on_model_changed(self, *args):
+        """
+        Applies the catalog limits of the model selected in the combo box.
+        """
+        model_id = self.model_id_map.get(self.model_combo.currentText())
+        if model_id:
+            self.apply_model_limits(model_id)
+
+    def apply_model_limits(self, model_id):
+        """
+        Sets the slider ranges and reasoning controls from the model's catalog entry.
+        """
+        model = find_model(self.model_data, model_id)
+        if model is None:
+            return
+        context_length, max_completion_tokens = get_model_limits(model)
+        context_length = context_length or self.context_length_slider.maximum()
+        max_completion_tokens = max_completion_tokens or context_length
+
         self.context_length_slider.setMaximum(context_length)
         self.context_length_slider.setValue(context_length)
         self.max_tokens_slider.setMaximum(max_completion_tokens)
         self.max_tokens_slider.setValue(max_completion_tokens)
-
-        # Update labels
         self.update_context_length_label(context_length)
         self.update_max_tokens_label(max_completion_tokens)
 
-        # Display model information
-        info_message = (f"Model '{model_name}' selected.\n"
-                        f"Context Length: {context_length}\n"
-                        f"Max Completion Tokens: {max_completion_tokens}")
-        QMessageBox.information(self, "Model Selected", info_message)
+        # Reasoning controls only apply to models that accept them
+        reasoning_supported = supports_parameter(model, 'reasoning')
+        self.reasoning_group.setEnabled(reasoning_supported)
+        self.reasoning_group.setToolTip("" if reasoning_supported else "This model does not support reasoning parameters.")
+        self.reasoning_max_tokens_slider.setMaximum(min(64000, max_completion_tokens))
+
+        tools_supported = supports_parameter(model, 'tools')
+        self.tools_checkbox.setEnabled(tools_supported)
+        self.tools_checkbox.setToolTip("Let the model check the time and search your previous chats." if tools_supported else "This model does not support tool calling.")
 
     def update_context_length_label(self, value):
         self.context_length = min(value, self.context_length_slider.maximum())
@@ -704,7 +1664,7 @@ class ChatWindow(QMainWindow):
         Loads the model list from the JSON file and initializes model-related attributes.
         """
         try:
-            with open(r'C:\Code - Copy\FlyAway-pyrq\__PYDATA\models_jason\models_data.json', 'r') as f:
+            with open(MODELS_DATA_FILE, 'r', encoding='utf-8') as f:
                 model_data = json.load(f)
             MODELS = [model['name'] for model in model_data['data']]
         except Exception as e:
@@ -723,12 +1683,13 @@ class ChatWindow(QMainWindow):
         except AttributeError:
             pass  # model_combo not yet initialized
 
+    @profiled("reload_models")
     def reload_models(self):
         """
         Reloads the model list from the JSON file and updates the model combo box.
         """
         try:
-            with open(r'C:\Code - Copy\FlyAway-pyrq\__PYDATA\models_jason\models_data.json', 'r') as f:
+            with open(MODELS_DATA_FILE, 'r', encoding='utf-8') as f:
                 model_data = json.load(f)
                 
             # Update model_data and model_id_map
@@ -750,6 +1711,7 @@ class ChatWindow(QMainWindow):
                 self.model_combo.setCurrentIndex(0)  # Select the first model by default
             
             self.model_combo.blockSignals(False)
+            self.on_model_changed()  # The selection, or its limits in the new catalog, may have changed
 
             QMessageBox.information(self, "Models Updated", "The model list has been updated with the latest models.")
             
@@ -796,14 +1758,112 @@ class ChatWindow(QMainWindow):
             value = self.reasoning_max_tokens_slider.value()
         self.reasoning_max_tokens_value_label.setText(str(value))
 
+class ChatTabs(QMainWindow):
+    """
+    Main window of the chat application: one ChatWindow per tab.
+
+    The tabs generate independently but share the API session, the request
+    pool (and so its worker limit) and the chat index.
+    """
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("OpenRouter Chat Interface")
+        self.setGeometry(100, 100, 900, 700)
+        try:
+            self.chat_index = ChatIndex()
+        except Exception as e:
+            logger.warning("Chat index unavailable: %s", e)
+            self.chat_index = None
+
+        self.tabs = QTabWidget()
+        self.tabs.setTabsClosable(True)
+        self.tabs.setMovable(True)
+        self.tabs.setDocumentMode(True)
+        self.tabs.tabCloseRequested.connect(self.close_tab)
+        new_tab_button = QToolButton()
+        new_tab_button.setText("+")
+        new_tab_button.setToolTip("New Tab (Ctrl+T)")
+        new_tab_button.clicked.connect(self.new_tab)
+        self.tabs.setCornerWidget(new_tab_button, Qt.TopRightCorner)
+        self.setCentralWidget(self.tabs)
+
+        QShortcut(QKeySequence.AddTab, self, self.new_tab)
+        QShortcut(QKeySequence.Close, self, lambda: self.close_tab(self.tabs.currentIndex()))
+        self.new_tab()
+
+    def new_tab(self):
+        """
+        Opens a new conversation, using the current tab's model.
+        """
+        chat = ChatWindow(chat_index=self.chat_index)
+        chat.setWindowFlags(Qt.Widget)  # Embedded in the tab rather than a top-level window
+        current = self.tabs.currentWidget()
+        if current is not None:
+            chat.model_combo.setCurrentText(current.model_combo.currentText())
+        chat.status_changed.connect(lambda: self.update_tab(chat))
+        chat.model_combo.currentIndexChanged.connect(lambda *args: self.update_tab(chat))
+        chat.new_tab_requested.connect(self.new_tab)
+        chat.open_message_requested.connect(self.open_message)
+        self.tabs.setCurrentIndex(self.tabs.addTab(chat, ""))
+        self.update_tab(chat)
+        return chat
+
+    def open_message(self, node_id, conversation_id):
+        """
+        Opens a search result from another chat in a new tab.
+        """
+        self.new_tab().jump_to_message(node_id, conversation_id)
+
+    def close_tab(self, index):
+        """
+        Closes a conversation, after confirming if it is still generating. The last tab is replaced by a new one.
+        """
+        chat = self.tabs.widget(index)
+        if chat is None:
+            return
+        if chat.is_busy():
+            confirmation = QMessageBox.question(
+                self,
+                "Close Tab",
+                "A response is still pending in this tab. Close it anyway?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if confirmation != QMessageBox.Yes:
+                return
+        chat.cancel_requests()
+        self.tabs.removeTab(index)
+        chat.close()
+        chat.deleteLater()
+        if self.tabs.count() == 0:
+            self.new_tab()
+
+    def update_tab(self, chat):
+        index = self.tabs.indexOf(chat)
+        if index >= 0:
+            self.tabs.setTabText(index, chat.tab_title())
+
+    def closeEvent(self, event):
+        for index in range(self.tabs.count()):
+            self.tabs.widget(index).cancel_requests()
+            self.tabs.widget(index).close()
+        if self.chat_index is not None:
+            self.chat_index.close()
+        super().closeEvent(event)
+
 def main():
     """
     Entry point of the application.
     """
+    setup_logging()
     app = QApplication(sys.argv)
-    window = ChatWindow()
+    watchdog = EventLoopWatchdog()  # Logs main-thread stalls with the stack responsible
+    watchdog.start()
+    window = ChatTabs()
     window.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    watchdog.stop()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
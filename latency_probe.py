@@ -0,0 +1,210 @@
+# latency_probe.py
+
+"""
+Measures model latency with a tiny fixed prompt and keeps a local leaderboard.
+
+Results are stored in latency_data.json next to the model catalog, where
+ModelListWindow picks them up. Only entries older than --max-age are
+re-probed, so the command can be scheduled (cron, Task Scheduler) and run
+incrementally.
+
+Usage:
+    python latency_probe.py MODEL_ID [MODEL_ID ...] [--runs 3] [--workers 4]
+        [--max-age 86400] [--token-budget 2000]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import time
+
+from api_module import get_api_key, make_api_request
+from app_logging import get_logger, setup_logging
+from catalog import catalog_path
+
+logger = get_logger("latency_probe")
+
+LATENCY_DATA_FILE = catalog_path("latency_data.json")
+PROBE_MESSAGES = [{"role": "user", "content": "Reply with the single word: ok"}]
+PROBE_MAX_TOKENS = 16      # Completion budget per probe run
+MAX_SAMPLES = 20           # Samples kept per model
+DEFAULT_MAX_AGE = 24 * 3600
+DEFAULT_TOKEN_BUDGET = 2000
+DEFAULT_WORKERS = 4
+
+
+def load_latency_data(file_path: str = None) -> dict:
+    """
+    Load stored probe results.
+
+    Args:
+        file_path (str, optional): The results file. Defaults to LATENCY_DATA_FILE.
+
+    Returns:
+        dict: Model ID -> result entry. Empty if the file does not exist or is invalid.
+    """
+    file_path = file_path or LATENCY_DATA_FILE
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('models', {})
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return {}
+
+
+def save_latency_data(results: dict, file_path: str = None):
+    """
+    Write probe results atomically.
+
+    Args:
+        results (dict): Model ID -> result entry.
+        file_path (str, optional): The results file. Defaults to LATENCY_DATA_FILE.
+    """
+    file_path = file_path or LATENCY_DATA_FILE
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temp_path = file_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'updated': time.time(), 'models': results}, f, indent=2)
+    os.replace(temp_path, file_path)
+
+
+def probe_once(api_key: str, model_id: str) -> dict:
+    """
+    Send the probe prompt once and time the stream.
+
+    Args:
+        api_key (str): The API key for authorization.
+        model_id (str): The model to probe.
+
+    Returns:
+        dict: A sample with ok, ttft_ms, tokens_per_sec and at (epoch seconds).
+    """
+    start = time.perf_counter()
+    first_token = None
+    chunks = 0
+    try:
+        # Concurrent runs send identical payloads; each must be its own upstream request to be a sample
+        for _ in make_api_request(api_key, PROBE_MESSAGES, model_id, temperature=0, stream=True, max_tokens=PROBE_MAX_TOKENS, coalesce=False):
+            if first_token is None:
+                first_token = time.perf_counter()
+            chunks += 1
+    except Exception as e:
+        logger.warning("Probe of %s failed: %s", model_id, e)
+        return {'ok': False, 'at': time.time()}
+
+    end = time.perf_counter()
+    if first_token is None:
+        return {'ok': False, 'at': time.time()}
+    generation_time = end - first_token
+    return {
+        'ok': True,
+        'ttft_ms': round((first_token - start) * 1000, 1),
+        # Chunks approximate tokens; a single-chunk answer has no measurable rate
+        'tokens_per_sec': round((chunks - 1) / generation_time, 1) if chunks > 1 and generation_time > 0 else None,
+        'at': time.time(),
+    }
+
+
+def summarize(samples: list) -> dict:
+    """
+    Aggregate samples into the leaderboard fields.
+
+    Args:
+        samples (list): Samples as returned by probe_once.
+
+    Returns:
+        dict: ttft_ms (median), tokens_per_sec (median), error_rate, runs and probed_at.
+    """
+    ok = [sample for sample in samples if sample['ok']]
+    rates = [sample['tokens_per_sec'] for sample in ok if sample.get('tokens_per_sec')]
+    return {
+        'ttft_ms': round(statistics.median(sample['ttft_ms'] for sample in ok), 1) if ok else None,
+        'tokens_per_sec': round(statistics.median(rates), 1) if rates else None,
+        'error_rate': round(1 - len(ok) / len(samples), 3) if samples else None,
+        'runs': len(samples),
+        'probed_at': max(sample['at'] for sample in samples) if samples else None,
+        'samples': samples,
+    }
+
+
+def stale_models(model_ids: list, results: dict, max_age: float = DEFAULT_MAX_AGE) -> list:
+    """
+    Return the models that have never been probed or whose results are older than `max_age`.
+    """
+    now = time.time()
+    return [
+        model_id for model_id in model_ids
+        if not results.get(model_id, {}).get('probed_at') or now - results[model_id]['probed_at'] > max_age
+    ]
+
+
+def probe_models(api_key: str, model_ids: list, runs: int = 3, workers: int = DEFAULT_WORKERS, token_budget: int = DEFAULT_TOKEN_BUDGET, max_age: float = DEFAULT_MAX_AGE, file_path: str = None, progress_callback=None) -> dict:
+    """
+    Probe stale models concurrently and store the results.
+
+    Args:
+        api_key (str): The API key for authorization.
+        model_ids (list): The models to consider.
+        runs (int, optional): Probe runs per model. Defaults to 3.
+        workers (int, optional): Maximum concurrent requests. Defaults to DEFAULT_WORKERS.
+        token_budget (int, optional): Hard cap on completion tokens spent by this call. Runs that
+            would exceed it are not sent. Defaults to DEFAULT_TOKEN_BUDGET.
+        max_age (float, optional): Seconds before a stored result is considered stale. Use 0 to
+            re-probe everything. Defaults to DEFAULT_MAX_AGE.
+        file_path (str, optional): The results file. Defaults to LATENCY_DATA_FILE.
+        progress_callback (callable, optional): Called with (done, total) after each run.
+
+    Returns:
+        dict: All stored results, including the new ones.
+    """
+    results = load_latency_data(file_path)
+    jobs = [(model_id, run) for model_id in stale_models(model_ids, results, max_age) for run in range(runs)]
+    max_jobs = token_budget // PROBE_MAX_TOKENS
+    if len(jobs) > max_jobs:
+        logger.warning("Token budget allows %d of %d probe runs; the rest are skipped", max_jobs, len(jobs))
+        jobs = jobs[:max_jobs]
+    if not jobs:
+        return results
+
+    new_samples = {}
+    done = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(probe_once, api_key, model_id): model_id for model_id, _ in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            new_samples.setdefault(futures[future], []).append(future.result())
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(jobs))
+
+    for model_id, samples in new_samples.items():
+        previous = results.get(model_id, {}).get('samples', [])
+        results[model_id] = summarize((previous + samples)[-MAX_SAMPLES:])
+        logger.info("Probed %s: ttft=%s ms, %s tokens/s, error rate %s", model_id, results[model_id]['ttft_ms'], results[model_id]['tokens_per_sec'], results[model_id]['error_rate'])
+    save_latency_data(results, file_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("models", nargs="+", help="Model IDs to probe")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE, help="Re-probe results older than this many seconds")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    setup_logging()
+    api_key = get_api_key("API_KEY_OPENROUTER")
+    results = probe_models(api_key, args.models, args.runs, args.workers, args.token_budget, args.max_age)
+
+    ranked = sorted(args.models, key=lambda model_id: results.get(model_id, {}).get('ttft_ms') or float('inf'))
+    print(f"{'model':<50} {'ttft ms':>9} {'tok/s':>8} {'errors':>7}")
+    for model_id in ranked:
+        entry = results.get(model_id, {})
+        ttft, rate, errors = (entry.get(key) for key in ('ttft_ms', 'tokens_per_sec', 'error_rate'))
+        print(f"{model_id:<50} {ttft if ttft is not None else '-':>9} {rate if rate is not None else '-':>8} {errors if errors is not None else '-':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# log_viewer.py
+
+import logging
+
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QLineEdit,
+    QPlainTextEdit, QPushButton
+)
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFont
+
+from app_logging import format_record, get_ring_buffer
+
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+REFRESH_INTERVAL_MS = 1000
+
+
+class LogViewerDialog(QDialog):
+    """
+    Debug panel showing the recent log events held in the in-memory ring buffer.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Debug Log")
+        self.resize(900, 500)
+        self.shown_key = None
+        self.initUI()
+        self.refresh()
+
+        # Poll the ring buffer while the panel is open
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+
+    def initUI(self):
+        layout = QVBoxLayout()
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Level:"))
+        self.level_combo = QComboBox()
+        self.level_combo.addItems(LEVELS)
+        self.level_combo.setCurrentText("INFO")
+        self.level_combo.currentIndexChanged.connect(self.force_refresh)
+        filter_layout.addWidget(self.level_combo)
+
+        filter_layout.addWidget(QLabel("Request ID:"))
+        self.request_id_input = QLineEdit()
+        self.request_id_input.setPlaceholderText("Filter by correlation id")
+        self.request_id_input.textChanged.connect(self.force_refresh)
+        filter_layout.addWidget(self.request_id_input)
+        layout.addLayout(filter_layout)
+
+        self.log_output = QPlainTextEdit()
+        self.log_output.setReadOnly(True)
+        self.log_output.setFont(QFont("Consolas", 9))
+        self.log_output.setLineWrapMode(QPlainTextEdit.NoWrap)
+        layout.addWidget(self.log_output)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear_log)
+        button_layout.addWidget(clear_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def force_refresh(self, *args):
+        self.shown_key = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-displays the buffered records matching the current filters.
+        """
+        ring_buffer = get_ring_buffer()
+        if ring_buffer is None:
+            self.log_output.setPlainText("Logging has not been set up.")
+            return
+
+        min_level = getattr(logging, self.level_combo.currentText())
+        request_id = self.request_id_input.text().strip()
+        records = ring_buffer.snapshot(min_level)
+        if request_id:
+            records = [record for record in records if getattr(record, "request_id", "") == request_id]
+
+        # Skip the redraw when nothing changed since the last refresh
+        key = (len(records), records[-1].created if records else None)
+        if key == self.shown_key:
+            return
+        self.shown_key = key
+        self.log_output.setPlainText("\n".join(format_record(record) for record in records))
+        self.log_output.verticalScrollBar().setValue(self.log_output.verticalScrollBar().maximum())
+
+    def clear_log(self):
+        ring_buffer = get_ring_buffer()
+        if ring_buffer is not None:
+            ring_buffer.clear()
+        self.force_refresh()
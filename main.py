@@ -1,6 +1,18 @@
 # main.py
 
-from gui_module import main
+"""
+Starts the chat GUI, or the headless batch runner:
+
+    python main.py
+    python main.py batch PROMPTS.jsonl --models MODEL [MODEL ...]  (see batch_runner.py)
+"""
+
+import sys
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from batch_runner import main  # No PyQt import in batch mode
+        main(sys.argv[2:])
+    else:
+        from gui_module import main
+        main()
@@ -0,0 +1,119 @@
+# message_store.py
+
+"""
+Bounded memory for long chats.
+
+Only the newest HOT_MESSAGES messages of the active branch stay in RAM as
+dicts; every other message of the conversation tree is compressed into an
+anonymous temporary file and read back whenever it is used, so a chat of
+thousands of messages costs a few dozen bytes per old message. Likewise the
+chat display renders only the newest RENDER_WINDOW messages; earlier ones
+are rendered again, from the store, when the user asks for them.
+
+Environment variables:
+    OPENROUTER_HOT_MESSAGES: Messages of the active branch kept uncompressed in RAM (default 200).
+    OPENROUTER_RENDER_WINDOW: Messages kept rendered in the chat display (default 100).
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import zlib
+
+HOT_MESSAGES = int(os.environ.get("OPENROUTER_HOT_MESSAGES", 200))
+RENDER_WINDOW = int(os.environ.get("OPENROUTER_RENDER_WINDOW", 100))
+RENDER_PAGE = 50         # Earlier messages rendered per "Show earlier messages" click
+COMPRESSION_LEVEL = 6    # zlib level; message text typically shrinks 3-5x
+
+
+class MessageStore:
+    """
+    Compressed message dicts in an anonymous temporary file.
+
+    The file is append-only: a message is written once, when it leaves RAM,
+    and a reference (offset, length) is all that stays in memory. Reasoning
+    kept in a ResponseBuffer is stored as text.
+    """
+    def __init__(self):
+        self._file = None
+        self._lock = threading.Lock()  # Worker threads may read messages too
+        self.count = 0           # Messages written
+        self.stored_bytes = 0    # Compressed size on disk
+        self.original_bytes = 0  # Size of the messages as JSON
+
+    def put(self, message: dict) -> tuple:
+        """
+        Writes a message to the store.
+
+        Args:
+            message (dict): The message to store.
+
+        Returns:
+            tuple: The (offset, length) reference used to read it back.
+        """
+        encoded = json.dumps(message, ensure_ascii=False, default=str).encode("utf-8")
+        data = zlib.compress(encoded, COMPRESSION_LEVEL)
+        with self._lock:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile()
+            self._file.seek(0, 2)
+            offset = self._file.tell()
+            self._file.write(data)
+            self.count += 1
+            self.stored_bytes += len(data)
+            self.original_bytes += len(encoded)
+        return offset, len(data)
+
+    def get(self, reference: tuple) -> dict:
+        """
+        Reads a message back from the store.
+
+        Args:
+            reference (tuple): The reference returned by put().
+
+        Returns:
+            dict: A new copy of the message.
+        """
+        offset, length = reference
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+
+    def close(self):
+        """
+        Releases the temporary file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def process_memory() -> int | None:
+    """
+    Return the memory used by this process in bytes, or None if it cannot be read.
+
+    This is the resident set size on Linux, the working set on Windows and
+    the peak resident size on macOS.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if sys.platform == "win32":
+        try:
+            import win32api  # pywin32, already used for the credential store
+            import win32process
+            return win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())["WorkingSetSize"]
+        except Exception:
+            return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
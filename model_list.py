@@ -3,13 +3,45 @@ from PyQt5.QtWidgets import (
     QPushButton, QMessageBox, QApplication, QHeaderView,
     QHBoxLayout, QCheckBox, QWidget
 )
-from PyQt5.QtCore import Qt, QSettings, pyqtSignal
+from PyQt5.QtCore import Qt, QSettings, QThread, pyqtSignal
 import requests
 import json
+import logging
 from datetime import datetime
 import sys
 import os
 
+from api_module import CONNECT_TIMEOUT, OPENROUTER_API_URL, READ_TIMEOUT, get_session
+from catalog import MODELS_DATA_FILE
+from app_logging import get_logger, setup_logging
+from latency_probe import load_latency_data, probe_models
+from profiling import profiled
+
+logger = get_logger("model_list")
+
+LATENCY_COLUMNS = ["ttft_ms", "tokens_per_sec", "error_rate"]  # Filled from latency_data.json
+
+class ProbeThread(QThread):
+    """
+    Runs the latency probe for a set of models without blocking the GUI.
+    """
+    progress = pyqtSignal(int, int)  # Emits (runs done, total runs)
+    probe_finished = pyqtSignal(dict)  # Emits all stored results
+
+    def __init__(self, model_ids, parent=None):
+        super().__init__(parent)
+        self.model_ids = model_ids
+
+    def run(self):
+        try:
+            from api_module import get_api_key
+            api_key = get_api_key("API_KEY_OPENROUTER")
+            results = probe_models(api_key, self.model_ids, progress_callback=self.progress.emit)
+        except Exception as e:
+            logger.error("Latency probe failed: %s", e)
+            results = load_latency_data()
+        self.probe_finished.emit(results)
+
 class PreferencesWindow(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -62,6 +94,7 @@ class ModelListWindow(QDialog):
         self.setWindowTitle("Model List")
         self.setGeometry(150, 150, 1200, 600)
         self.settings = QSettings("YourCompany", "ModelListApp")
+        self.latency = load_latency_data()
         self.models = self.load_models_from_file()
         if self.models:
             self.columns = self.get_columns_from_models(self.models)
@@ -84,6 +117,7 @@ class ModelListWindow(QDialog):
             if 'top_provider' in model:
                 columns_set.add('context_length')
                 columns_set.add('max_completion_tokens')
+        columns_set.update(LATENCY_COLUMNS)
         columns = list(columns_set)
         columns.sort()  # optional: sort the columns
         return columns
@@ -113,6 +147,11 @@ class ModelListWindow(QDialog):
         refresh_button.clicked.connect(self.load_models)
         button_layout.addWidget(refresh_button)
 
+        self.probe_button = QPushButton("Probe Latency (Selected)")
+        self.probe_button.setToolTip("Measure time to first token and tokens/sec for the selected models. Recently probed models are skipped.")
+        self.probe_button.clicked.connect(self.probe_selected_models)
+        button_layout.addWidget(self.probe_button)
+
         preferences_button = QPushButton("Preferences")
         preferences_button.clicked.connect(self.showPreferences)
         button_layout.addWidget(preferences_button)
@@ -140,7 +179,7 @@ class ModelListWindow(QDialog):
         """
         Loads model data from the JSON file.
         """
-        file_path = r'C:\Code - Copy\FlyAway-pyrq\__PYDATA\models_jason\models_data.json'
+        file_path = MODELS_DATA_FILE
 
         # Check if the file exists
         if not os.path.exists(file_path):
@@ -152,8 +191,9 @@ class ModelListWindow(QDialog):
             with open(file_path, 'r') as f:
                 data = json.load(f)
             
-            # Debug: Print the loaded data structure
-            print("Data loaded from file:", data)
+            if logger.isEnabledFor(logging.DEBUG):
+                count = len(data.get('data', [])) if isinstance(data, dict) else len(data)
+                logger.debug("Loaded %d models from %s", count, file_path)
 
             # Determine if 'data' key exists
             if isinstance(data, dict):
@@ -181,6 +221,7 @@ class ModelListWindow(QDialog):
             self.load_models()  # Fallback to loading from API
             return None
 
+    @profiled("populate_table")
     def populate_table(self, models):
         """
         Populates the table with model data, including context_length and max_completion_tokens.
@@ -190,7 +231,17 @@ class ModelListWindow(QDialog):
 
         for row, model in enumerate(models):
             for col_index, column in enumerate(self.columns):
-                if column in ['context_length', 'max_completion_tokens']:
+                if column in LATENCY_COLUMNS:
+                    value = self.latency.get(model.get('id'), {}).get(column)
+                    item = QTableWidgetItem()
+                    if value is None:
+                        item.setText('N/A')
+                    else:
+                        item.setData(Qt.DisplayRole, value)  # Numeric, so sorting is by value
+                    item.setFlags(item.flags() ^ Qt.ItemIsEditable)
+                    self.table.setItem(row, col_index, item)
+                    continue
+                elif column in ['context_length', 'max_completion_tokens']:
                     top_provider = model.get('top_provider', {})
                     value = top_provider.get(column, 'N/A')
                 else:
@@ -238,16 +289,16 @@ class ModelListWindow(QDialog):
         """
         Fetches the model list from the API and populates the table.
         """
-        url = 'https://openrouter.ai/api/v1/models'
+        url = f"{OPENROUTER_API_URL}/models"
         try:
-            response = requests.get(url)
+            response = get_session().get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
             if response.status_code == 200:
                 data = response.json()
                 request_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 data['request_time'] = request_time
 
                 # Save to JSON file
-                file_path = r'C:\Code - Copy\FlyAway-pyrq\__PYDATA\models_jason\models_data.json'
+                file_path = MODELS_DATA_FILE
                 os.makedirs(os.path.dirname(file_path), exist_ok=True)
                 with open(file_path, 'w') as f:
                     json.dump(data, f, indent=4)
@@ -295,6 +346,34 @@ class ModelListWindow(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Exception", f"An unexpected error occurred: {str(e)}")
 
+    def probe_selected_models(self):
+        """
+        Probes the latency of the selected models in a background thread.
+        """
+        id_column = self.columns.index("id")
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        model_ids = [self.table.item(row, id_column).text() for row in rows]
+        if not model_ids:
+            QMessageBox.information(self, "Probe Latency", "Select one or more models to probe.")
+            return
+
+        self.probe_button.setEnabled(False)
+        self.probe_button.setText("Probing...")
+        self.probe_thread = ProbeThread(model_ids, self)
+        self.probe_thread.progress.connect(lambda done, total: self.probe_button.setText(f"Probing... {done}/{total}"))
+        self.probe_thread.probe_finished.connect(self.on_probe_finished)
+        self.probe_thread.start()
+
+    def on_probe_finished(self, results):
+        """
+        Shows the new latency results in the table.
+        """
+        self.latency = results
+        self.probe_button.setEnabled(True)
+        self.probe_button.setText("Probe Latency (Selected)")
+        if self.models:
+            self.populate_table(self.models)
+
     def on_model_double_clicked(self, row, column):
         """
         Emits the model name, ID, context_length, and max_completion_tokens when a row is double-clicked and closes the window.
@@ -321,6 +400,7 @@ class ModelListWindow(QDialog):
         self.close()  # Close the window after emitting the signal
 
 if __name__ == "__main__":
+    setup_logging()
     app = QApplication(sys.argv)
     window = ModelListWindow()
     window.show()
@@ -0,0 +1,176 @@
+# profiling.py
+
+"""
+Opt-in cProfile and tracemalloc sections around the hot paths.
+
+Functions decorated with @profiled("name") are returned unchanged unless
+profiling is switched on, so the hooks cost nothing in normal runs:
+
+    OPENROUTER_PROFILE           "cpu", "memory" or "cpu,memory" ("1" means both)
+    OPENROUTER_PROFILE_SECTIONS  Optional comma-separated section names to limit it to
+    OPENROUTER_PROFILE_DIR       Where the reports go (default ~/.openrouter_chat/profiles)
+
+Every call of a section is timed. With "cpu", each section also has its
+own cProfile.Profile. Python allows one active profiler per thread, so a
+section called inside another one (markdown_to_html inside display_message)
+is counted in the outer section's profile and only timed on its own; and a
+profile records one thread at a time, so calls made meanwhile on other
+threads are only timed. With "memory", tracemalloc is started and each
+section records the memory it allocated and kept.
+
+On exit, write_reports() saves <section>.prof files (pstats format, for
+snakeviz or `python -m pstats`) and a summary.txt with the call counts,
+timings, the top functions of each section and the top allocation sites.
+"""
+
+import atexit
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from app_logging import get_logger
+
+logger = get_logger("profiling")
+
+_modes = {mode.strip() for mode in os.environ.get("OPENROUTER_PROFILE", "").lower().split(",") if mode.strip() and mode.strip() != "0"}
+if _modes & {"1", "all", "true", "yes"}:
+    _modes = {"cpu", "memory"}
+PROFILE_CPU = "cpu" in _modes
+PROFILE_MEMORY = "memory" in _modes
+PROFILE_SECTIONS = {name.strip() for name in os.environ.get("OPENROUTER_PROFILE_SECTIONS", "").split(",") if name.strip()}
+PROFILE_DIR = os.environ.get("OPENROUTER_PROFILE_DIR", os.path.join(os.path.expanduser("~"), ".openrouter_chat", "profiles"))
+TOP_FUNCTIONS = 25      # Functions listed per section in summary.txt
+TOP_ALLOCATIONS = 25    # Allocation sites listed in summary.txt
+
+_sections = {}
+_sections_lock = threading.Lock()
+_active = threading.local()  # Whether this thread is inside a cProfile section
+
+
+class Section:
+    """
+    The statistics of one profiled section.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.allocated = 0    # Bytes still allocated after the calls returned, summed
+        self.profile = cProfile.Profile() if PROFILE_CPU else None
+        self.profile_lock = threading.Lock()  # Held by the thread the profile is recording
+        self.lock = threading.Lock()
+
+    def record(self, seconds, allocated):
+        with self.lock:
+            self.calls += 1
+            self.total += seconds
+            self.longest = max(self.longest, seconds)
+            self.allocated += allocated
+
+
+def is_enabled(name: str | None = None) -> bool:
+    """
+    Return whether profiling is on, for the named section if one is given.
+    """
+    if not (PROFILE_CPU or PROFILE_MEMORY):
+        return False
+    return name is None or not PROFILE_SECTIONS or name in PROFILE_SECTIONS
+
+
+def _section(name):
+    with _sections_lock:
+        if name not in _sections:
+            _sections[name] = Section(name)
+        return _sections[name]
+
+
+def profiled(name: str):
+    """
+    Decorator making a function a profiled section when profiling is on.
+
+    Args:
+        name (str): The section name used in the reports.
+    """
+    def decorate(function):
+        if not is_enabled(name):
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            section = _section(name)
+            profile = None
+            if section.profile is not None and not getattr(_active, "profiling", False) and section.profile_lock.acquire(blocking=False):
+                profile = section.profile
+            memory_before = tracemalloc.get_traced_memory()[0] if PROFILE_MEMORY else 0
+            start = time.perf_counter()
+            if profile is not None:
+                _active.profiling = True
+                profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                    _active.profiling = False
+                    section.profile_lock.release()
+                allocated = tracemalloc.get_traced_memory()[0] - memory_before if PROFILE_MEMORY else 0
+                section.record(time.perf_counter() - start, allocated)
+        return wrapper
+    return decorate
+
+
+def write_reports(directory: str | None = None) -> str | None:
+    """
+    Write the .prof files and summary.txt of every section that ran.
+
+    Args:
+        directory (str, optional): The report directory. Defaults to a timestamped folder in PROFILE_DIR.
+
+    Returns:
+        str | None: The directory written, or None if nothing was profiled.
+    """
+    with _sections_lock:
+        sections = [section for section in _sections.values() if section.calls]
+    if not sections:
+        return None
+    directory = directory or os.path.join(PROFILE_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(directory, exist_ok=True)
+
+    summary = io.StringIO()
+    summary.write(f"{'section':<24} {'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'kept KiB':>10}\n")
+    for section in sorted(sections, key=lambda s: s.total, reverse=True):
+        summary.write(f"{section.name:<24} {section.calls:>7} {section.total:>9.3f} {section.total / section.calls * 1000:>9.1f} "
+                      f"{section.longest * 1000:>9.1f} {section.allocated / 1024:>10.0f}\n")
+    for section in sections:
+        if section.profile is None:
+            continue
+        try:
+            stats = pstats.Stats(section.profile, stream=summary)
+        except TypeError:
+            continue  # Only nested calls ran, so the section's own profile is empty
+        section.profile.dump_stats(os.path.join(directory, f"{section.name}.prof"))
+        summary.write(f"\n=== {section.name}: top {TOP_FUNCTIONS} functions by cumulative time ===\n")
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    if PROFILE_MEMORY and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        summary.write(f"\n=== Memory: {current / 1048576:.1f} MiB traced now, {peak / 1048576:.1f} MiB peak; top {TOP_ALLOCATIONS} allocation sites ===\n")
+        for statistic in tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]:
+            summary.write(f"{statistic}\n")
+
+    with open(os.path.join(directory, "summary.txt"), "w", encoding="utf-8") as f:
+        f.write(summary.getvalue())
+    logger.info("Profiling reports written to %s", directory)
+    return directory
+
+
+if PROFILE_MEMORY:
+    tracemalloc.start()
+if PROFILE_CPU or PROFILE_MEMORY:
+    atexit.register(write_reports)
@@ -0,0 +1,296 @@
+# proxy_server.py
+
+"""
+Headless OpenAI-compatible proxy in front of OpenRouter.
+
+Exposes /v1/chat/completions (with streaming passthrough), /v1/models (from
+the local catalog) and /metrics (per-client counters) on a local port. All
+upstream traffic goes through api_module, so it shares the app's pooled
+connections and logging. Runs without PyQt or win32cred: the upstream key is
+read from OPENROUTER_API_KEY, falling back to the Windows credential store.
+
+Identical concurrent streaming requests share one upstream stream; /metrics
+reports how many upstream calls that saved. Clients are identified by the
+X-Client-Id header, then by their bearer token (hashed), then by address.
+
+Usage:
+    python proxy_server.py [--host 127.0.0.1] [--port 8080] [--upstream URL]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import api_module
+from app_logging import get_logger, new_correlation_id, setup_logging
+from catalog import load_catalog
+
+logger = get_logger("proxy")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+
+class ProxyMetrics:
+    """
+    Thread-safe per-client request counters.
+    """
+    FIELDS = ("requests", "streamed", "errors", "bytes_out", "total_seconds", "first_byte_seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.started = time.time()
+
+    def record(self, client_id: str, **values):
+        """
+        Add values to a client's counters.
+
+        Args:
+            client_id (str): The client identifier.
+            **values: Increments for any of FIELDS.
+        """
+        with self._lock:
+            counters = self._clients.setdefault(client_id, dict.fromkeys(self.FIELDS, 0))
+            for key, value in values.items():
+                counters[key] += value
+
+    def snapshot(self) -> dict:
+        """
+        Return the counters with derived averages.
+        """
+        with self._lock:
+            clients = {client_id: dict(counters) for client_id, counters in self._clients.items()}
+        for counters in clients.values():
+            completed = counters["requests"] - counters["errors"]
+            counters["avg_seconds"] = round(counters["total_seconds"] / completed, 4) if completed else None
+            counters["avg_first_byte_seconds"] = round(counters["first_byte_seconds"] / counters["streamed"], 4) if counters["streamed"] else None
+            counters["total_seconds"] = round(counters["total_seconds"], 4)
+            counters["first_byte_seconds"] = round(counters["first_byte_seconds"], 4)
+        return {"uptime_seconds": round(time.time() - self.started, 1), "clients": clients}
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def client_id(self) -> str:
+        client_id = self.headers.get("X-Client-Id")
+        if client_id:
+            return client_id
+        authorization = self.headers.get("Authorization", "")
+        if authorization.startswith("Bearer ") and len(authorization) > len("Bearer "):
+            return "key-" + hashlib.sha256(authorization.encode("utf-8")).hexdigest()[:12]
+        return self.client_address[0]
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def send_error_json(self, status, message):
+        return self.send_json({"error": {"message": message, "code": status}}, status=status)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/v1/models":
+            self.send_json(self.server.models_response())
+        elif path == "/metrics":
+            self.send_json(dict(self.server.metrics.snapshot(), upstream=api_module.get_coalescing_stats()))
+        else:
+            self.send_error_json(404, f"Unknown path {path}")
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path != "/v1/chat/completions":
+            self.send_error_json(404, f"Unknown path {path}")
+            return
+
+        client_id = self.client_id()
+        request_id = new_correlation_id()
+        log_extra = {"request_id": request_id}
+        start = time.perf_counter()
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_BYTES:
+            self.server.metrics.record(client_id, requests=1, errors=1)
+            self.send_error_json(413, "Request body too large")
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict) or not payload.get("model") or not payload.get("messages"):
+                raise ValueError("'model' and 'messages' are required")
+        except (ValueError, json.JSONDecodeError) as e:
+            self.server.metrics.record(client_id, requests=1, errors=1)
+            self.send_error_json(400, f"Invalid request: {e}")
+            return
+
+        stream = bool(payload.get("stream"))
+        logger.info("Proxy request from %s: model=%s stream=%s", client_id, payload["model"], stream, extra=log_extra)
+
+        try:
+            if stream:
+                # Identical concurrent requests from any client share one upstream stream
+                chunks = api_module.stream_chat_completion(self.server.api_key, payload)
+                first_chunk = next(chunks, b"")
+            else:
+                response = api_module.post_chat_completion(self.server.api_key, payload)
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 502
+            body = e.response.content if e.response is not None else b""
+            logger.warning("Upstream error %s for %s", status, client_id, extra=log_extra)
+            self.server.metrics.record(client_id, requests=1, errors=1)
+            self.send_raw(status, e.response.headers.get("Content-Type", "application/json") if e.response is not None else "application/json", body)
+            return
+        except api_module.APITimeoutError as e:
+            logger.error("Upstream timed out: %s", e, extra=log_extra)
+            self.server.metrics.record(client_id, requests=1, errors=1)
+            self.send_error_json(504, f"Upstream timed out: {e}")
+            return
+        except requests.exceptions.RequestException as e:
+            logger.error("Upstream request failed: %s", e, extra=log_extra)
+            self.server.metrics.record(client_id, requests=1, errors=1)
+            self.send_error_json(502, f"Upstream request failed: {e}")
+            return
+
+        if not stream:
+            with response:
+                bytes_out = self.send_raw(response.status_code, response.headers.get("Content-Type", "application/json"), response.content)
+            self.server.metrics.record(client_id, requests=1, bytes_out=bytes_out, total_seconds=time.perf_counter() - start)
+            return
+
+        # Streaming passthrough: forward upstream bytes as they arrive
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        bytes_out = 0
+        first_byte = time.perf_counter() - start
+        try:
+            with contextlib.closing(chunks):
+                for data in itertools.chain([first_chunk], chunks):
+                    if not data:
+                        continue
+                    self.write_chunk(data)
+                    bytes_out += len(data)
+            self.write_chunk(b"")
+        except (requests.exceptions.RequestException, api_module.APITimeoutError, OSError) as e:
+            # Upstream failed or stalled, or the client went away mid-stream; closing unsubscribes this client
+            logger.warning("Stream aborted for %s: %s", client_id, e, extra=log_extra)
+            self.server.metrics.record(client_id, requests=1, streamed=1, errors=1, bytes_out=bytes_out, first_byte_seconds=first_byte)
+            self.close_connection = True
+            return
+
+        elapsed = time.perf_counter() - start
+        logger.info("Proxy stream finished: %d bytes in %.3fs", bytes_out, elapsed, extra=log_extra)
+        self.server.metrics.record(client_id, requests=1, streamed=1, bytes_out=bytes_out, total_seconds=elapsed, first_byte_seconds=first_byte)
+
+    def send_raw(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class ProxyServer(ThreadingHTTPServer):
+    """
+    Threaded proxy server; each client connection is handled on its own thread.
+
+    Args:
+        address (tuple): (host, port) to listen on; port 0 picks a free port.
+        api_key (str): The upstream OpenRouter API key.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, api_key):
+        super().__init__(address, ProxyHandler)
+        self.api_key = api_key
+        self.metrics = ProxyMetrics()
+        self._models = None
+        self._models_lock = threading.Lock()
+
+    def models_response(self) -> dict:
+        """
+        Return the model list in OpenAI format, from the local catalog or, failing that, upstream.
+        """
+        with self._models_lock:
+            if self._models is None:
+                try:
+                    models = load_catalog()
+                except Exception as e:
+                    logger.info("Local catalog unavailable (%s); fetching models upstream", e)
+                    try:
+                        models = api_module.fetch_models().get("data", [])
+                    except Exception as e:
+                        logger.error("%s", e)
+                        return {"object": "list", "data": []}
+                self._models = [
+                    dict(model, object="model", owned_by=model.get("id", "").split("/")[0])
+                    for model in models
+                ]
+            return {"object": "list", "data": self._models}
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+
+def get_upstream_key() -> str:
+    """
+    Read the upstream key from OPENROUTER_API_KEY or the Windows credential store.
+    """
+    return api_module.get_api_key("API_KEY_OPENROUTER")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--upstream", help="Upstream API base URL (default: OpenRouter)")
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.upstream:
+        api_module.OPENROUTER_API_URL = args.upstream.rstrip("/")
+    try:
+        api_key = get_upstream_key()
+    except Exception as e:
+        print(f"No upstream API key: set OPENROUTER_API_KEY ({e})", file=sys.stderr)
+        sys.exit(1)
+
+    server = ProxyServer((args.host, args.port), api_key)
+    api_module.warm_connection_async()
+    print(f"Serving OpenAI-compatible API on {server.base_url} (upstream {api_module.OPENROUTER_API_URL})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        api_module.reset_session()
+
+
+if __name__ == "__main__":
+    main()
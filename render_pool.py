@@ -0,0 +1,138 @@
+# render_pool.py
+
+"""
+Renders markdown to HTML off the GUI thread.
+
+RenderJobs run on a small pool of their own (separate from the request pool,
+so rendering never waits behind API calls) and emit the HTML when it is
+ready; the views show the escaped plain text meanwhile. Markdown at least
+RENDER_PROCESS_CHARS long is converted in a worker process instead, so
+pygments and the markdown parser do not hold the GIL the GUI thread needs.
+The processes are spawned on first use; if they cannot be started the
+job renders on its thread.
+
+Environment variables:
+    OPENROUTER_RENDER_PROCESS_CHARS: Markdown length rendered in a process (default 20000; 0 disables processes).
+    OPENROUTER_RENDER_PROCESSES: Worker processes (default 2).
+"""
+
+import atexit
+import html
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PyQt5.QtCore import pyqtSignal
+
+import mdizer
+from app_logging import get_logger
+from request_pool import JobSignals, PoolJob, RequestPool
+
+logger = get_logger("render")
+
+RENDER_PROCESS_CHARS = int(os.environ.get("OPENROUTER_RENDER_PROCESS_CHARS", 20000))
+RENDER_PROCESSES = int(os.environ.get("OPENROUTER_RENDER_PROCESSES", 2))
+RENDER_THREADS = 2  # Threads feeding the processes and rendering short markdown
+
+_pool = None
+_executor = None
+_executor_failed = False
+_executor_lock = threading.Lock()
+
+
+def _process_executor():
+    """
+    Return the worker processes, starting them on first use, or None if they are unavailable.
+    """
+    global _executor, _executor_failed
+    with _executor_lock:
+        if _executor is None and not _executor_failed:
+            try:
+                # Forking a process that runs Qt threads is unsafe; spawn starts clean interpreters
+                _executor = ProcessPoolExecutor(RENDER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+                atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+            except Exception as e:
+                logger.warning("Render processes unavailable, rendering on threads: %s", e)
+                _executor_failed = True
+        return _executor
+
+
+def render_markdown(text: str, include_style: bool = True) -> str:
+    """
+    Convert markdown to HTML, in a worker process if it is long. Call from a worker thread.
+
+    Args:
+        text (str): The markdown.
+        include_style (bool, optional): Whether to embed mdizer.MARKDOWN_CSS. Defaults to True.
+
+    Returns:
+        str: The HTML, or the escaped text in a <pre> block if conversion failed.
+    """
+    try:
+        executor = _process_executor() if RENDER_PROCESS_CHARS and len(text) >= RENDER_PROCESS_CHARS else None
+        if executor is not None:
+            try:
+                return executor.submit(mdizer.markdown_to_html, text, include_style).result()
+            except Exception as e:
+                logger.warning("Render process failed, rendering on this thread: %s", e)
+        return mdizer.markdown_to_html(text, include_style)
+    except Exception as e:
+        logger.warning("Markdown conversion failed: %s", e)
+        return f"<pre>{html.escape(text)}</pre>"
+
+
+class RenderSignals(JobSignals):
+    rendered = pyqtSignal(str, object)  # Emits the HTML and the job's key
+
+
+class RenderJob(PoolJob):
+    """
+    Converts markdown to HTML in the background.
+
+    Connect signals.rendered before submitting the job. Connect it to a method
+    of the widget showing the result, so the connection goes away with the
+    widget if it is closed first.
+
+    Args:
+        text (str): The markdown; a ResponseBuffer is read on the worker thread.
+        key (object, optional): Passed back with the HTML, so one slot can serve many jobs.
+        include_style (bool, optional): Whether to embed mdizer.MARKDOWN_CSS. Defaults to True.
+    """
+    def __init__(self, text, key=None, include_style=True):
+        super().__init__(RenderSignals())
+        self.text = text
+        self.key = key
+        self.include_style = include_style
+
+    def work(self):
+        self.signals.rendered.emit(render_markdown(str(self.text), self.include_style), self.key)
+
+
+def get_render_pool() -> RequestPool:
+    """
+    Return the application-wide render pool, creating it on first use. Call from the GUI thread.
+    """
+    global _pool
+    if _pool is None:
+        _pool = RequestPool(RENDER_THREADS)
+    return _pool
+
+
+def submit_render(text, slot, key=None, include_style=True) -> RenderJob:
+    """
+    Render markdown in the background and call `slot(html, key)` on the GUI thread when done.
+
+    Args:
+        text (str): The markdown.
+        slot (callable): Receives the HTML and `key`; a method of the widget that shows it.
+        key (object, optional): Identifies the request to the slot.
+        include_style (bool, optional): Whether to embed mdizer.MARKDOWN_CSS. Defaults to True.
+
+    Returns:
+        RenderJob: The submitted job.
+    """
+    job = RenderJob(text, key, include_style)
+    job.signals.rendered.connect(slot)
+    get_render_pool().submit(job)
+    return job
@@ -0,0 +1,179 @@
+# request_pool.py
+
+"""
+A long-lived worker pool shared by every chat window.
+
+Jobs are QRunnables queued on a QThreadPool whose threads are kept alive
+between requests, so sending a message does not start a thread. The pool
+counts queued and running jobs and emits stats_changed whenever they
+change, which the chat windows show in their status bar.
+"""
+
+import abc
+import os
+import threading
+
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from app_logging import get_logger
+
+logger = get_logger("pool")
+
+MAX_WORKERS = int(os.environ.get("OPENROUTER_MAX_WORKERS", 4))  # Concurrent API calls across all chats
+SHUTDOWN_WAIT_MS = 5000  # How long quitting waits for running jobs
+
+_pool = None
+
+
+class JobSignals(QObject):
+    """
+    Signals of a PoolJob. QRunnable is not a QObject, so each job owns one of these.
+    """
+    started = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class _JobMeta(type(QRunnable), abc.ABCMeta):
+    """
+    Lets PoolJob, a sip-wrapped QRunnable, declare abstract methods.
+    """
+
+
+class PoolJob(QRunnable, metaclass=_JobMeta):
+    """
+    Base class for jobs run by the RequestPool. Subclasses implement work().
+
+    Args:
+        signals (JobSignals, optional): The signals object, for subclasses that add signals.
+    """
+    def __init__(self, signals=None):
+        super().__init__()
+        # The pool keeps a reference until the job finishes, so Qt must not delete it
+        self.setAutoDelete(False)
+        self.signals = signals or JobSignals()
+
+    def run(self):
+        self.signals.started.emit()
+        try:
+            self.work()
+        except Exception as e:
+            logger.error("Job failed: %s", e)
+        finally:
+            self.signals.finished.emit()
+
+    @abc.abstractmethod
+    def work(self):
+        """
+        Does the job on a pool thread; exceptions are logged.
+        """
+
+
+class RequestPool(QObject):
+    """
+    Runs PoolJobs on a fixed set of reusable threads, queueing the rest.
+
+    Args:
+        max_workers (int, optional): The number of worker threads. Defaults to MAX_WORKERS.
+    """
+    stats_changed = pyqtSignal(int, int, int)  # Emits (queued, running, max workers)
+
+    def __init__(self, max_workers=MAX_WORKERS, parent=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max_workers)
+        self.thread_pool.setExpiryTimeout(-1)  # Keep idle threads alive
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        # Stop the workers before the application and the jobs' signals are deleted
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    @property
+    def max_workers(self):
+        return self.thread_pool.maxThreadCount()
+
+    def submit(self, job: PoolJob):
+        """
+        Queue a job; it starts as soon as a worker is free.
+
+        Args:
+            job (PoolJob): The job to run.
+        """
+        job.signals.started.connect(lambda: self._job_started(job))
+        job.signals.finished.connect(lambda: self._job_finished(job))
+        with self._lock:
+            self._jobs.add(job)
+            self.queued += 1
+        self._emit_stats()
+        self.thread_pool.start(job)
+
+    def cancel(self, job: PoolJob) -> bool:
+        """
+        Remove a job that has not started yet from the queue.
+
+        A removed job never runs and emits none of its signals.
+
+        Args:
+            job (PoolJob): The job to remove.
+
+        Returns:
+            bool: True if the job was removed, False if it has already started.
+        """
+        if not self.thread_pool.tryTake(job):
+            return False
+        with self._lock:
+            self.queued -= 1
+            self._jobs.discard(job)
+        self._emit_stats()
+        return True
+
+    def stats(self) -> tuple:
+        """
+        Return (queued, running, max workers).
+        """
+        with self._lock:
+            return self.queued, self.running, self.max_workers
+
+    def utilization(self) -> float:
+        """
+        Return the fraction of workers that are busy.
+        """
+        queued, running, max_workers = self.stats()
+        return running / max_workers if max_workers else 0.0
+
+    def shutdown(self):
+        """
+        Drop queued jobs and wait up to SHUTDOWN_WAIT_MS for running ones.
+        """
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone(SHUTDOWN_WAIT_MS)
+
+    def _job_started(self, job):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        self._emit_stats()
+
+    def _job_finished(self, job):
+        with self._lock:
+            self.running -= 1
+            self._jobs.discard(job)
+        self._emit_stats()
+
+    def _emit_stats(self):
+        queued, running, max_workers = self.stats()
+        logger.debug("Pool: %d queued, %d/%d workers busy", queued, running, max_workers)
+        self.stats_changed.emit(queued, running, max_workers)
+
+
+def get_request_pool() -> RequestPool:
+    """
+    Return the application-wide pool, creating it on first use. Call from the GUI thread.
+    """
+    global _pool
+    if _pool is None:
+        _pool = RequestPool()
+    return _pool
@@ -0,0 +1,224 @@
+# request_validator.py
+
+"""
+Local validation of chat requests against the model catalog.
+
+Uses each model's catalog entry (top_provider.context_length,
+top_provider.max_completion_tokens and supported_parameters) to clamp or
+strip parameters before make_api_request is called, so requests that would
+be rejected by the API fail locally instead of after a network round trip.
+"""
+
+CHARS_PER_TOKEN = 4          # Rough average for English text and code
+TOKENS_PER_MESSAGE = 4       # Role and formatting overhead per message
+TOKENS_PER_IMAGE = 1000      # Conservative estimate for an image part
+TOKENS_PER_BINARY_FILE = 5000  # Flat estimate for a PDF or other binary file; its byte size says little about its text
+TEXT_MIMES = ("application/json", "application/xml", "application/javascript", "application/x-yaml", "application/x-sh")
+
+
+class RequestValidationError(Exception):
+    """
+    Raised when a request cannot succeed for the selected model.
+    """
+
+
+def find_model(model_data: list, model_id: str) -> dict | None:
+    """
+    Find a model's catalog entry by ID.
+
+    Args:
+        model_data (list): The catalog entries (the 'data' list of the models JSON).
+        model_id (str): The model ID to look up.
+
+    Returns:
+        dict | None: The catalog entry, or None if the model is not in the catalog.
+    """
+    for model in model_data or []:
+        if model.get('id') == model_id:
+            return model
+    return None
+
+
+def get_model_limits(model: dict | None) -> tuple:
+    """
+    Read the context and completion limits from a catalog entry.
+
+    Args:
+        model (dict | None): The catalog entry.
+
+    Returns:
+        tuple: (context_length, max_completion_tokens), each an int or None if unknown.
+    """
+    if not model:
+        return None, None
+    top_provider = model.get('top_provider') or {}
+    context_length = top_provider.get('context_length') or model.get('context_length')
+    max_completion_tokens = top_provider.get('max_completion_tokens')
+    context_length = int(context_length) if context_length else None
+    max_completion_tokens = int(max_completion_tokens) if max_completion_tokens else None
+    return context_length, max_completion_tokens
+
+
+def supports_parameter(model: dict | None, parameter: str) -> bool:
+    """
+    Check whether a model accepts a request parameter.
+
+    Models without a supported_parameters list are assumed to accept everything.
+
+    Args:
+        model (dict | None): The catalog entry.
+        parameter (str): The parameter name, e.g. "reasoning".
+
+    Returns:
+        bool: True if the parameter can be sent.
+    """
+    if not model or 'supported_parameters' not in model:
+        return True
+    return parameter in (model.get('supported_parameters') or [])
+
+
+def estimate_prompt_tokens(message_history: list) -> int:
+    """
+    Estimate the prompt size in tokens without a tokenizer.
+
+    Args:
+        message_history (list): The messages that will be sent.
+
+    Returns:
+        int: The estimated number of prompt tokens.
+    """
+    tokens = 0
+    for message in message_history:
+        content = message.get('content') or ''
+        if isinstance(content, list):
+            for part in content:
+                if part.get('type') == 'text':
+                    tokens += len(part.get('text', '')) // CHARS_PER_TOKEN
+                else:
+                    tokens += TOKENS_PER_IMAGE
+        else:
+            tokens += len(content) // CHARS_PER_TOKEN
+        for attachment in message.get('attachments') or []:
+            if attachment['kind'] == 'image':
+                tokens += TOKENS_PER_IMAGE
+            elif is_text_attachment(attachment):
+                tokens += attachment['size'] // CHARS_PER_TOKEN
+            else:
+                tokens += TOKENS_PER_BINARY_FILE
+        tokens += TOKENS_PER_MESSAGE
+    return tokens
+
+
+def is_text_attachment(attachment: dict) -> bool:
+    """
+    Check whether an attachment's bytes are text, so its size is a fair measure of its tokens.
+    """
+    mime = attachment.get('mime') or ''
+    return mime.startswith('text/') or mime in TEXT_MIMES
+
+
+def supports_input(model: dict | None, modality: str) -> bool:
+    """
+    Check whether a model accepts an input modality such as "image" or "file".
+
+    Uses architecture.input_modalities, or the older "text+image->text" style
+    architecture.modality string. Models without either are assumed to accept it.
+
+    Args:
+        model (dict | None): The catalog entry.
+        modality (str): The input modality.
+
+    Returns:
+        bool: True if the modality can be sent.
+    """
+    architecture = (model or {}).get('architecture') or {}
+    if architecture.get('input_modalities'):
+        return modality in architecture['input_modalities']
+    if architecture.get('modality'):
+        return modality in architecture['modality'].split('->')[0].split('+')
+    return True
+
+
+def validate_request(model: dict | None, message_history: list, temperature: float | None = None, context_length: int | None = None, max_completion_tokens: int | None = None, reasoning_effort: str | None = None, reasoning_max_tokens: int | None = None, exclude_reasoning: bool = False) -> tuple:
+    """
+    Clamp and strip request parameters so they fit the model's catalog entry.
+
+    The context length is treated as the total budget for prompt and
+    completion; the completion budget is sent as max_tokens.
+
+    Args:
+        model (dict | None): The catalog entry for the model, or None to skip catalog checks.
+        message_history (list): The messages that will be sent.
+        temperature (float, optional): Sampling temperature.
+        context_length (int, optional): The user's context budget. Defaults to the model's limit.
+        max_completion_tokens (int, optional): The user's completion budget.
+        reasoning_effort (str, optional): The reasoning effort level.
+        reasoning_max_tokens (int, optional): The maximum tokens for reasoning.
+        exclude_reasoning (bool, optional): Whether to exclude reasoning tokens from response.
+
+    Returns:
+        tuple: (kwargs, notes) where kwargs are keyword arguments for make_api_request
+            and notes is a list of human-readable adjustments that were made.
+
+    Raises:
+        RequestValidationError: If the prompt alone does not fit the context, or the model
+            does not accept the conversation's attachments.
+    """
+    notes = []
+    kinds = {attachment['kind'] for message in message_history for attachment in message.get('attachments') or []}
+    for kind in sorted(kinds):
+        if not supports_input(model, kind):
+            raise RequestValidationError(
+                f"The conversation has {kind} attachments, which this model does not accept. "
+                f"Pick a model that supports {kind} input."
+            )
+
+    model_context, model_completion = get_model_limits(model)
+    prompt_tokens = estimate_prompt_tokens(message_history)
+
+    # Context budget: never more than the model supports
+    if model_context and (not context_length or context_length > model_context):
+        if context_length:
+            notes.append(f"Context length clamped from {context_length} to {model_context}.")
+        context_length = model_context
+
+    if context_length and prompt_tokens >= context_length:
+        raise RequestValidationError(
+            f"The conversation is about {prompt_tokens} tokens, which does not fit the "
+            f"{context_length}-token context. Shorten the conversation or pick a model with a larger context."
+        )
+
+    # Completion budget: the smallest of the user's limit, the model's limit and what is left of the context
+    limits = [limit for limit in (max_completion_tokens, model_completion) if limit]
+    if context_length:
+        limits.append(context_length - prompt_tokens)
+    max_tokens = min(limits) if limits else None
+    if max_completion_tokens and max_tokens is not None and max_tokens < max_completion_tokens:
+        notes.append(f"Max completion tokens clamped from {max_completion_tokens} to {max_tokens}.")
+
+    kwargs = {
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "reasoning_effort": reasoning_effort,
+        "reasoning_max_tokens": reasoning_max_tokens,
+        "exclude_reasoning": exclude_reasoning,
+    }
+
+    if temperature is not None and not supports_parameter(model, 'temperature'):
+        kwargs["temperature"] = None
+        notes.append("Temperature is not supported by this model and was not sent.")
+    if max_tokens is not None and not supports_parameter(model, 'max_tokens'):
+        kwargs["max_tokens"] = None
+        notes.append("max_tokens is not supported by this model and was not sent.")
+
+    if (reasoning_effort or reasoning_max_tokens or exclude_reasoning) and not supports_parameter(model, 'reasoning'):
+        kwargs["reasoning_effort"] = None
+        kwargs["reasoning_max_tokens"] = None
+        kwargs["exclude_reasoning"] = False
+        notes.append("Reasoning parameters are not supported by this model and were not sent.")
+    elif reasoning_max_tokens and max_tokens and reasoning_max_tokens >= max_tokens:
+        # Reasoning tokens count towards max_tokens, so leave room for the answer
+        kwargs["reasoning_max_tokens"] = max(1, max_tokens // 2)
+        notes.append(f"Reasoning max tokens clamped from {reasoning_max_tokens} to {kwargs['reasoning_max_tokens']}.")
+
+    return kwargs, notes
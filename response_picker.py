@@ -1,69 +1,261 @@
 # response_picker.py
 
+import html
+
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QLabel, QButtonGroup, QRadioButton,
     QPushButton, QScrollArea, QWidget, QHBoxLayout, QSizePolicy, QFrame,
-    QTextBrowser  # Import QTextBrowser
+    QTextBrowser, QCheckBox, QComboBox
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon
-import mdizer  # Add this import
+from app_logging import get_logger
+from profiling import profiled
+from render_pool import submit_render
+from stream_buffer import ResponseBuffer
+from text_diff import DIFF_TIME_LIMIT, diff_texts
+
+logger = get_logger("picker")
+
+DIFF_CONTEXT_LINES = 2           # Unchanged lines kept around each change in diff mode
+MAX_DIFF_HTML_CHARS = 300_000    # The rest of a larger diff is cut off, to keep setHtml fast
+INSERT_STYLE = "background-color: #ccffd8;"
+DELETE_STYLE = "background-color: #ffd7d5; color: #82071e; text-decoration: line-through;"
+
+
+def render_diff_html(result, context_lines=DIFF_CONTEXT_LINES, max_chars=MAX_DIFF_HTML_CHARS):
+    """
+    Render a DiffResult as HTML: text only in the second response is highlighted,
+    text only in the first is struck through, and long unchanged stretches are collapsed.
+
+    Args:
+        result (DiffResult): The diff to render.
+        context_lines (int, optional): Unchanged lines shown before and after each change.
+        max_chars (int, optional): Approximate size limit of the HTML.
+
+    Returns:
+        str: The HTML.
+    """
+    parts = []
+    size = 0
+    last = len(result.opcodes) - 1
+    for position, (tag, i1, i2, j1, j2) in enumerate(result.opcodes):
+        if tag == "equal":
+            lines = "".join(result.tokens_b[j1:j2]).split("\n")
+            head = lines[:context_lines + 1] if position > 0 else []
+            tail = lines[-(context_lines + 1):] if position < last else []
+            if len(lines) > len(head) + len(tail) + 1:
+                hidden = len(lines) - len(head) - len(tail)
+                marker = f"<span style='color: #888888;'>\u22ef {hidden} unchanged lines \u22ef</span>"
+                chunk = html.escape("\n".join(head)) + "\n" + marker + "\n" + html.escape("\n".join(tail))
+            else:
+                chunk = html.escape("\n".join(lines))
+        else:
+            chunk = ""
+            if i2 > i1:
+                chunk += f"<span style='{DELETE_STYLE}'>{html.escape(''.join(result.tokens_a[i1:i2]))}</span>"
+            if j2 > j1:
+                chunk += f"<span style='{INSERT_STYLE}'>{html.escape(''.join(result.tokens_b[j1:j2]))}</span>"
+        parts.append(chunk)
+        size += len(chunk)
+        if size > max_chars and position < last:
+            parts.append("\n<span style='color: #888888;'>\u22ef diff truncated \u22ef</span>")
+            break
+    body = "".join(parts)
+    return f"<pre style='white-space: pre-wrap; font-family: Consolas, monospace;'>{body}</pre>"
+
+
+class DiffThread(QThread):
+    """
+    Diffs every choice against a base choice off the GUI thread, emitting each result as it is ready.
+
+    Args:
+        base_index (int): The choice the others are compared with.
+        texts (list): The choice texts (str or ResponseBuffer).
+        time_limit (float, optional): Seconds per diff before falling back to a coarser one.
+    """
+    diff_ready = pyqtSignal(int, str, str)  # Emits (choice index, diff HTML, summary)
+
+    def __init__(self, base_index, texts, time_limit=DIFF_TIME_LIMIT, parent=None):
+        super().__init__(parent)
+        self.base_index = base_index
+        self.texts = texts
+        self.time_limit = time_limit
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            base = str(self.texts[self.base_index])
+            for index, text in enumerate(self.texts):
+                if self.cancelled:
+                    return
+                if index == self.base_index:
+                    continue
+                result = diff_texts(base, str(text), self.time_limit, lambda: self.cancelled)
+                if self.cancelled:
+                    return
+                removed, added = result.counts()
+                summary = f"{result.ratio():.1%} similar to response {self.base_index + 1}: {added} words added, {removed} removed"
+                if not result.complete:
+                    summary += " (approximate: time limit reached)"
+                self.diff_ready.emit(index, render_diff_html(result), summary)
+        except Exception as e:
+            logger.error("Diff failed: %s", e)
 
 class ChoiceWidget(QWidget):
     """
-    A custom widget that combines a QRadioButton with a QLabel to display
-    a radio button alongside HTML-wrapped text.
+    A custom widget that combines a QRadioButton with a QTextBrowser to display
+    a radio button alongside Markdown-rendered text.
+
+    Markdown is not converted when the widget is created: a plain-text preview is
+    shown until render_markdown() is called (typically once the widget scrolls into view)
+    and the render pool returns the HTML, and the reasoning section stays
+    collapsed until the user expands it.
     """
+    PREVIEW_CHARS = 2000  # Characters shown as plain text before rendering
+
     def __init__(self, text, index, reasoning=None, parent=None):
         super().__init__(parent)
         self.markdown_text = text  # Store the original Markdown text
         self.reasoning_text = reasoning  # Store the original reasoning text
+        self.index = index
+        self.rendered = False
+        self.rendered_html = None  # Kept to restore the answer after a diff
+        self.reasoning_browser = None  # Created on first expand
+        self.diff_label = None  # Created the first time a diff is shown
+        self.showing_diff = False
         layout = QVBoxLayout(self)
         layout.setContentsMargins(5, 5, 5, 5)
 
         # Create the radio button and label layout
         radio_layout = QHBoxLayout()
-        self.radio_button = QRadioButton()
+        self.radio_button = QRadioButton(f"{index + 1}.")
         self.label = QTextBrowser()  # Use QTextBrowser for better HTML rendering
-        
-        # Convert markdown to HTML
-        html_content = mdizer.markdown_to_html(self.markdown_text)
-        self.label.setHtml(f"<div style='max-width: 350px; word-wrap: break-word;'>{html_content}</div>")
-        
+
+        self.show_preview()  # Until the choice is rendered
+
         self.label.setReadOnly(True)
         self.label.setOpenExternalLinks(True)
         self.label.setStyleSheet("QTextBrowser { background-color: transparent; border: none; }")
         self.label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+        self.label.setMinimumHeight(120)
+        self.label.setMaximumHeight(400)  # Long answers scroll inside the browser
 
-        radio_layout.addWidget(self.radio_button)
+        radio_layout.addWidget(self.radio_button, 0, Qt.AlignTop)
         radio_layout.addWidget(self.label)
         layout.addLayout(radio_layout)
 
-        # Add reasoning if available
+        # Add a collapsed reasoning section if available
         if reasoning:
             # Create a divider
             divider = QFrame()
             divider.setFrameShape(QFrame.HLine)
             divider.setFrameShadow(QFrame.Sunken)
             layout.addWidget(divider)
-            
-            # Add reasoning section with label
-            reasoning_header = QLabel("<b>Reasoning:</b>")
-            layout.addWidget(reasoning_header)
-            
-            # Create reasoning browser
+
+            self.reasoning_toggle = QPushButton("Show Reasoning")
+            self.reasoning_toggle.setCheckable(True)
+            self.reasoning_toggle.setFlat(True)
+            self.reasoning_toggle.setStyleSheet("QPushButton { text-align: left; font-weight: bold; }")
+            self.reasoning_toggle.toggled.connect(self.toggle_reasoning)
+            layout.addWidget(self.reasoning_toggle)
+
+        self.setLayout(layout)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+
+    def preview_text(self, text):
+        """
+        Returns the start of `text` (a str or ResponseBuffer) as a cheap plain-text preview.
+        """
+        if isinstance(text, ResponseBuffer):
+            preview = text.head(self.PREVIEW_CHARS)
+        else:
+            preview = text[:self.PREVIEW_CHARS]
+        if len(text) > self.PREVIEW_CHARS:
+            preview += "\n..."
+        return preview
+
+    def show_preview(self):
+        """
+        Shows a cheap plain-text preview of the answer.
+        """
+        self.label.setPlainText(self.preview_text(self.markdown_text))
+
+    def render_markdown(self):
+        """
+        Converts the Markdown content to HTML on the render pool, once.
+        """
+        if self.rendered or self.showing_diff:
+            return
+        self.rendered = True
+        if self.rendered_html is not None:
+            self.on_rendered(self.rendered_html)
+        else:
+            submit_render(self.markdown_text, self.on_rendered)
+
+    def on_rendered(self, html_content, key=None):
+        self.rendered_html = html_content
+        if self.rendered and not self.showing_diff:
+            self.label.setHtml(f"<div style='max-width: 350px; word-wrap: break-word;'>{html_content}</div>")
+
+    def show_diff(self, html_content, summary):
+        """
+        Shows a diff against the base choice in place of the rendered answer.
+
+        Args:
+            html_content (str): The diff HTML, or "" to show only the summary.
+            summary (str): A one-line description shown above the text.
+        """
+        if self.diff_label is None:
+            self.diff_label = QLabel()
+            self.diff_label.setWordWrap(True)
+            self.diff_label.setStyleSheet("QLabel { color: #555555; font-style: italic; }")
+            self.layout().insertWidget(0, self.diff_label)
+        self.diff_label.setText(summary)
+        self.diff_label.setVisible(True)
+        if html_content:
+            self.showing_diff = True
+            self.label.setHtml(html_content)
+
+    def hide_diff(self):
+        """
+        Restores the normal view of the answer.
+        """
+        if self.diff_label is not None:
+            self.diff_label.setVisible(False)
+        if not self.showing_diff:
+            return
+        self.showing_diff = False
+        if self.rendered:
+            self.rendered = False
+            self.render_markdown()
+        else:
+            self.show_preview()
+
+    def toggle_reasoning(self, expanded):
+        """
+        Shows or hides the reasoning section, rendering it on first expand.
+        """
+        if expanded and self.reasoning_browser is None:
             self.reasoning_browser = QTextBrowser()
-            reasoning_html = mdizer.markdown_to_html(self.reasoning_text)
-            self.reasoning_browser.setHtml(f"<div style='max-width: 350px; word-wrap: break-word;'>{reasoning_html}</div>")
+            self.reasoning_browser.setPlainText(self.preview_text(self.reasoning_text))
+            submit_render(self.reasoning_text, self.on_reasoning_rendered)
             self.reasoning_browser.setReadOnly(True)
             self.reasoning_browser.setOpenExternalLinks(True)
             self.reasoning_browser.setStyleSheet("QTextBrowser { background-color: #f5f5f5; border: 1px solid #e0e0e0; border-radius: 5px; padding: 5px; max-height: 150px; }")
             self.reasoning_browser.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
             self.reasoning_browser.setMaximumHeight(150)  # Limit height
-            layout.addWidget(self.reasoning_browser)
+            self.layout().addWidget(self.reasoning_browser)
 
-        self.setLayout(layout)
-        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+        if self.reasoning_browser is not None:
+            self.reasoning_browser.setVisible(expanded)
+        self.reasoning_toggle.setText("Hide Reasoning" if expanded else "Show Reasoning")
+
+    def on_reasoning_rendered(self, html_content, key=None):
+        self.reasoning_browser.setHtml(f"<div style='max-width: 350px; word-wrap: break-word;'>{html_content}</div>")
 
 
 class ResponsePicker(QDialog):
@@ -73,9 +265,13 @@ class ResponsePicker(QDialog):
         self.setWindowIcon(QIcon("path/to/icon.png"))  # Set an appropriate icon
         self.selected_content = None
         self.selected_reasoning = None
+        self.selected_index = None
+        self.diff_thread = None
+        self.stale_diff_threads = []  # Cancelled comparisons that may still be running
         self.initUI(choices)
         self.applyStyles()
 
+    @profiled("ResponsePicker.initUI")
     def initUI(self, choices):
         """
         Initializes the UI with response choices.
@@ -98,8 +294,22 @@ class ResponsePicker(QDialog):
         instruction_label.setFont(instruction_font)
         dialog_layout.addWidget(instruction_label)
 
+        # Diff mode: compare every choice with one of them
+        if len(choices) > 1:
+            diff_layout = QHBoxLayout()
+            self.diff_checkbox = QCheckBox("Show differences against")
+            self.diff_checkbox.toggled.connect(self.update_diff_mode)
+            self.diff_base_combo = QComboBox()
+            self.diff_base_combo.addItems([f"Response {idx + 1}" for idx in range(len(choices))])
+            self.diff_base_combo.currentIndexChanged.connect(self.update_diff_mode)
+            self.diff_status_label = QLabel()
+            diff_layout.addWidget(self.diff_checkbox)
+            diff_layout.addWidget(self.diff_base_combo)
+            diff_layout.addWidget(self.diff_status_label, 1)
+            dialog_layout.addLayout(diff_layout)
+
         # Scroll Area
-        scroll_area = QScrollArea()
+        self.scroll_area = scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
         scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
@@ -119,7 +329,7 @@ class ResponsePicker(QDialog):
         self.choice_widgets = []
 
         for idx, choice in enumerate(choices):
-            content = choice["message"]["content"].strip()
+            content = choice["message"]["content"]  # A str or a ResponseBuffer
             reasoning = choice["message"].get("reasoning", "")
 
             # Create the custom ChoiceWidget
@@ -135,8 +345,14 @@ class ResponsePicker(QDialog):
 
         scroll_content.setLayout(scroll_layout)
         scroll_area.setWidget(scroll_content)
-        scroll_area.setMaximumHeight(300)  # Adjust as needed for up to 6 choices
-        dialog_layout.addWidget(scroll_area)
+        dialog_layout.addWidget(scroll_area, 1)  # Let the choices take the spare height
+
+        # Render choices lazily as they scroll into view
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(50)
+        self.render_timer.timeout.connect(self.render_visible_choices)
+        scroll_area.verticalScrollBar().valueChanged.connect(self.render_timer.start)
 
         # Button Layout
         button_layout = QHBoxLayout()
@@ -185,11 +401,83 @@ class ResponsePicker(QDialog):
         dialog_layout.addLayout(button_layout)
 
         self.setLayout(dialog_layout)
-        self.resize(600, 500)  # Set a reasonable default size
+        self.resize(700, 650)  # Set a reasonable default size
 
         # Connect signal to enable Select button when a choice is clicked
         self.choice_buttons.buttonClicked.connect(self.on_choice_selected)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.render_timer.start()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.render_timer.start()
+
+    def render_visible_choices(self):
+        """
+        Renders the Markdown of every choice that intersects the scroll area's viewport.
+        """
+        if self.diff_thread is not None:
+            return  # Diff mode shows the diffs instead
+        viewport = self.scroll_area.viewport()
+        visible = viewport.rect()
+        for choice_widget in self.choice_widgets:
+            if choice_widget.rendered:
+                continue
+            top_left = choice_widget.mapTo(viewport, choice_widget.rect().topLeft())
+            if visible.intersects(choice_widget.rect().translated(top_left)):
+                choice_widget.render_markdown()
+
+    def update_diff_mode(self):
+        """
+        Starts diffing the choices against the selected base, or leaves diff mode.
+        """
+        self.cancel_diff()
+        if not self.diff_checkbox.isChecked():
+            self.diff_status_label.clear()
+            for choice_widget in self.choice_widgets:
+                choice_widget.hide_diff()
+            self.render_timer.start()
+            return
+
+        base_index = self.diff_base_combo.currentIndex()
+        self.pending_diffs = len(self.choice_widgets) - 1
+        self.diff_status_label.setText("Comparing responses...")
+        for idx, choice_widget in enumerate(self.choice_widgets):
+            if idx == base_index:
+                choice_widget.hide_diff()
+                choice_widget.show_diff("", "Base for comparison")
+            else:
+                choice_widget.show_diff("", "Comparing...")
+        self.diff_thread = DiffThread(base_index, [w.markdown_text for w in self.choice_widgets], parent=self)
+        self.diff_thread.diff_ready.connect(self.on_diff_ready)
+        self.diff_thread.start()
+
+    def on_diff_ready(self, index, html_content, summary):
+        if self.sender() is not self.diff_thread:
+            return  # A result from a cancelled comparison
+        self.choice_widgets[index].show_diff(html_content, summary)
+        self.pending_diffs -= 1
+        if self.pending_diffs <= 0:
+            self.diff_status_label.clear()
+
+    def cancel_diff(self):
+        """
+        Stops the running comparison, if any; its results are discarded.
+        """
+        if self.diff_thread is not None:
+            self.diff_thread.cancel()
+            self.stale_diff_threads.append(self.diff_thread)
+            self.diff_thread = None
+        self.stale_diff_threads = [thread for thread in self.stale_diff_threads if thread.isRunning()]
+
+    def done(self, result):
+        self.cancel_diff()
+        for thread in self.stale_diff_threads:
+            thread.wait()  # Cancelled diffs stop at their next check, well within a second
+        super().done(result)
+
     def applyStyles(self):
         self.setStyleSheet("""
             QDialog {
@@ -208,8 +496,9 @@ class ResponsePicker(QDialog):
             return
         selected_widget = self.choice_widgets[selected_id]
         # Retrieve the original Markdown content and reasoning
-        self.selected_content = selected_widget.markdown_text
+        self.selected_content = str(selected_widget.markdown_text).strip()
         self.selected_reasoning = selected_widget.reasoning_text
+        self.selected_index = selected_id
         self.accept()
 
     def get_selected_content(self):
@@ -218,5 +507,8 @@ class ResponsePicker(QDialog):
     def get_selected_reasoning(self):
         return self.selected_reasoning
 
+    def get_selected_index(self):
+        return self.selected_index
+
     def on_choice_selected(self, button):
         self.select_button.setEnabled(True)
@@ -0,0 +1,83 @@
+# search_dialog.py
+
+from datetime import datetime
+
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QTextBrowser, QLabel
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+
+SEARCH_DELAY_MS = 150  # Debounce while typing
+
+
+class SearchDialog(QDialog):
+    """
+    Searches stored conversations and lets the user jump to a hit.
+    """
+    message_selected = pyqtSignal(str, str)  # Emits (node_id, conversation_id)
+
+    def __init__(self, parent, chat_index, current_conversation_id=None):
+        super().__init__(parent)
+        self.setWindowTitle("Search Conversations")
+        self.resize(650, 500)
+        self.chat_index = chat_index
+        self.current_conversation_id = current_conversation_id
+        self.initUI()
+
+    def initUI(self):
+        layout = QVBoxLayout()
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search messages and reasoning...")
+        self.search_input.textChanged.connect(lambda: self.search_timer.start())
+        layout.addWidget(self.search_input)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        self.results_browser = QTextBrowser()
+        self.results_browser.setOpenLinks(False)
+        self.results_browser.anchorClicked.connect(self.on_result_clicked)
+        layout.addWidget(self.results_browser)
+
+        self.setLayout(layout)
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
+
+    def run_search(self):
+        """
+        Runs the search and lists the hits with highlighted snippets.
+        """
+        text = self.search_input.text().strip()
+        if not text:
+            self.results_browser.clear()
+            self.status_label.setText("")
+            return
+
+        hits = self.chat_index.search(text)
+        self.status_label.setText(f"{len(hits)} result{'s' if len(hits) != 1 else ''}")
+
+        parts = []
+        for hit in hits:
+            when = datetime.fromtimestamp(hit["created"]).strftime('%Y-%m-%d %H:%M')
+            sender = "You" if hit["role"] == "user" else "Assistant"
+            where = "this chat" if hit["conversation_id"] == self.current_conversation_id else "earlier chat"
+            parts.append(
+                f"<p><a href='message:{hit['node_id']}/{hit['conversation_id']}'><b>{sender}</b></a> "
+                f"<span style='color: #888888;'>{when}, {where}</span><br>{hit['snippet']}</p>"
+            )
+        self.results_browser.setHtml("".join(parts))
+
+    def on_result_clicked(self, url):
+        node_id, _, conversation_id = url.path().partition("/")
+        self.message_selected.emit(node_id, conversation_id)
+        self.accept()
+
+    def keyPressEvent(self, event):
+        # Enter searches immediately instead of closing the dialog
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            self.search_timer.stop()
+            self.run_search()
+            return
+        super().keyPressEvent(event)
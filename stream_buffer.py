@@ -0,0 +1,209 @@
+# stream_buffer.py
+
+import bisect
+import tempfile
+import threading
+
+# Default limits for streamed text (in characters)
+DEFAULT_SPILL_CHARS = 256_000          # Kept in RAM before spilling to disk
+DEFAULT_REASONING_CAP = 2_000_000      # Hard cap for reasoning; anything beyond is dropped
+DEFAULT_REASONING_MEMORY = 64_000      # Reasoning kept in RAM before spilling to disk
+
+
+class ResponseBuffer:
+    """
+    Accumulates streamed text in linear time with a bounded in-memory footprint.
+
+    Chunks are appended to a list instead of being concatenated, so no text is
+    copied until it is read. Once the in-memory part exceeds `spill_chars` it is
+    written to an anonymous temporary file as UTF-8, and an index of spill
+    offsets lets readers fetch any suffix without decoding the whole file.
+    """
+    def __init__(self, spill_chars: int = DEFAULT_SPILL_CHARS):
+        self.spill_chars = spill_chars
+        self._chunks = []
+        self._memory_size = 0
+        self._length = 0
+        self._spill_file = None
+        self._spilled_chars = 0
+        self._spill_chars_index = []  # Character offset at the start of each spilled segment
+        self._spill_bytes_index = []  # Byte offset at the start of each spilled segment
+        self._file_lock = threading.Lock()  # Readers may run on other threads (e.g. indexing)
+
+    def append(self, text: str):
+        """
+        Appends a chunk of text, spilling the in-memory part to disk if needed.
+
+        Args:
+            text (str): The chunk to append.
+        """
+        if not text:
+            return
+        self._chunks.append(text)
+        self._memory_size += len(text)
+        self._length += len(text)
+        if self._memory_size > self.spill_chars:
+            self._spill()
+
+    def _spill(self):
+        """
+        Moves the in-memory chunks to the temporary file.
+        """
+        data = ''.join(self._chunks).encode('utf-8')
+        with self._file_lock:
+            if self._spill_file is None:
+                self._spill_file = tempfile.TemporaryFile()
+            self._spill_file.seek(0, 2)
+            self._spill_chars_index.append(self._spilled_chars)
+            self._spill_bytes_index.append(self._spill_file.tell())
+            self._spill_file.write(data)
+        self._spilled_chars += self._memory_size
+        self._chunks = []
+        self._memory_size = 0
+
+    @property
+    def spilled(self) -> bool:
+        """
+        bool: Whether part of the text lives in the temporary file.
+        """
+        return self._spill_file is not None
+
+    def read_from(self, offset: int) -> str:
+        """
+        Returns the text from a character offset to the end.
+
+        Incremental renderers can remember the length they have already shown
+        and fetch only what arrived since.
+
+        Args:
+            offset (int): The character offset to start from.
+
+        Returns:
+            str: The text after `offset`.
+        """
+        offset = max(0, offset)
+        if offset >= self._spilled_chars:
+            in_memory = ''.join(self._chunks)
+            if len(self._chunks) > 1:
+                self._chunks = [in_memory]  # Compact so repeated reads stay cheap
+            return in_memory[offset - self._spilled_chars:]
+
+        # Seek to the spilled segment containing the offset
+        segment = bisect.bisect_right(self._spill_chars_index, offset) - 1
+        with self._file_lock:
+            self._spill_file.flush()
+            self._spill_file.seek(self._spill_bytes_index[segment])
+            spilled = self._spill_file.read().decode('utf-8')
+        return spilled[offset - self._spill_chars_index[segment]:] + ''.join(self._chunks)
+
+    def head(self, count: int) -> str:
+        """
+        Returns the first `count` characters without materializing the rest.
+
+        Args:
+            count (int): The number of characters to return.
+
+        Returns:
+            str: The beginning of the text.
+        """
+        if self._spill_file is None:
+            text = ''
+            for chunk in self._chunks:
+                text += chunk
+                if len(text) >= count:
+                    break
+            return text[:count]
+        with self._file_lock:
+            self._spill_file.flush()
+            self._spill_file.seek(0)
+            # A UTF-8 character is at most 4 bytes
+            data = self._spill_file.read(count * 4).decode('utf-8', errors='ignore')
+        if len(data) < count:
+            data += ''.join(self._chunks)
+        return data[:count]
+
+    def tail(self, count: int) -> str:
+        """
+        Returns the last `count` characters.
+
+        Args:
+            count (int): The number of characters to return.
+
+        Returns:
+            str: The end of the text.
+        """
+        return self.read_from(self._length - count)
+
+    def getvalue(self) -> str:
+        """
+        Returns the full text, reading back any spilled part.
+
+        Returns:
+            str: The accumulated text.
+        """
+        return self.read_from(0)
+
+    def close(self):
+        """
+        Releases the temporary file, if any.
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._chunks = []
+        self._memory_size = 0
+        self._length = 0
+        self._spilled_chars = 0
+        self._spill_chars_index = []
+        self._spill_bytes_index = []
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __str__(self):
+        return self.getvalue()
+
+
+class ReasoningBuffer(ResponseBuffer):
+    """
+    A ResponseBuffer with a hard cap, for streamed reasoning traces.
+
+    Text beyond `max_chars` is dropped and the buffer is marked as truncated.
+    """
+    def __init__(self, max_chars: int = DEFAULT_REASONING_CAP, memory_chars: int = DEFAULT_REASONING_MEMORY):
+        super().__init__(spill_chars=memory_chars)
+        self.max_chars = max_chars
+        self.truncated = False
+
+    def append(self, text: str):
+        """
+        Appends a chunk of reasoning text, truncating at the cap.
+
+        Args:
+            text (str): The chunk to append.
+        """
+        if not text:
+            return
+        remaining = self.max_chars - self._length
+        if remaining <= 0:
+            self.truncated = True
+            return
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        super().append(text)
+
+    def getvalue(self) -> str:
+        """
+        Returns the full reasoning text, with a marker if it was truncated.
+
+        Returns:
+            str: The accumulated reasoning.
+        """
+        text = super().getvalue()
+        if self.truncated:
+            text += "\n\n*[Reasoning truncated]*"
+        return text
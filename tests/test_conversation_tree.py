@@ -0,0 +1,36 @@
+# test_conversation_tree.py
+
+import unittest
+
+from conversation_tree import ConversationTree
+
+
+class PopTest(unittest.TestCase):
+    def test_failed_edit_returns_to_the_edited_branch(self):
+        tree = ConversationTree()
+        for question in ("q1", "q2", "q3"):
+            if len(tree):
+                tree.branch(0, {"role": "user", "content": question})
+            else:
+                tree.append({"role": "user", "content": question})
+            tree.append({"role": "assistant", "content": f"a{question[1]}"})
+        tree.switch_branch(0, -2)  # q3 -> q1
+        self.assertEqual(tree.messages()[0]["content"], "q1")
+
+        tree.branch(0, {"role": "user", "content": "q1 edited"})
+        tree.pop()  # The send failed
+        tree.descend()
+
+        self.assertEqual([m["content"] for m in tree.messages()], ["q1", "a1"])
+
+    def test_pop_after_append_keeps_the_last_sibling(self):
+        tree = ConversationTree()
+        tree.append({"role": "user", "content": "q"})
+        tree.append({"role": "assistant", "content": "a"}, alternatives=[{"role": "assistant", "content": "b"}])
+        tree.append({"role": "user", "content": "next"})
+        tree.pop()
+        self.assertEqual(tree.messages()[-1]["content"], "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,310 @@
+# text_diff.py
+
+"""
+Line and word diffs between long responses, in linear space and bounded time.
+
+Tokens are interned to integers so the diff compares small ints instead of
+strings. The diff itself is Myers' O(ND) algorithm in its linear-space form
+(middle snake + divide and conquer), run after trimming the common prefix and
+suffix and after setting aside tokens that only occur on one side, which
+cannot be part of any match.
+
+Every diff has a deadline. When it is reached, the region still being worked
+on is reported as a single replacement instead of being diffed further, and
+the result is flagged as approximate, so the caller always gets an answer in
+about `time_limit` seconds.
+
+Texts are first compared line by line; replaced line blocks are then refined
+word by word while there is time left.
+"""
+
+import os
+import re
+import time
+
+DIFF_TIME_LIMIT = float(os.environ.get("OPENROUTER_DIFF_TIME_LIMIT", 2.0))  # Seconds per diff
+WORD_DIFF_MAX_TOKENS = 20_000  # Larger replaced blocks are only diffed line by line
+
+_WORD_RE = re.compile(r"\s+|\w+|[^\w\s]")
+
+
+class DiffTimeout(Exception):
+    """
+    Raised inside the diff when its deadline passes or it is cancelled.
+    """
+
+
+class DiffResult:
+    """
+    The outcome of diffing two token sequences.
+
+    Attributes:
+        tokens_a (list): The tokens of the first text.
+        tokens_b (list): The tokens of the second text.
+        opcodes (list): (tag, i1, i2, j1, j2) tuples as returned by difflib's
+            get_opcodes(), with tags "equal", "replace", "delete" and "insert".
+        complete (bool): False if the deadline cut the diff short and some
+            replaced regions may contain unmarked common text.
+    """
+    def __init__(self, tokens_a, tokens_b, opcodes, complete=True):
+        self.tokens_a = tokens_a
+        self.tokens_b = tokens_b
+        self.opcodes = opcodes
+        self.complete = complete
+
+    def ratio(self) -> float:
+        """
+        Return the similarity in [0, 1], like difflib's SequenceMatcher.ratio().
+        """
+        total = len(self.tokens_a) + len(self.tokens_b)
+        if not total:
+            return 1.0
+        matched = sum(i2 - i1 for tag, i1, i2, j1, j2 in self.opcodes if tag == "equal")
+        return 2.0 * matched / total
+
+    def counts(self) -> tuple:
+        """
+        Return (tokens removed from a, tokens added in b), not counting whitespace.
+        """
+        removed = added = 0
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if tag != "equal":
+                removed += sum(1 for token in self.tokens_a[i1:i2] if token.strip())
+                added += sum(1 for token in self.tokens_b[j1:j2] if token.strip())
+        return removed, added
+
+
+def split_lines(text: str) -> list:
+    """
+    Split text into lines, keeping the line endings.
+    """
+    return text.splitlines(keepends=True)
+
+
+def split_words(text: str) -> list:
+    """
+    Split text into words, runs of whitespace and single punctuation characters.
+    """
+    return _WORD_RE.findall(text)
+
+
+def intern_tokens(tokens_a: list, tokens_b: list) -> tuple:
+    """
+    Map the tokens of both sequences to small integers, equal tokens to equal integers.
+
+    Returns:
+        tuple: (ids of tokens_a, ids of tokens_b).
+    """
+    table = {}
+    ids_a = [table.setdefault(token, len(table)) for token in tokens_a]
+    ids_b = [table.setdefault(token, len(table)) for token in tokens_b]
+    return ids_a, ids_b
+
+
+def _middle_snake(a, b, deadline, should_stop):
+    """
+    Find the middle snake of an optimal edit script between a and b (both non-empty).
+
+    Returns:
+        tuple: (x start, y start, x end, y end) of the snake.
+    """
+    n, m = len(a), len(b)
+    delta = n - m
+    odd = delta & 1
+    limit = (n + m + 1) // 2
+    offset = limit + 1
+    forward = [0] * (2 * limit + 3)
+    backward = [0] * (2 * limit + 3)
+    for d in range(limit + 1):
+        if time.monotonic() > deadline or (should_stop and should_stop()):
+            raise DiffTimeout()
+        # Forward search from (0, 0)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            c = delta - k
+            if odd and -(d - 1) <= c <= d - 1 and x + backward[offset + c] >= n:
+                return x0, y0, x, y
+        # Backward search from (n, m), in reversed coordinates
+        for c in range(-d, d + 1, 2):
+            if c == -d or (c != d and backward[offset + c - 1] < backward[offset + c + 1]):
+                x = backward[offset + c + 1]
+            else:
+                x = backward[offset + c - 1] + 1
+            y = x - c
+            x0, y0 = x, y
+            while x < n and y < m and a[n - 1 - x] == b[m - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + c] = x
+            k = delta - c
+            if not odd and -d <= k <= d and x + forward[offset + k] >= n:
+                return n - x, m - y, n - x0, m - y0
+    raise AssertionError("no middle snake")  # Unreachable for non-empty inputs
+
+
+def _match(a, b, a_lo, b_lo, matches, deadline, should_stop):
+    """
+    Append the matching runs (a index, b index, length) of a and b to matches.
+
+    Raises DiffTimeout with the unfinished region left unmatched.
+    """
+    # Trim the common prefix and suffix
+    n, m = len(a), len(b)
+    prefix = 0
+    while prefix < n and prefix < m and a[prefix] == b[prefix]:
+        prefix += 1
+    if prefix:
+        matches.append((a_lo, b_lo, prefix))
+    suffix = 0
+    while suffix < n - prefix and suffix < m - prefix and a[n - 1 - suffix] == b[m - 1 - suffix]:
+        suffix += 1
+    a_mid = a[prefix:n - suffix]
+    b_mid = b[prefix:m - suffix]
+    if suffix:
+        matches.append((a_lo + n - suffix, b_lo + m - suffix, suffix))
+    if not a_mid or not b_mid:
+        return
+
+    x0, y0, x1, y1 = _middle_snake(a_mid, b_mid, deadline, should_stop)
+    a_lo += prefix
+    b_lo += prefix
+    if x1 > x0:
+        matches.append((a_lo + x0, b_lo + y0, x1 - x0))
+    try:
+        _match(a_mid[:x0], b_mid[:y0], a_lo, b_lo, matches, deadline, should_stop)
+    finally:
+        # Keep whatever the second half can find before the deadline, too
+        _match(a_mid[x1:], b_mid[y1:], a_lo + x1, b_lo + y1, matches, deadline, should_stop)
+
+
+def _matching_runs(a, b, deadline, should_stop):
+    """
+    Return (sorted matching runs, complete) for two id sequences.
+    """
+    # Tokens that only occur on one side can never match; diff the rest
+    in_a, in_b = set(a), set(b)
+    keep_a = [i for i, token in enumerate(a) if token in in_b]
+    keep_b = [j for j, token in enumerate(b) if token in in_a]
+    runs = []
+    complete = True
+    try:
+        _match([a[i] for i in keep_a], [b[j] for j in keep_b], 0, 0, runs, deadline, should_stop)
+    except DiffTimeout:
+        complete = False
+
+    # Map the runs back to the original positions, splitting them where tokens were set aside
+    matches = []
+    for i, j, size in sorted(runs):
+        for offset in range(size):
+            ai, bj = keep_a[i + offset], keep_b[j + offset]
+            if matches and matches[-1][0] + matches[-1][2] == ai and matches[-1][1] + matches[-1][2] == bj:
+                matches[-1][2] += 1
+            else:
+                matches.append([ai, bj, 1])
+    return matches, complete
+
+
+def _opcodes(matches, n, m, offset_a=0, offset_b=0):
+    """
+    Convert sorted matching runs into difflib-style opcodes.
+    """
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in matches + [[n, m, 0]]:
+        if i < ai and j < bj:
+            opcodes.append(("replace", offset_a + i, offset_a + ai, offset_b + j, offset_b + bj))
+        elif i < ai:
+            opcodes.append(("delete", offset_a + i, offset_a + ai, offset_b + j, offset_b + j))
+        elif j < bj:
+            opcodes.append(("insert", offset_a + i, offset_a + i, offset_b + j, offset_b + bj))
+        if size:
+            opcodes.append(("equal", offset_a + ai, offset_a + ai + size, offset_b + bj, offset_b + bj + size))
+        i, j = ai + size, bj + size
+    return opcodes
+
+
+def diff_tokens(tokens_a: list, tokens_b: list, time_limit: float = DIFF_TIME_LIMIT, should_stop=None) -> DiffResult:
+    """
+    Diff two token sequences.
+
+    Args:
+        tokens_a (list): The first sequence of hashable tokens.
+        tokens_b (list): The second sequence.
+        time_limit (float, optional): Seconds before the diff falls back to coarser replacements.
+        should_stop (callable, optional): Returns True to abandon the diff early, like a timeout.
+
+    Returns:
+        DiffResult: The opcodes turning tokens_a into tokens_b.
+    """
+    ids_a, ids_b = intern_tokens(tokens_a, tokens_b)
+    matches, complete = _matching_runs(ids_a, ids_b, time.monotonic() + time_limit, should_stop)
+    return DiffResult(tokens_a, tokens_b, _opcodes(matches, len(ids_a), len(ids_b)), complete)
+
+
+def diff_texts(text_a: str, text_b: str, time_limit: float = DIFF_TIME_LIMIT, should_stop=None) -> DiffResult:
+    """
+    Diff two texts word by word, finding changed lines first.
+
+    Lines are diffed first; each replaced block of lines is then diffed word by
+    word, as long as the block is not too large and time remains. Blocks left
+    unrefined stay whole-line replacements.
+
+    Args:
+        text_a (str): The text to compare against.
+        text_b (str): The text to compare.
+        time_limit (float, optional): Total seconds for both passes.
+        should_stop (callable, optional): Returns True to abandon the diff early.
+
+    Returns:
+        DiffResult: Word-level opcodes; complete is False if any pass was cut short.
+    """
+    deadline = time.monotonic() + time_limit
+    lines = diff_tokens(split_lines(text_a), split_lines(text_b), time_limit, should_stop)
+    complete = lines.complete
+
+    tokens_a, tokens_b, opcodes = [], [], []
+    for tag, i1, i2, j1, j2 in lines.opcodes:
+        words_a = split_words("".join(lines.tokens_a[i1:i2]))
+        words_b = split_words("".join(lines.tokens_b[j1:j2]))
+        offset_a, offset_b = len(tokens_a), len(tokens_b)
+        tokens_a.extend(words_a)
+        tokens_b.extend(words_b)
+        if tag == "equal":
+            opcodes.append(("equal", offset_a, offset_a + len(words_a), offset_b, offset_b + len(words_b)))
+            continue
+        remaining = deadline - time.monotonic()
+        if tag == "replace" and remaining > 0 and len(words_a) + len(words_b) <= WORD_DIFF_MAX_TOKENS:
+            ids_a, ids_b = intern_tokens(words_a, words_b)
+            matches, refined = _matching_runs(ids_a, ids_b, time.monotonic() + remaining, should_stop)
+            complete = complete and refined
+            opcodes.extend(_opcodes(matches, len(ids_a), len(ids_b), offset_a, offset_b))
+        else:
+            if tag == "replace":
+                complete = False
+            opcodes.extend(_opcodes([], len(words_a), len(words_b), offset_a, offset_b))
+    return DiffResult(tokens_a, tokens_b, _merge_equal(opcodes), complete)
+
+
+def _merge_equal(opcodes):
+    """
+    Merge adjacent opcodes with the same tag.
+    """
+    merged = []
+    for opcode in opcodes:
+        if opcode[1] == opcode[2] and opcode[3] == opcode[4]:
+            continue
+        if merged and merged[-1][0] == opcode[0]:
+            tag, i1, i2, j1, j2 = merged[-1]
+            merged[-1] = (tag, i1, opcode[2], j1, opcode[4])
+        else:
+            merged.append(opcode)
+    return merged
@@ -0,0 +1,323 @@
+# tool_calls.py
+
+"""
+Tool (function) calling: assembling streamed calls and running them locally.
+
+Streamed tool calls arrive as `delta.tool_calls` fragments: the call's id and
+name first, then its JSON arguments a few characters at a time. Each call's
+arguments are fed to an IncrementalJSONParser, which scans every character
+once and parses each top-level member as soon as it is complete, so a large
+argument object is never re-parsed from the start.
+
+Calls requested in the same assistant turn are independent of each other and
+are run in parallel on a thread pool; their results go back to the model as
+"tool" messages.
+"""
+
+import concurrent.futures
+import json
+import os
+import re
+from datetime import datetime
+
+from app_logging import get_logger
+
+logger = get_logger("tools")
+
+MAX_TOOL_ROUNDS = 5    # Follow-up requests allowed before the model must answer without tools
+MAX_TOOL_WORKERS = 8   # Tool calls run at once
+TOOL_TIMEOUT = float(os.environ.get("OPENROUTER_TOOL_TIMEOUT", 30))  # Seconds per tool call
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'[{}\[\]",]')
+_TAGS = re.compile(r"<[^>]+>")
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON document that arrives in fragments, in a single pass.
+
+    feed() only scans the new text: inside strings it jumps from quote to
+    backslash with a regex, outside them from one structural character to the
+    next. When the document is an object, each top-level member is decoded
+    the moment the comma or brace that ends it arrives and is available in
+    `fields`, so the full text is never decoded again.
+    """
+    def __init__(self):
+        self.fragments = []
+        self.fields = {}          # Top-level members decoded so far
+        self.complete = False
+        self.error = None         # The JSONDecodeError of an invalid member, if any
+        self._depth = 0
+        self._is_object = None
+        self._in_string = False
+        self._escaped = False
+        self._member = []         # Text of the top-level member being read
+
+    @property
+    def text(self) -> str:
+        return "".join(self.fragments)
+
+    def feed(self, fragment: str):
+        """
+        Scan the next piece of the document.
+        """
+        if not fragment:
+            return
+        self.fragments.append(fragment)
+        position = 0
+        start = 0  # Where the current member's text begins in this fragment
+        length = len(fragment)
+        while position < length:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    position += 1
+                    continue
+                match = _STRING_SPECIAL.search(fragment, position)
+                if match is None:
+                    break
+                position = match.end()
+                if match.group() == "\\":
+                    self._escaped = True
+                else:
+                    self._in_string = False
+                continue
+
+            match = _STRUCTURAL.search(fragment, position)
+            if match is None:
+                break
+            char = match.group()
+            position = match.end()
+            if self.complete:
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._is_object = char == "{"
+                    start = position
+                self._depth += 1
+            elif char == "," and self._depth == 1 and self._is_object:
+                self._end_member(fragment[start:position - 1])
+                start = position
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._is_object:
+                        self._end_member(fragment[start:position - 1])
+                    self.complete = True
+        if self._depth >= 1 and self._is_object and not self.complete:
+            self._member.append(fragment[start:])
+
+    def _end_member(self, tail):
+        text = "".join(self._member) + tail
+        self._member = []
+        if not text.strip():
+            return
+        try:
+            self.fields.update(json.loads("{" + text + "}"))
+        except json.JSONDecodeError as e:
+            self.error = self.error or e
+
+    def value(self):
+        """
+        Return the decoded document.
+
+        Raises:
+            ValueError: If the document is incomplete or invalid.
+        """
+        if self.error is not None:
+            raise ValueError(f"Invalid JSON: {self.error}")
+        if self._is_object:
+            if not self.complete:
+                raise ValueError("Incomplete JSON object")
+            return dict(self.fields)
+        text = self.text
+        if not text.strip():
+            return {}
+        return json.loads(text)
+
+
+class ToolCall:
+    """
+    One tool call requested by the model, possibly still streaming.
+
+    Attributes:
+        id (str): The call id, echoed back in the tool result.
+        name (str): The function name.
+        arguments (IncrementalJSONParser): The arguments received so far.
+    """
+    def __init__(self, call_id="", name=""):
+        self.id = call_id
+        self.name = name
+        self.arguments = IncrementalJSONParser()
+
+    def to_dict(self) -> dict:
+        """
+        Return the call in the form the API expects in an assistant message.
+        """
+        arguments = self.arguments.text
+        return {"id": self.id, "type": "function", "function": {"name": self.name, "arguments": arguments if arguments.strip() else "{}"}}
+
+
+class ToolCallAssembler:
+    """
+    Builds ToolCalls from the `tool_calls` entries of streamed deltas.
+    """
+    def __init__(self):
+        self._calls = {}
+
+    def __bool__(self):
+        return bool(self._calls)
+
+    def feed(self, tool_calls: list):
+        """
+        Add the tool call fragments of one delta (or the complete calls of a non-streamed message).
+        """
+        for fragment in tool_calls:
+            index = fragment.get("index")
+            if index is None:
+                # Without an index, a new id starts a call and anything else continues the last one
+                known = [i for i, call in self._calls.items() if fragment.get("id") and call.id == fragment["id"]]
+                if known:
+                    index = known[0]
+                elif fragment.get("id") or not self._calls:
+                    index = len(self._calls)
+                else:
+                    index = max(self._calls)
+            call = self._calls.setdefault(index, ToolCall())
+            if fragment.get("id"):
+                call.id = fragment["id"]
+            function = fragment.get("function") or {}
+            if function.get("name"):
+                call.name += function["name"]
+            arguments = function.get("arguments")
+            if isinstance(arguments, dict):
+                arguments = json.dumps(arguments)  # Some providers send decoded arguments
+            if arguments:
+                call.arguments.feed(arguments)
+
+    def calls(self) -> list:
+        """
+        Return the ToolCalls in index order.
+        """
+        return [self._calls[index] for index in sorted(self._calls)]
+
+
+class ToolRegistry:
+    """
+    The local functions the model may call.
+    """
+    def __init__(self):
+        self._tools = {}
+
+    def __bool__(self):
+        return bool(self._tools)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def register(self, name: str, function, description: str, parameters: dict | None = None):
+        """
+        Make a function available to the model.
+
+        Args:
+            name (str): The name the model calls it by.
+            function (callable): Called with the decoded arguments as keyword arguments.
+            description (str): What the tool does, for the model.
+            parameters (dict, optional): The JSON schema of the arguments. Defaults to no arguments.
+        """
+        self._tools[name] = (function, {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": parameters or {"type": "object", "properties": {}},
+            },
+        })
+
+    def definitions(self) -> list:
+        """
+        Return the tool definitions for the request payload.
+        """
+        return [definition for function, definition in self._tools.values()]
+
+    def run(self, call: ToolCall) -> str:
+        """
+        Run one call and return its result as message content; failures are reported as text.
+        """
+        if call.name not in self._tools:
+            return f"Error: unknown tool '{call.name}'"
+        try:
+            arguments = call.arguments.value()
+        except ValueError as e:
+            return f"Error: could not parse the arguments: {e}"
+        try:
+            result = self._tools[call.name][0](**arguments)
+        except Exception as e:
+            logger.warning("Tool %s failed: %s", call.name, e)
+            return f"Error: {e}"
+        return result if isinstance(result, str) else json.dumps(result, default=str)
+
+
+def execute_tool_calls(calls: list, registry: ToolRegistry, timeout: float = TOOL_TIMEOUT) -> list:
+    """
+    Run the calls of one assistant turn in parallel.
+
+    Args:
+        calls (list): The ToolCalls to run.
+        registry (ToolRegistry): The available tools.
+        timeout (float, optional): Seconds to wait for each call.
+
+    Returns:
+        list: One "tool" message per call, in the order of the calls.
+    """
+    if len(calls) == 1:
+        results = [registry.run(calls[0])]
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(len(calls), MAX_TOOL_WORKERS))
+        futures = [executor.submit(registry.run, call) for call in calls]
+        results = []
+        for call, future in zip(calls, futures):
+            try:
+                results.append(future.result(timeout=timeout))
+            except concurrent.futures.TimeoutError:
+                results.append(f"Error: the tool did not finish within {timeout:g}s")
+        executor.shutdown(wait=False)  # Do not wait for tools that timed out
+    for call, result in zip(calls, results):
+        logger.info("Tool %s returned %d characters", call.name, len(result))
+    return [{"role": "tool", "tool_call_id": call.id, "name": call.name, "content": result} for call, result in zip(calls, results)]
+
+
+def default_tools(chat_index=None) -> ToolRegistry:
+    """
+    Return the built-in tools: the current time and, with a chat index, a search of past chats.
+
+    Args:
+        chat_index (ChatIndex, optional): The index searched by search_chat_history.
+    """
+    registry = ToolRegistry()
+    registry.register(
+        "get_current_time",
+        lambda: datetime.now().astimezone().isoformat(timespec="seconds"),
+        "Get the user's current local date and time in ISO 8601 format.",
+    )
+    if chat_index is not None:
+        def search_chat_history(query, limit=5):
+            hits = chat_index.search(query, limit=max(1, min(int(limit), 20)))
+            return [{"role": hit["role"], "created": hit["created"], "text": _TAGS.sub("", hit["snippet"])} for hit in hits]
+        registry.register(
+            "search_chat_history",
+            search_chat_history,
+            "Search the user's previous chat messages. Returns matching excerpts, best match first.",
+            {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Words to search for."},
+                    "limit": {"type": "integer", "description": "Maximum number of results (1-20).", "default": 5},
+                },
+                "required": ["query"],
+            },
+        )
+    return registry
@@ -0,0 +1,142 @@
+# ui_watchdog.py
+
+"""
+Detects stalls of the Qt event loop and logs the code responsible.
+
+A QTimer on the GUI thread records a heartbeat every HEARTBEAT_MS. A plain
+Python thread checks the heartbeat; when it is older than the threshold the
+event loop is blocked, so the watchdog captures the GUI thread's current
+stack with sys._current_frames() and logs it as a warning right away (the
+freeze may never end). It keeps sampling while the stall lasts and, once
+the heartbeat resumes, logs the stall's duration with the application
+function seen most often on top of the samples (the innermost frame in this
+project's files, since the innermost frame overall is usually inside Qt,
+markdown or the standard library) and a stack through it.
+
+Environment variables:
+    OPENROUTER_UI_LAG_MS: Stall threshold in milliseconds (default 250); 0 disables the watchdog.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+from PyQt5.QtCore import QObject, QTimer
+
+from app_logging import get_logger
+
+logger = get_logger("watchdog")
+
+UI_LAG_THRESHOLD_MS = int(os.environ.get("OPENROUTER_UI_LAG_MS", 250))
+HEARTBEAT_MS = 50            # How often the GUI thread reports in
+SAMPLE_INTERVAL_MS = 50      # How often a stalled GUI thread's stack is sampled
+MAX_STACK_FRAMES = 40        # Innermost frames logged per sample
+MAX_STALLS = 50              # Recent stalls kept in memory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stall:
+    """
+    One period in which the event loop did not run.
+
+    Attributes:
+        started (float): time.time() of the last heartbeat before the stall.
+        duration (float): Seconds without a heartbeat; grows until the stall ends.
+        location (str): The application function ("file:line in function") sampled most often.
+        stack (str): A stack sample taken in that function.
+        samples (int): The number of stack samples taken.
+    """
+    def __init__(self, started):
+        self.started = started
+        self.duration = 0.0
+        self.location = ""
+        self.stack = ""
+        self.samples = 0
+
+
+class EventLoopWatchdog(QObject):
+    """
+    Watches the GUI thread's event loop for stalls. Create and start it on the GUI thread.
+
+    Args:
+        threshold_ms (int, optional): Heartbeat age that counts as a stall. Defaults to UI_LAG_THRESHOLD_MS.
+    """
+    def __init__(self, threshold_ms=UI_LAG_THRESHOLD_MS, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.gui_thread_id = threading.get_ident()
+        self.last_heartbeat = time.monotonic()
+        self.stalls = collections.deque(maxlen=MAX_STALLS)
+        self._stop = threading.Event()
+        self._thread = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(HEARTBEAT_MS)
+        self.timer.timeout.connect(self._heartbeat)
+
+    def start(self):
+        if self.threshold <= 0 or self._thread is not None:
+            return
+        self.last_heartbeat = time.monotonic()
+        self.timer.start()
+        self._thread = threading.Thread(target=self._watch, name="ui-watchdog", daemon=True)
+        self._thread.start()
+        logger.debug("UI watchdog started (threshold %d ms)", self.threshold * 1000)
+
+    def stop(self):
+        self.timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _heartbeat(self):
+        self.last_heartbeat = time.monotonic()
+
+    def _gui_stack(self):
+        """
+        Return (innermost application frame as "file:line in function", formatted stack) of the GUI thread.
+        """
+        frame = sys._current_frames().get(self.gui_thread_id)
+        if frame is None:
+            return "", ""
+        summary = traceback.extract_stack(frame)
+        location = "?"
+        for entry in reversed(summary):
+            path = os.path.abspath(entry.filename)
+            if path.startswith(APP_DIR) and path != os.path.abspath(__file__):
+                location = f"{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}"
+                break
+        return location, "".join(summary.format()[-MAX_STACK_FRAMES:])
+
+    def _watch(self):
+        stall = None
+        locations = collections.Counter()
+        stacks = {}
+        while not self._stop.wait(SAMPLE_INTERVAL_MS / 1000):
+            heartbeat = self.last_heartbeat
+            age = time.monotonic() - heartbeat
+            if age < self.threshold:
+                if stall is not None:
+                    # The heartbeat is back: the stall is over
+                    stall.duration = max(stall.duration, heartbeat - stall_heartbeat)
+                    if locations:
+                        stall.location = locations.most_common(1)[0][0]
+                        stall.stack = stacks[stall.location]
+                    self.stalls.append(stall)
+                    logger.warning("UI was unresponsive for %.0f ms, mostly in %s (%d samples):\n%s", stall.duration * 1000, stall.location, stall.samples, stall.stack)
+                    stall = None
+                    locations.clear()
+                    stacks.clear()
+                continue
+            location, stack = self._gui_stack()
+            if stall is None:
+                stall = Stall(time.time() - age)
+                stall_heartbeat = heartbeat
+                logger.warning("UI unresponsive for %.0f ms so far, in %s:\n%s", age * 1000, location, stack)
+            stall.duration = age
+            stall.samples += 1
+            locations[location] += 1
+            stacks.setdefault(location, stack)